@@ -740,12 +740,18 @@ void print_local_output_fixed_h5(hid_t file_id, char *inpath, herr_t *h5error,
 	// various scalars
 	output_dims[0] = 1; output_dims[1] = 0;
 	
+	// 'number_of_local_simulations' is the commit marker for the readers of the running
+	// computation (the streaming Hankel stage): the outputs (data and metadata) are flushed
+	// before the marker is updated and the marker is flushed immediately
+	*h5error = H5Fflush(file_id, H5F_SCOPE_LOCAL);
+
 	path[0] = '\0'; 
 	strcat(strcat(path,inpath),"number_of_local_simulations");
 	int foo = Nsim_loc + 1;
 	hid_t dset_id = H5Dopen2 (file_id, path, H5P_DEFAULT);
 	*h5error = H5Dwrite (dset_id, H5T_NATIVE_INT, H5S_ALL, H5S_ALL, H5P_DEFAULT, &foo);
 	*h5error = H5Dclose(dset_id); // dataset
+	*h5error = H5Fflush(file_id, H5F_SCOPE_LOCAL);
 }
 
 
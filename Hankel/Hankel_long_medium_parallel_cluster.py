@@ -1,7 +1,8 @@
 import numpy as np
+import os
 from scipy import integrate
 import h5py
-import copy
+import types
 import multiprocessing as mp
 
 
@@ -11,6 +12,12 @@ import mynumerics as mn
 import Hankel_transform as HT
 
 omega_au2SI = mn.ConvertPhoton(1.0, 'omegaau', 'omegaSI')
+raw_transforms_file = 'Hankel_raw_transforms.h5'
+raw_transforms_tile_file = 'Hankel_raw_transforms_tmp_%d.h5'
+cumulative_tile_file = 'Hankel_cumulative_tmp_%d.h5'
+TDSE_temporary_files = 'hdf5_temp_*.h5' # the per-process outputs of 1DTDSE (before 'merge.py')
+checkpoint_tile_file = 'Hankel_checkpoint_%d.h5'
+precision_check_points = (16, 8) # the maximal numbers of (r_FF, omega) points of the single-precision check
 
 # specify the input archove tranferred in the temporary file 'msg.tmp'
 with open('msg.tmp','r') as msg_file:
@@ -40,13 +47,105 @@ with h5py.File(file, 'r') as InpArch:
     distance_FF = mn.readscalardataset(inp_group, 'distance_FF','N')
 
     store_cumulative_result = (mn.readscalardataset(inp_group, 'store_cumulative_result','N') == 1)
+    
+    # optional inputs
+    store_raw_transforms = (('store_raw_transforms' in inp_group.keys()) and
+                            (mn.readscalardataset(inp_group, 'store_raw_transforms','N') == 1))
+    stream_cumulative_result = (('stream_cumulative_result' in inp_group.keys()) and
+                                (mn.readscalardataset(inp_group, 'stream_cumulative_result','N') == 1))
+    cumulative_stride = (mn.readscalardataset(inp_group, 'cumulative_stride','N')
+                         if ('cumulative_stride' in inp_group.keys()) else 1)
+    checkpoint_interval = (mn.readscalardataset(inp_group, 'checkpoint_interval','N')
+                           if ('checkpoint_interval' in inp_group.keys()) else 0)
+    shared_source_planes = (('shared_source_planes' in inp_group.keys()) and
+                            (mn.readscalardataset(inp_group, 'shared_source_planes','N') == 1))
+    tile_size_r_FF = (mn.readscalardataset(inp_group, 'tile_size_r_FF','N')
+                      if ('tile_size_r_FF' in inp_group.keys()) else None)
+    tile_size_omega = (mn.readscalardataset(inp_group, 'tile_size_omega','N')
+                       if ('tile_size_omega' in inp_group.keys()) else None)
+    if ('Hankel_engine' in inp_group.keys()):
+        Hankel_engine = mn.readscalardataset(inp_group, 'Hankel_engine','S')
+    else:
+        Hankel_engine = 'matrix'
+    distance_FF_screens = (np.atleast_1d(inp_group['distance_FF_screens'][()])
+                           if ('distance_FF_screens' in inp_group.keys()) else [])
+    rmax_FF_screens = (np.atleast_1d(inp_group['rmax_FF_screens'][()])
+                       if ('rmax_FF_screens' in inp_group.keys()) else [])
+    on_axis_spectrum = (('on_axis_spectrum' in inp_group.keys()) and
+                        (mn.readscalardataset(inp_group, 'on_axis_spectrum','N') == 1))
+    harmonic_orders = (np.atleast_1d(inp_group['harmonic_orders'][()])
+                       if ('harmonic_orders' in inp_group.keys()) else None)
+    harmonic_window = (mn.readscalardataset(inp_group, 'harmonic_window','N')
+                       if ('harmonic_window' in inp_group.keys()) else 0.5)
+    spectral_power_threshold = (mn.readscalardataset(inp_group, 'spectral_power_threshold','N')
+                                if ('spectral_power_threshold' in inp_group.keys()) else None)
+    radial_threshold = (mn.readscalardataset(inp_group, 'radial_threshold','N')
+                        if ('radial_threshold' in inp_group.keys()) else 0.)
+    integrated_spectrum = (('integrated_spectrum' in inp_group.keys()) and
+                           (mn.readscalardataset(inp_group, 'integrated_spectrum','N') == 1))
+    single_precision = (('single_precision' in inp_group.keys()) and
+                        (mn.readscalardataset(inp_group, 'single_precision','N') == 1))
+    if ('integrator_longitudinal' in inp_group.keys()):
+        integrator_longitudinal = mn.readscalardataset(inp_group, 'integrator_longitudinal','S')
+    else:
+        integrator_longitudinal = 'trapezoidal'
+    kernel_cache_size = (mn.readscalardataset(inp_group, 'kernel_cache_size','N')
+                         if ('kernel_cache_size' in inp_group.keys()) else 0.)
+    kernel_cache_store = (mn.readscalardataset(inp_group, 'kernel_cache_store','S')
+                          if ('kernel_cache_store' in inp_group.keys()) else None)
+    kernel_cache_store_size = (mn.readscalardataset(inp_group, 'kernel_cache_store_size','N')
+                               if ('kernel_cache_store_size' in inp_group.keys()) else 4000.)
+    source_temporary_files = (('source_temporary_files' in inp_group.keys()) and
+                              (mn.readscalardataset(inp_group, 'source_temporary_files','N') == 1))
+    stream_temporary_files = (('stream_temporary_files' in inp_group.keys()) and
+                              (mn.readscalardataset(inp_group, 'stream_temporary_files','N') == 1))
+    stream_poll_interval = (mn.readscalardataset(inp_group, 'stream_poll_interval','N')
+                            if ('stream_poll_interval' in inp_group.keys()) else 10.)
+    stream_timeout = (mn.readscalardataset(inp_group, 'stream_timeout','N')
+                      if ('stream_timeout' in inp_group.keys()) else None)
+    if ('J0_backend' in inp_group.keys()):
+        J0_backend = mn.readscalardataset(inp_group, 'J0_backend','S')
+    else:
+        J0_backend = 'scipy'
+    if ('parallel_mode' in inp_group.keys()):
+        parallel_mode = mn.readscalardataset(inp_group, 'parallel_mode','S')
+    else:
+        parallel_mode = 'multiprocessing'
+
+# the processes computing the tiles: 'Nthreads' forked workers or the MPI ranks (mpirun -n ...),
+# the root rank merges and stores the results
+if (parallel_mode == 'MPI'):
+    from mpi4py import MPI
+    from mpi4py.util import dtlib
+    comm = MPI.COMM_WORLD
+    rank = comm.Get_rank(); N_processes = comm.Get_size()
+elif (parallel_mode == 'multiprocessing'):
+    rank = 0; N_processes = Nthreads
+else:
+    raise ValueError('Wrongly specified parallel_mode: '+parallel_mode)
+is_root = (rank == 0)
+
+# only the on-axis spectra of the screens, J0 = 1 and the transforms are weighted sums
+if on_axis_spectrum:
+    Nr_FF = 1; Hankel_engine = 'near_axis'
 
 rgrid_FF = np.linspace(0.0, rmax_FF, Nr_FF)
 
+# the additional screens are computed in the same pass, all the screens have Nr_FF points
+# and they are concatenated along r_FF in the outputs
+if not(len(distance_FF_screens) == len(rmax_FF_screens)):
+    raise ValueError('distance_FF_screens and rmax_FF_screens must have the same length.')
+distances_FF = [distance_FF] + list(distance_FF_screens)
+rgrids_FF = [rgrid_FF] + [np.linspace(0.0, rmax_FF_screen, Nr_FF) for rmax_FF_screen in rmax_FF_screens]
+N_screens = len(distances_FF); Nr_FF_all = N_screens*Nr_FF
+if store_raw_transforms and (N_screens > 1):
+    raise ValueError('store_raw_transforms is available only for a single screen.')
+dtype = np.csingle if single_precision else np.cdouble
+
 # load the data from the hdf5 archive
 # ! We use the dynamic access to the data: it means the data are loaded during the calculation and that
 # the calculation must be done inside the with block.
-print('processing:', file)             
+if is_root: print('processing:', file)
 with h5py.File(file, 'r') as InpArch:
     
     omega0 = mn.ConvertPhoton(1e-2*mn.readscalardataset(InpArch,
@@ -60,9 +159,23 @@ with h5py.File(file, 'r') as InpArch:
     effective_IR_refrective_index = inverse_GV_IR*units.c_light
     
 
-    ogrid = InpArch[MMA.paths['CTDSE_outputs']+'/omegagrid'][:]          # a.u.
-    rgrid_macro = InpArch[MMA.paths['CTDSE_outputs']+'/rgrid_coarse'][:] # SI
-    zgrid_macro = InpArch[MMA.paths['CTDSE_outputs']+'/zgrid_coarse'][:] # SI
+    # the source is read from the merged archive or directly from the temporary files of TDSE
+    # with 'stream_temporary_files', the planes are taken as soon as TDSE completes them
+    if stream_temporary_files and not(spectral_power_threshold is None):
+        raise ValueError('spectral_power_threshold requires the whole source, it is not available with stream_temporary_files.')
+    if source_temporary_files or stream_temporary_files:
+        temporary_files = HT.TDSE_temporary_files(TDSE_temporary_files,
+                                                  streaming = stream_temporary_files,
+                                                  poll_interval = stream_poll_interval,
+                                                  timeout = stream_timeout)
+        ogrid = temporary_files.ogrid; rgrid_macro = temporary_files.rgrid; zgrid_macro = temporary_files.zgrid
+        reading_source = 'temporary_files'
+    else:
+        temporary_files = None
+        ogrid = InpArch[MMA.paths['CTDSE_outputs']+'/omegagrid'][:]          # a.u.
+        rgrid_macro = InpArch[MMA.paths['CTDSE_outputs']+'/rgrid_coarse'][:] # SI
+        zgrid_macro = InpArch[MMA.paths['CTDSE_outputs']+'/zgrid_coarse'][:] # SI
+        reading_source = 'dynamic'
     
     # the inidces of the selection in the frequency (harmonic) grid
     ko_min = mn.FindInterval(ogrid/omega0, Hrange[0])
@@ -72,204 +185,394 @@ with h5py.File(file, 'r') as InpArch:
     
     absorption = True
     dispersion = True    
+    near_field_factor = True
+    
+    # the selected frequencies: 'Harmonic_range' with 'ko_step', optionally only the windows around
+    # 'harmonic_orders' and the frequencies where the spectral power of the source is significant
+    ko_indices = np.arange(ko_min, ko_max, ko_step)
+    if not(harmonic_orders is None):
+        ko_indices = ko_indices[HT.harmonic_window_indices(ogrid[ko_indices], omega0, harmonic_orders, harmonic_window)]
+    if not(spectral_power_threshold is None):
+        if is_root: # the source is read once, the selection is sent to the other ranks
+            spectral_power = HT.source_spectral_power(
+                                HT.FSources_provider(zgrid_macro,
+                                                     rgrid_macro,
+                                                     omega_au2SI*ogrid,
+                                                     h5_handle = InpArch,
+                                                     h5_path = MMA.paths['CTDSE_outputs']+'/FSourceTerm',
+                                                     data_source = reading_source,
+                                                     ko_indices = ko_indices,
+                                                     kr_max=kr_max,
+                                                     kr_step=kr_step,
+                                                     temporary_files = temporary_files))
+            ko_indices = ko_indices[spectral_power >= spectral_power_threshold*np.max(spectral_power)]
+        if (parallel_mode == 'MPI'): ko_indices = comm.bcast(ko_indices, root = 0)
     
-    ogrid_sel = ogrid[ko_min:ko_max:ko_step]    
+    ogrid_sel = ogrid[ko_indices]
     No_sel = len(ogrid_sel)
     
-    print('No', No_sel, 'Nr_FF', Nr_FF)
-    print('------------------------------------------------')
+    if is_root:
+        print('No', No_sel, 'Nr_FF', Nr_FF, 'screens', N_screens)
+        print('------------------------------------------------')
     
     ## Parallel computing:
-    # Decide which of the dimension on the screen is bigger and then apply
-    # multiprocessing over this dimension. The process is then unified and
-    # the code executes 'Nthreads' simulations using mp.Queue().
-    if (Nr_FF >= No_sel): # If there are more radial points
-        paralellised_in_r = True
-        rgrid_FF_parts = np.array_split(rgrid_FF, Nthreads)
-        ogrid_parts = [ogrid_sel for _ in range(Nthreads)]
-        
-        rgrid_FF_indices = [mn.FindInterval(rgrid_FF, rgrid_FF_part[0]) for rgrid_FF_part in rgrid_FF_parts]
-        
-        ogrid_indices_start = Nthreads*[ko_min]
-        ogrid_indices_end = Nthreads*[ko_max]
-        
-        
+    # The screen [r_FF,omega] is split into tiles, the workers (Nthreads processes
+    # or the MPI ranks) take the tiles dynamically from a queue (a shared counter
+    # for MPI) until all are computed, so the load is balanced even if the costs
+    # of the tiles differ. The default tiles split the bigger dimension of the
+    # screen into 'N_processes' parts. The r_FF dimension contains all the screens.
+    # The MPI ranks reading the archive independently split the frequencies, so each
+    # rank reads only the frequency window of its tile (r_FF is split only if there
+    # are fewer frequencies than ranks).
+    if (tile_size_r_FF is None) and (tile_size_omega is None):
+        if (parallel_mode == 'MPI') and not(shared_source_planes):
+            tile_size_omega = -(-No_sel // N_processes)
+            tile_size_r_FF = -(-Nr_FF_all // -(-N_processes // No_sel))
+        elif (Nr_FF_all >= No_sel): # If there are more radial points
+            tile_size_r_FF = -(-Nr_FF_all // N_processes); tile_size_omega = No_sel
+        else:
+            tile_size_r_FF = Nr_FF_all; tile_size_omega = -(-No_sel // N_processes)
     else:
-        paralellised_in_r = False
-        ogrid_parts = np.array_split(ogrid_sel, Nthreads)
-        rgrid_FF_parts = [rgrid_FF for _ in range(Nthreads)]
-        rgrid_FF_indices = Nthreads*[0]
-        
-        ogrid_indices = [mn.FindInterval(ogrid, ogrid_part[0]) for ogrid_part in ogrid_parts] # From the original file used to load the data !!!
-        ogrid_indices.append(ko_max)
-        ogrid_indices_start = ogrid_indices[:-1]
-        ogrid_indices_end = ogrid_indices[1:]
-    
-    # prepare instances of 'FSources_provider' class, each of the instances
-    # describes a subarray according to the splitting above, note the 'dynamic' option
-    targets = []
-    for k1 in range(Nthreads):
-        targets.append(HT.FSources_provider(InpArch[MMA.paths['CTDSE_outputs']+'/zgrid_coarse'][:],
-                                                    InpArch[MMA.paths['CTDSE_outputs']+'/rgrid_coarse'][:],
-                                                    omega_au2SI*InpArch[MMA.paths['CTDSE_outputs']+'/omegagrid'][:],
-                                                    h5_handle = InpArch,
-                                                    h5_path = MMA.paths['CTDSE_outputs']+'/FSourceTerm',
-                                                    data_source = 'dynamic',
-                                                    ko_min = ogrid_indices_start[k1],
-                                                    ko_max = ogrid_indices_end[k1],
-                                                    ko_step=ko_step,
-                                                    kr_max=kr_max,
-                                                    kr_step=kr_step)
-
-                       )
+        if (tile_size_r_FF is None): tile_size_r_FF = Nr_FF_all
+        if (tile_size_omega is None): tile_size_omega = No_sel
+    tiles = HT.screen_tiles(Nr_FF_all, No_sel, tile_size_r_FF, tile_size_omega)
+    N_tiles = len(tiles); N_workers = min(N_processes, N_tiles)
+    if is_root: print('Number of tiles', N_tiles, 'workers', N_workers)
     
-    task_queue = mp.Queue() # que to store the results from multiprocessing 
-    def mp_handle(position, *args, **kwargs): # handle to trace the position of the subarrays
-        task_queue.put(
-                       [position, HT.Hankel_long(*args,**kwargs)] # the outputs are not ordered, keep the order in the result
-                      )
-
+    # the planes provided by 'FSources_provider'
+    zgrid_planes = zgrid_macro[0:-1]
+    zgrid_cumulative = zgrid_planes[1:][cumulative_stride-1::cumulative_stride] # the stored cumulative planes
+    rgrid_planes = rgrid_macro[0:kr_max:kr_step]
     
-    # define processes
-    processes = [mp.Process(target=mp_handle, 
-                            args=(k1,
-                                  targets[k1],
-                                  distance_FF,
-                                  rgrid_FF_parts[k1]),
-                            kwargs={
-                                    'preset_gas': preset_gas,
-                                    'pressure' : pressure,
-                                    'absorption_tables' : XUV_table_type_absorption,
-                                    'include_absorption' : absorption,
-                                    'dispersion_tables' : XUV_table_type_diffraction,
-                                    'include_dispersion' : dispersion,
-                                    'effective_IR_refrective_index' : effective_IR_refrective_index,
-                                    'integrator_Hankel' : HT.trapezoidal_integrator,
-                                    'integrator_longitudinal' : 'trapezoidal',
-                                    'near_field_factor' : True,
-                                    'store_cumulative_result' : store_cumulative_result,
-                                    'store_non_normalised_cumulative_result' : False
-                                   }
-                            
-                            ) for k1 in range(Nthreads)]
-
-    # run the processes in parallel
-    for p in processes: p.start()
-    results = [task_queue.get() for p in processes] # The results are not ordered
-    # result = [[position_index, Hankel_long-class-instance], ... ]
+    # in the 'shared' mode, the planes are read only by this process (the root rank) and shared
+    # with the workers (broadcast to the ranks), all the tiles are the consumers of the stream
+    # and they must be thus computed simultaneously
+    if shared_source_planes and not(temporary_files is None):
+        raise ValueError('shared_source_planes is not available with the temporary files of TDSE.')
+    if shared_source_planes and (N_tiles > N_processes):
+        raise ValueError('shared_source_planes requires at most '+str(N_processes)+' tiles, '+str(N_tiles)+' tiles given.')
+    if shared_source_planes and (parallel_mode == 'MPI'):
+        source_stream = HT.MPI_FSource_stream(zgrid_macro,
+                                              rgrid_macro,
+                                              omega_au2SI*ogrid,
+                                              InpArch,
+                                              MMA.paths['CTDSE_outputs']+'/FSourceTerm',
+                                              comm,
+                                              ko_indices = ko_indices,
+                                              kr_max=kr_max,
+                                              kr_step=kr_step)
+        data_source = 'shared'
+    elif shared_source_planes:
+        source_stream = HT.Shared_FSource_stream(zgrid_macro,
+                                                 rgrid_macro,
+                                                 omega_au2SI*ogrid,
+                                                 InpArch,
+                                                 MMA.paths['CTDSE_outputs']+'/FSourceTerm',
+                                                 N_tiles,
+                                                 ko_indices = ko_indices,
+                                                 kr_max=kr_max,
+                                                 kr_step=kr_step)
+        data_source = 'shared'
+    else:
+        source_stream = None
+        data_source = reading_source
     
+    # instance of 'FSources_provider' class describing the subarray of the selected frequencies
+    # 'omega_slice', it is created by the worker, note the 'dynamic' option
+    def screen_target(omega_slice, data_source = data_source, consumer = 0):
+        return HT.FSources_provider(zgrid_macro,
+                                    rgrid_macro,
+                                    omega_au2SI*ogrid,
+                                    h5_handle = InpArch,
+                                    h5_path = MMA.paths['CTDSE_outputs']+'/FSourceTerm',
+                                    data_source = data_source,
+                                    ko_indices = ko_indices[omega_slice],
+                                    kr_max=kr_max,
+                                    kr_step=kr_step,
+                                    shared_stream = source_stream,
+                                    consumer = consumer,
+                                    temporary_files = temporary_files)
     
-    ## Merge results ##
+    def tile_target(k_tile):
+        return screen_target(tiles[k_tile][1], consumer = k_tile)
     
-    ## Prepare new shared output class
-    # This part of the code copy the output from the 0th process, extends the array, and fill the arrays by data from the other processes
+    # the parts of the screens in the range 'r_FF_slice' of the concatenated screens,
+    # (screen, slice in the screen, slice in the range)
+    def screen_parts(r_FF_slice):
+        parts = []
+        for k_screen in range(N_screens):
+            lower = max(k_screen*Nr_FF, r_FF_slice.start); upper = min((k_screen+1)*Nr_FF, r_FF_slice.stop)
+            if (lower < upper):
+                parts.append((k_screen,
+                              slice(lower - k_screen*Nr_FF, upper - k_screen*Nr_FF),
+                              slice(lower - r_FF_slice.start, upper - r_FF_slice.start)))
+        return parts
     
-    HL_res = copy.deepcopy(results[0][1]) # ensure all shared data are in the output class
+    def tile_screens(r_FF_slice): # (distance, rgrid_FF) for 'Hankel_long', lists for multiple screens
+        if (N_screens == 1): return distance_FF, rgrid_FF[r_FF_slice]
+        parts = screen_parts(r_FF_slice)
+        return ([distances_FF[k_screen] for k_screen, _, _ in parts],
+                [rgrids_FF[k_screen][screen_slice] for k_screen, screen_slice, _ in parts])
     
-    HL_res.ogrid = omega_au2SI*ogrid_sel  # reassing by the whole ogrid
-    # find indices for merging subarrays
-    ogrid_indices_new = [mn.FindInterval(ogrid_sel, ogrid_part[0]) for ogrid_part in ogrid_parts]
+    # the outputs of the whole screen are allocated in shared memory (on the root rank for MPI),
+    # each worker writes its tiles directly (no pickling and copying of the partial results),
+    # the streamed cumulative field is stored in the files of the tiles instead
+    output_shapes = {'FF_integrated': (Nr_FF_all, No_sel),
+                     'entry_plane_transform': (Nr_FF_all, No_sel),
+                     'exit_plane_transform': (Nr_FF_all, No_sel)}
+    if store_cumulative_result and not(stream_cumulative_result):
+        output_shapes['cumulative_field'] = (len(zgrid_cumulative), Nr_FF_all, No_sel)
+    outputs = HT.Shared_output_arrays(output_shapes, dtype = dtype) if is_root else None
     
-    # outputs that are always present
-    # total integrated signal
-    newshape = (Nr_FF, No_sel)
-    HL_res.FF_integrated = np.empty(newshape,dtype=HL_res.FF_integrated.dtype)
-    # Hankel transforms of the first and last planes
-    newshape = (Nr_FF, No_sel)
-    HL_res.entry_plane_transform = np.empty(newshape,dtype=HL_res.entry_plane_transform.dtype)
-    HL_res.exit_plane_transform  = np.empty(newshape,dtype=HL_res.exit_plane_transform.dtype)
+    # the pre-factor is computed once for the whole screen (by the root rank, the tables
+    # are sent to the other ranks) and the (forked) workers share the tables, only for
+    # the pre-factors independent of r
+    pre_factor_tables = None
+    if not(isinstance(pressure,dict) and ('rgrid' in pressure.keys())):
+        if is_root:
+            pre_factor_tables = HT.get_pre_factor_tables(zgrid_planes,
+                                                         rgrid_planes,
+                                                         omega_au2SI*ogrid_sel,
+                                                         preset_gas = preset_gas,
+                                                         pressure = pressure,
+                                                         absorption_tables = XUV_table_type_absorption,
+                                                         include_absorption = absorption,
+                                                         dispersion_tables = XUV_table_type_diffraction,
+                                                         include_dispersion = dispersion,
+                                                         effective_IR_refrective_index = effective_IR_refrective_index)
+        if (parallel_mode == 'MPI'): pre_factor_tables = comm.bcast(pre_factor_tables, root = 0)
     
-    # outputs that are present only if required
-    if 'cumulative_field' in dir(HL_res):
-        oldshape = np.shape(HL_res.cumulative_field)
-        newshape = (oldshape[0],) + (Nr_FF, No_sel)
-        HL_res.cumulative_field = np.empty(newshape,dtype=HL_res.cumulative_field.dtype)
-        
-    if 'cumulative_field_no_norm' in dir(HL_res):
-        oldshape = np.shape(HL_res.cumulative_field_no_norm)
-        newshape = (oldshape[0],) + (Nr_FF, No_sel)
-        HL_res.cumulative_field_no_norm = np.empty(newshape,dtype=HL_res.cumulative_field_no_norm.dtype)
-    
-    ## copy the original radial grid in the case it was split for parallelisation
-    if paralellised_in_r:
-        HL_res.rgrid = rgrid_FF
-
-    ## copy data into the newly allocated class
-    for k1, k_worker in enumerate([result[0] for result in results]):
+    # the kernels of the transforms are cached by each worker (the memory limit is per worker)
+    # and optionally stored for the later runs
+    if (kernel_cache_size > 0.) or not(kernel_cache_store is None):
+        kernel_cache = HT.Kernel_cache(max_bytes = int(1e6*kernel_cache_size), store = kernel_cache_store,
+                                       max_store_bytes = int(1e6*kernel_cache_store_size))
+    else:
+        kernel_cache = None
+    
+    Hankel_long_kwargs = {
+                          'preset_gas': preset_gas,
+                          'pressure' : pressure,
+                          'absorption_tables' : XUV_table_type_absorption,
+                          'include_absorption' : absorption,
+                          'dispersion_tables' : XUV_table_type_diffraction,
+                          'include_dispersion' : dispersion,
+                          'effective_IR_refrective_index' : effective_IR_refrective_index,
+                          'integrator_Hankel' : HT.trapezoidal_integrator,
+                          'Hankel_engine' : Hankel_engine,
+                          'integrator_longitudinal' : integrator_longitudinal,
+                          'near_field_factor' : near_field_factor,
+                          'store_cumulative_result' : store_cumulative_result,
+                          'store_non_normalised_cumulative_result' : False,
+                          'cumulative_stride' : cumulative_stride,
+                          'radial_threshold' : radial_threshold,
+                          'kernel_cache' : kernel_cache,
+                          'J0_backend' : J0_backend,
+                          'dtype' : dtype
+                         }
+    
+    def compute_tile(k_tile, output_arrays): # computes the tile 'k_tile' into 'output_arrays'
+        r_FF_slice, omega_slice = tiles[k_tile]
+        kwargs = dict(Hankel_long_kwargs, output_arrays = output_arrays)
+        if not(pre_factor_tables is None):
+            kwargs['pre_factor_tables'] = {name: table[:,omega_slice] for name, table in pre_factor_tables.items()}
+        # the planes streamed into files are stored separately for each tile, merged below,
+        # with checkpoints, the tiles continue from the previous run (the files are continued)
+        tile_file_mode = 'w'
+        if (checkpoint_interval > 0):
+            kwargs['checkpoint_file'] = checkpoint_tile_file % k_tile
+            kwargs['checkpoint_interval'] = checkpoint_interval
+            tile_file_mode = 'a'
+        if store_raw_transforms:
+            kwargs['raw_transforms_output'] = h5py.File(raw_transforms_tile_file % k_tile, tile_file_mode)
+        if store_cumulative_result and stream_cumulative_result:
+            kwargs['cumulative_output'] = h5py.File(cumulative_tile_file % k_tile, tile_file_mode)
+        HT.Hankel_long(tile_target(k_tile), *tile_screens(r_FF_slice), **kwargs)
+        for tile_file in ['raw_transforms_output', 'cumulative_output']:
+            if (tile_file in kwargs): kwargs[tile_file].close()
+    
+    if (parallel_mode == 'MPI'):
+        # the next tile is given by the counter on the root rank (atomic fetch-and-add),
+        # in the 'shared' mode, the rank k computes the tile k and the ranks without
+        # a tile only take part in the broadcasts of the planes
+        if shared_source_planes:
+            rank_tiles = [rank] if (rank < N_tiles) else []
+            if (rank >= N_tiles):
+                for _ in source_stream.planes(): pass
+        else:
+            tile_counter = MPI.Win.Allocate(8 if is_root else 0, 8, comm = comm)
+            if is_root: np.frombuffer(tile_counter.tomemory(), dtype = np.int64)[:] = 0
+            comm.Barrier()
+            def rank_tiles_():
+                k_tile = np.empty(1, dtype = np.int64)
+                while True:
+                    tile_counter.Lock(0)
+                    tile_counter.Fetch_and_op(np.ones(1, dtype = np.int64), k_tile, 0)
+                    tile_counter.Unlock(0)
+                    if (k_tile[0] >= N_tiles): return
+                    yield int(k_tile[0])
+            rank_tiles = rank_tiles_()
         
-        HL_res.FF_integrated[ # choosing proper indices to accomodate the subarrays
-        rgrid_FF_indices[k_worker]:(rgrid_FF_indices[k_worker]+len(rgrid_FF_parts[k_worker])),
-        ogrid_indices_new[k_worker]:(ogrid_indices_new[k_worker]+len(ogrid_parts[k_worker]))
-        ] = results[k1][1].FF_integrated
+        # the root rank writes its tiles directly into the outputs, the other ranks send
+        # each tile as soon as it is computed (the tag 0 announces the tile, the outputs
+        # follow with the tags 1, 2, ...) and the root rank receives it directly into
+        # the outputs (the tile is a subarray datatype of the screen) between its own
+        # tiles; a rank keeps at most the tile being sent and the tile being computed
+        output_names = list(output_shapes.keys())
+        MPI_dtype = dtlib.from_numpy_dtype(dtype)
+        def receive_tile():
+            k_tile = np.empty(1, dtype = np.int64); status = MPI.Status()
+            comm.Recv(k_tile, source = MPI.ANY_SOURCE, tag = 0, status = status)
+            r_FF_slice, omega_slice = tiles[int(k_tile[0])]
+            for k_name, name in enumerate(output_names):
+                shape = output_shapes[name]
+                tile_type = MPI_dtype.Create_subarray(shape,
+                                                      shape[:-2] + (r_FF_slice.stop - r_FF_slice.start, omega_slice.stop - omega_slice.start),
+                                                      (0,)*(len(shape)-2) + (r_FF_slice.start, omega_slice.start)).Commit()
+                comm.Recv([outputs.array(name), 1, tile_type], source = status.Get_source(), tag = 1 + k_name)
+                tile_type.Free()
         
-        HL_res.entry_plane_transform[
-        rgrid_FF_indices[k_worker]:(rgrid_FF_indices[k_worker]+len(rgrid_FF_parts[k_worker])),
-        ogrid_indices_new[k_worker]:(ogrid_indices_new[k_worker]+len(ogrid_parts[k_worker]))
-        ] = results[k1][1].entry_plane_transform
-
-        HL_res.exit_plane_transform[
-        rgrid_FF_indices[k_worker]:(rgrid_FF_indices[k_worker]+len(rgrid_FF_parts[k_worker])),
-        ogrid_indices_new[k_worker]:(ogrid_indices_new[k_worker]+len(ogrid_parts[k_worker]))
-        ] = results[k1][1].exit_plane_transform            
+        N_received = 0; sent_tile = ([], [])
+        for k_tile in rank_tiles:
+            r_FF_slice, omega_slice = tiles[k_tile]
+            if is_root:
+                compute_tile(k_tile, outputs.tile(r_FF_slice, omega_slice))
+                N_received += 1
+                while comm.Iprobe(source = MPI.ANY_SOURCE, tag = 0):
+                    receive_tile(); N_received += 1
+            else:
+                tile_shape = (r_FF_slice.stop - r_FF_slice.start, omega_slice.stop - omega_slice.start)
+                output_arrays = {name: np.empty(shape[:-2] + tile_shape, dtype = dtype) for name, shape in output_shapes.items()}
+                compute_tile(k_tile, output_arrays)
+                MPI.Request.Waitall(sent_tile[1]) # the previous tile is released
+                buffers = [np.array([k_tile], dtype = np.int64)] + [output_arrays[name] for name in output_names]
+                sent_tile = (buffers, [comm.Isend(buffer, dest = 0, tag = tag) for tag, buffer in enumerate(buffers)])
+        if is_root:
+            while (N_received < N_tiles):
+                receive_tile(); N_received += 1
+        else:
+            MPI.Request.Waitall(sent_tile[1])
+        if not(shared_source_planes): tile_counter.Free()
+    else:
+        tile_queue = mp.Queue() # the tiles to be computed, 'None' stops a worker
+        for k_tile in range(N_tiles): tile_queue.put(k_tile)
+        for _ in range(N_workers): tile_queue.put(None)
+        task_queue = mp.Queue() # que to announce the finished tiles
+        def mp_handle(): # a worker computing the tiles from the queue
+            for k_tile in iter(tile_queue.get, None):
+                compute_tile(k_tile, outputs.tile(*tiles[k_tile]))
+                task_queue.put(k_tile) # the results are already in the shared output arrays
         
-        if 'cumulative_field' in dir(HL_res):
-            HL_res.cumulative_field[:,
-            rgrid_FF_indices[k_worker]:(rgrid_FF_indices[k_worker]+len(rgrid_FF_parts[k_worker])),
-            ogrid_indices_new[k_worker]:(ogrid_indices_new[k_worker]+len(ogrid_parts[k_worker]))
-            ] = results[k1][1].cumulative_field
-            
-        if 'cumulative_field_no_norm' in dir(HL_res):
-            HL_res.cumulative_field_no_norm[:,
-            rgrid_FF_indices[k_worker]:(rgrid_FF_indices[k_worker]+len(rgrid_FF_parts[k_worker])),
-            ogrid_indices_new[k_worker]:(ogrid_indices_new[k_worker]+len(ogrid_parts[k_worker]))
-            ] = results[k1][1].cumulative_field_no_norm
-    
-    
-    ## Save the results
-    with h5py.File('results_Hankel.h5', 'a') as Hres_file:
-        out_group = Hres_file.create_group(MMA.paths['Hankel_outputs'])        
-        mn.adddataset(out_group,
-                      'FF_integrated',
-                      np.stack((HL_res.FF_integrated.real, # real and imaginary parts are in separate dimensions
-                                HL_res.FF_integrated.imag),axis=-1),
-                      '[arb. u.]')        
-        mn.adddataset(out_group,
-                      'entry_plane_transform',
-                      np.stack((HL_res.entry_plane_transform.real, 
-                                HL_res.entry_plane_transform.imag),axis=-1),
-                      '[arb. u.]')
-        mn.adddataset(out_group,
-                      'exit_plane_transform',
-                      np.stack((HL_res.exit_plane_transform.real, 
-                                HL_res.exit_plane_transform.imag),axis=-1),
-                      '[arb. u.]')        
-        mn.adddataset(out_group,
-                      'ogrid',
-                      HL_res.ogrid,
-                      '[SI]')
-        mn.adddataset(out_group,
-                      'rgrid',
-                      HL_res.rgrid,
-                      '[SI]')
-
-        # optional outputs
-        if 'cumulative_field' in dir(HL_res):
-            mn.adddataset(out_group,
-                          'cumulative_field',
-                          np.stack((HL_res.cumulative_field.real, 
-                                    HL_res.cumulative_field.imag),axis=-1),
-                          '[arb. u.]')            
-        if 'cumulative_field_no_norm' in dir(HL_res):
-            mn.adddataset(out_group,
-                          'cumulative_field_no_norm',
-                          np.stack((HL_res.cumulative_field_no_norm.real, 
-                                    HL_res.cumulative_field_no_norm.imag),
-                                    axis=-1),
-                          '[arb. u.]')        
-        if 'zgrid' in dir(HL_res):
-            mn.adddataset(out_group,
-                          'zgrid',
-                          HL_res.zgrid,
-                          '[SI]')
+        # run the processes in parallel, if a worker fails, the others are stopped
+        # and the shared memory is released
+        processes = [mp.Process(target=mp_handle) for _ in range(N_workers)]
+        for p in processes: p.start()
+        try:
+            if shared_source_planes:
+                source_stream.feed(processes)
+            finished = [HT.get_from_workers(task_queue, processes) for _ in range(N_tiles)] # wait for all the tiles
+            for p in processes: p.join()
+        except BaseException:
+            for p in processes: p.terminate()
+            outputs.close()
+            raise
+        finally:
+            if shared_source_planes:
+                source_stream.close()
+    
+    # the results are merged and stored by the root rank only
+    if is_root:
+        # the single-precision results are compared with the double-precision computation
+        # of a subset of the (first) screen (every n-th point in r_FF and omega)
+        if single_precision:
+            check_r_FF = slice(0, Nr_FF, -(-Nr_FF // precision_check_points[0]))
+            check_omega = slice(0, No_sel, -(-No_sel // precision_check_points[1]))
+            check_kwargs = dict(Hankel_long_kwargs, dtype = np.cdouble,
+                                store_cumulative_result = False, store_entry_and_exit_plane_transform = False)
+            if not(pre_factor_tables is None):
+                check_kwargs['pre_factor_tables'] = {name: table[:,check_omega] for name, table in pre_factor_tables.items()}
+            HL_check = HT.Hankel_long(screen_target(check_omega, data_source = reading_source), distance_FF, rgrid_FF[check_r_FF],
+                                      **check_kwargs)
+            precision_errors = HT.precision_report(outputs.array('FF_integrated')[check_r_FF,check_omega],
+                                                   HL_check.FF_integrated)
+            print('single precision, relative errors of the field', precision_errors['field'],
+                  'and of the intensity', precision_errors['intensity'])
+    
+    
+        # the spectrum integrated over the whole angular screen (without J0, see the 'integrated' screen
+        # of 'Hankel_long'), compared with the integral over the computed (first) screen
+        if integrated_spectrum:
+            integrated_kwargs = dict(Hankel_long_kwargs, screen = 'integrated',
+                                     store_cumulative_result = False, store_entry_and_exit_plane_transform = False)
+            if not(pre_factor_tables is None): integrated_kwargs['pre_factor_tables'] = pre_factor_tables
+            spectrum_integrated = HT.Hankel_long(screen_target(slice(None), data_source = reading_source), distance_FF, rgrid_FF,
+                                                 **integrated_kwargs).FF_integrated[0,:].real
+            if not(on_axis_spectrum):
+                spectrum_screen = HT.screen_integrated_spectrum(outputs.array('FF_integrated')[:Nr_FF,:], rgrid_FF)
+                print('integrated spectrum, relative deviation of the screen integral',
+                      np.max(np.abs(spectrum_screen - spectrum_integrated)) / np.max(spectrum_integrated))
+    
+        ## The merged results (views of the shared arrays, the same attributes as Hankel_long for multiple screens) ##
+        HL_res = types.SimpleNamespace(ogrid = omega_au2SI*ogrid_sel,
+                                       rgrid = rgrids_FF,
+                                       distance = distances_FF,
+                                       screen_slices = [slice(k_screen*Nr_FF, (k_screen+1)*Nr_FF) for k_screen in range(N_screens)],
+                                       **{name: outputs.array(name) for name in output_shapes.keys()})
+        if store_cumulative_result:
+            HL_res.zgrid = zgrid_planes
+            HL_res.zgrid_cumulative = zgrid_cumulative
+    
+        def merge_tiles(dsets, tile_file, name): # merge the planes stored by the tiles into the datasets of the screens (plane-by-plane to keep the memory low)
+            tile_h5s = [h5py.File(tile_file % k_tile, 'r') for k_tile in range(N_tiles)]
+            for k1 in range(dsets[0].shape[0]):
+                for k_tile in range(N_tiles):
+                    r_FF_slice, omega_slice = tiles[k_tile]
+                    tile_plane = tile_h5s[k_tile][name][k1,:,:,:]
+                    for k_screen, screen_slice, tile_slice in screen_parts(r_FF_slice):
+                        dsets[k_screen][k1,screen_slice,omega_slice,:] = tile_plane[tile_slice]
+            for tile_h5 in tile_h5s: tile_h5.close()
+            for k_tile in range(N_tiles): os.remove(tile_file % k_tile)
+    
+    
+        ## Merge the raw transforms of the planes
+        if store_raw_transforms:
+            with h5py.File(raw_transforms_file, 'w') as raw_file:
+                raw_dset = HT.prepare_raw_transforms_output(raw_file,
+                                                            zgrid_planes,
+                                                            rgrid_planes,
+                                                            HL_res.ogrid,
+                                                            rgrid_FF,
+                                                            distance_FF,
+                                                            near_field_factor,
+                                                            dtype = np.finfo(dtype).dtype)
+                merge_tiles([raw_dset], raw_transforms_tile_file, 'raw_plane_transforms')
+            print('Raw transforms of the planes stored in', raw_transforms_file)
+    
+    
+        ## Save the results
+        with h5py.File('results_Hankel.h5', 'a') as Hres_file:
+            out_group = Hres_file.create_group(MMA.paths['Hankel_outputs'])
+            # the additional screens are stored in the subgroups 'screen_1', 'screen_2', ...
+            screen_groups = [out_group] + [out_group.create_group('screen_%d' % k_screen) for k_screen in range(1, N_screens)]
+            for k_screen, screen_group in enumerate(screen_groups):
+                HT.save_Hankel_long_outputs(HT.screen_outputs(HL_res, k_screen), screen_group)
+                if (k_screen > 0): mn.adddataset(screen_group, 'distance_FF', distances_FF[k_screen], '[SI]')
+            if store_cumulative_result and stream_cumulative_result:
+                merge_tiles([HT.prepare_planes_output(screen_group, 'cumulative_field', len(zgrid_cumulative), Nr_FF, No_sel,
+                                                      dtype = np.finfo(dtype).dtype) for screen_group in screen_groups],
+                            cumulative_tile_file, 'cumulative_field')
+            if integrated_spectrum:
+                mn.adddataset(out_group, 'integrated_spectrum', spectrum_integrated, '[arb. u.]')
+                if not(on_axis_spectrum): mn.adddataset(out_group, 'integrated_spectrum_screen', spectrum_screen, '[arb. u.]')
+            if single_precision:
+                mn.adddataset(out_group, 'single_precision_error_field', precision_errors['field'], '[-]')
+                mn.adddataset(out_group, 'single_precision_error_intensity', precision_errors['intensity'], '[-]')
+    
+        del HL_res # release the views before the shared memory
+        outputs.close()
+    
+        # the results are stored, the checkpoints are not needed anymore
+        if (checkpoint_interval > 0):
+            for k_tile in range(N_tiles): HT.remove_Hankel_checkpoint(checkpoint_tile_file % k_tile)
 
-print('The parallel Hankel transform finishes.')
\ No newline at end of file
+if is_root: print('The parallel Hankel transform finishes.')
\ No newline at end of file
@@ -0,0 +1,78 @@
+"""
+This script re-computes the longitudinal integral of the Hankel stage from the raw
+transforms of the planes stored by 'Hankel_long_medium_parallel_cluster.py'
+(the input 'store_raw_transforms' = 1). The Hankel transforms are not evaluated again,
+only the pre-factor of the medium is applied, so the medium configuration can be
+changed in seconds. It is possible for scalar pressure and z-modulated density.
+
+The medium is read from the archive specified in 'msg.tmp' and can be adjusted by
+the command-line options (see '-h').
+"""
+import argparse
+import h5py
+
+import MMA_administration as MMA
+import units
+import mynumerics as mn
+import Hankel_transform as HT
+
+ap = argparse.ArgumentParser()
+ap.add_argument('-i', '--raw-transforms', default='Hankel_raw_transforms.h5',
+                help='The file with the raw transforms of the planes.')
+ap.add_argument('-o', '--output', default='results_Hankel.h5',
+                help='The output file, the results are stored in the Hankel-outputs group.')
+ap.add_argument('--dispersion-tables', choices=['NIST', 'Henke'], help='Overrides XUV_table_type_dispersion.')
+ap.add_argument('--absorption-tables', choices=['NIST', 'Henke'], help='Overrides XUV_table_type_absorption.')
+ap.add_argument('--no-dispersion', action='store_true')
+ap.add_argument('--no-absorption', action='store_true')
+ap.add_argument('--pressure-scale', type=float, default=1., help='Rescales the pressure (including its modulation).')
+ap.add_argument('--effective-IR-refractive-index', type=float,
+                help='Overrides the effective IR refractive index (by default obtained from the group velocity of CUPRAD).')
+ap.add_argument('--integrator-longitudinal', choices=['trapezoidal', 'simpson', 'filon'], default='trapezoidal')
+ap.add_argument('--store-cumulative-result', action='store_true')
+args = ap.parse_args()
+
+# specify the input archove tranferred in the temporary file 'msg.tmp'
+with open('msg.tmp','r') as msg_file:
+    file = msg_file.readline()[:-1] # need to strip the last character due to Fortran msg.tmp
+
+with h5py.File(file, 'r') as InpArch:
+    inp_group = InpArch[MMA.paths['Hankel_inputs']]
+    XUV_table_type_diffraction = mn.readscalardataset(inp_group, 'XUV_table_type_dispersion','S')
+    XUV_table_type_absorption = mn.readscalardataset(inp_group, 'XUV_table_type_absorption','S')
+
+    inverse_GV_IR = InpArch[MMA.paths['CUPRAD_logs']+'/inverse_group_velocity_SI'][()]
+    pressure = MMA.pressure_constructor(InpArch)
+    preset_gas = mn.readscalardataset(InpArch,MMA.paths['global_inputs']+'/gas_preset','S')
+    effective_IR_refrective_index = inverse_GV_IR*units.c_light
+
+if not(args.dispersion_tables is None): XUV_table_type_diffraction = args.dispersion_tables
+if not(args.absorption_tables is None): XUV_table_type_absorption = args.absorption_tables
+if not(args.effective_IR_refractive_index is None): effective_IR_refrective_index = args.effective_IR_refractive_index
+if isinstance(pressure,dict):
+    pressure['value'] = args.pressure_scale * pressure['value']
+else:
+    pressure = args.pressure_scale * pressure
+
+print('processing:', args.raw_transforms)
+with h5py.File(args.raw_transforms, 'r') as raw_file:
+    target = HT.FField_FF_provider(raw_file, '/')
+    HL_res = HT.Hankel_long(target,
+                            target.distance,
+                            target.rgrid_FF,
+                            preset_gas = preset_gas,
+                            pressure = pressure,
+                            absorption_tables = XUV_table_type_absorption,
+                            include_absorption = not(args.no_absorption),
+                            dispersion_tables = XUV_table_type_diffraction,
+                            include_dispersion = not(args.no_dispersion),
+                            effective_IR_refrective_index = effective_IR_refrective_index,
+                            integrator_longitudinal = args.integrator_longitudinal,
+                            near_field_factor = target.near_field_factor,
+                            store_cumulative_result = args.store_cumulative_result)
+
+with h5py.File(args.output, 'a') as Hres_file:
+    out_group = Hres_file.create_group(MMA.paths['Hankel_outputs'])
+    HT.save_Hankel_long_outputs(HL_res, out_group)
+
+print('The re-integration of the raw transforms finishes.')
@@ -3,20 +3,49 @@ This module contains collection of classes and functions for computing Hankel tr
 (the diffraction integral to obtain far-field signal) incorporating also the longitudinal
 integration accounting for phase-matching. THe content is the following:
 - FSource_provider: a class transforming heterogenous input-streams into the form suitable for Hankel_long
+- Shared_FSource_stream: a single reader of the source planes sharing them with more processes
+- MPI_FSource_stream: the same for MPI ranks, the planes are broadcast from a single reader
+- TDSE_temporary_files: the index of the per-process files of 1DTDSE, the planes are read without merging them
+  (optionally streamed while TDSE is running)
+- harmonic_window_indices, source_spectral_power: the selection of the frequencies for FSources_provider
+- Shared_output_arrays: outputs of Hankel_long in shared memory, the workers write their parts of the screen directly
+- screen_tiles: splitting of the screen into tiles for parallel workers
+- FField_FF_provider: a class providing stored raw transforms of the planes for a fast re-integration by Hankel_long
+- tabulated_j0: a fast evaluator of J0 for the kernels of HankelTransform
+- Kernel_cache: LRU cache (with an optional store on disk) of the kernels of HankelTransform
 - get_propagation_pre_factor_function: this function obtains the prefactor for the longitudinal integration
+- get_pre_factor_tables: the pre-factor for all the planes, it can be computed once and shared by more workers
 - HankelTransform: The core routine performing the Hankel transform from a single plane
+- HankelTransform_batch: Hankel transforms of a stack of independent (thin-target) planes sharing the kernels
 - Hankel_long: The main class of this module providing Hankel transform if the longitudinaly integrated signal
+- screen_integrated_spectrum: the spectrum integrated over a computed screen
+- screen_outputs: the outputs of one screen of Hankel_long computed for multiple screens
+- precision_report: the errors of a (single-precision) result with respect to a reference
+- save_Hankel_long_outputs: stores the outputs of Hankel_long in an hdf5-group
+- write_Hankel_checkpoint, read_Hankel_checkpoint, remove_Hankel_checkpoint: the running state of Hankel_long for restarts
 
 @author: Jan Vábek
 """
 import numpy as np
+import h5py
+import os
+import glob
+import hashlib
+import collections
 import mynumerics as mn
 import time
+import types
+import warnings
+import threading
+import queue
+import multiprocessing as mp
+from multiprocessing import shared_memory
 import units
 import XUV_refractive_index as XUV_index
 from scipy import interpolate
 from scipy import integrate
 from scipy import special
+from scipy import fft
 
 
 def trapezoidal_integrator(y,x):
@@ -26,6 +55,48 @@ def trapezoidal_integrator(y,x):
     """
     return integrate.trapezoid(y,x=x)
 
+def prefetched_planes(read_plane, N_planes, buffers):
+    """
+    The generator yielding 'read_plane(k,buffer)' for k = 0, ..., N_planes-1. The
+    planes are read ahead by a background thread into the ring of 'buffers', so
+    the reading overlaps with the computation. It reads at most len(buffers)-2 planes
+    ahead: one buffer is held by the consumer and one is being filled. A yielded
+    plane is thus valid only until the next plane is requested.
+    """
+    planes_queue = queue.Queue(maxsize = len(buffers)-2)
+    
+    def producer():
+        try:
+            for k1 in range(N_planes):
+                planes_queue.put(read_plane(k1, buffers[k1 % len(buffers)]))
+        except Exception as error: # pass the error to the consumer
+            planes_queue.put(error)
+            
+    # the thread starts with the first request, i.e. in the process that consumes the planes
+    threading.Thread(target = producer, daemon = True).start()
+    for k1 in range(N_planes):
+        plane = planes_queue.get()
+        if isinstance(plane, Exception): raise plane
+        yield plane
+
+
+def index_runs(indices):
+    """
+    It splits the increasing 'indices' into arithmetic progressions (greedily). It
+    returns the list of the pairs (slice of the indices, slice of their positions in
+    'indices'), a non-contiguous selection is thus read by a few hyperslabs.
+    """
+    runs = []; start = 0; N = len(indices)
+    while (start < N):
+        stop = start + 1; step = 1
+        if (stop < N):
+            step = indices[stop] - indices[start]
+            while (stop < N) and (indices[stop] - indices[stop-1] == step): stop += 1
+        runs.append((slice(int(indices[start]), int(indices[stop-1])+1, int(step)), slice(start, stop)))
+        start = stop
+    return runs
+
+
 class FSources_provider:
     """
     This class provides all the necessary inputs related to the
@@ -39,8 +110,24 @@ class FSources_provider:
         This structure is chosen because it allows flexible use for large inputs:
         The FField can be a whole static array in the memory, or it can be read
         plane-by-plne from the input hdf5.
+        The frequencies are selected by 'ko_min', 'ko_max' and 'ko_step' or by
+        an increasing list 'ko_indices' (e.g. windows around harmonics), which is
+        read by a hyperslab for each arithmetic progression in the list.
         ! NOTE: if 'dynamic' is used, the source data-stream must be available
                 (e.g. inside a 'with' block)
+        ! NOTE: if 'dynamic' is used, the yielded planes are views of reusable
+                buffers, they are valid only until the next plane is requested.
+                Each plane is read at once (both real and imaginary parts) and
+                'prefetch' planes are read ahead by a background thread
+                ('prefetch' = 0 reads synchronously).
+        ! NOTE: if 'shared' is used, the planes are provided by 'shared_stream'
+                (the class Shared_FSource_stream) read by another process,
+                'consumer' is the index of this consumer. The yielded planes are
+                valid only until the next plane is requested.
+        ! NOTE: if 'temporary_files' is used, the planes are read directly from
+                the per-process files of 1DTDSE indexed by 'temporary_files'
+                (the class TDSE_temporary_files), the grids are the coarse
+                grids of TDSE. The planes are prefetched as for 'dynamic'.
     """
     
     def __init__(self, # static=None,dynamic=None,
@@ -54,27 +141,75 @@ class FSources_provider:
                  ko_max  = 'end',
                  kr_step =  1,
                  kr_max  = 'end',
-                 kz_step =  1):
+                 kz_step =  1,
+                 ko_indices = None,
+                 prefetch = 2,
+                 shared_stream = None,
+                 consumer = 0,
+                 temporary_files = None):
 
         # if (Nproc == 1)
         if (ko_max  == 'end'): ko_max = len(ogrid)
         if (kr_max  == 'end'): kr_max = len(rgrid)
+        if (ko_indices is None): ko_indices = np.arange(ko_min, ko_max, ko_step)
+        self.ko_indices = np.asarray(ko_indices)
+        ko_runs = index_runs(self.ko_indices)
         self.zgrid = zgrid[0:-1:kz_step]
         self.rgrid = rgrid[0:kr_max:kr_step]
-        self.ogrid = ogrid[ko_min:ko_max:ko_step]
+        self.ogrid = ogrid[self.ko_indices]
         
         if (data_source == 'static'):
+            ko_selection = ko_runs[0][0] if (len(ko_runs) == 1) else self.ko_indices
             def FSource_plane_():
                 for k1 in range(len(self.zgrid)):
-                    yield FSource[k1*kz_step,ko_min:ko_max:ko_step,0:kr_max:kr_step]
+                    yield FSource[k1*kz_step,ko_selection,0:kr_max:kr_step]
             self.Fsource_plane = FSource_plane_()
         elif (data_source == 'dynamic'):
+            # the buffers [r,omega,(real,imag)] are viewed as complex arrays [r,omega] without copying
+            plane_shape = (len(self.rgrid), len(self.ogrid), 2)
+            def read_plane(k1, buffer):
+                for ko_source, ko_buffer in ko_runs:
+                    h5_handle[h5_path].read_direct(buffer,
+                                                   np.s_[k1*kz_step,0:kr_max:kr_step,ko_source,:],
+                                                   np.s_[:,ko_buffer,:])
+                return buffer.view(np.cdouble)[:,:,0].T
+            
+            if (prefetch > 0):
+                def FSource_plane_():
+                    buffers = [np.empty(plane_shape, dtype=np.double) for _ in range(prefetch+2)]
+                    yield from prefetched_planes(read_plane, len(self.zgrid), buffers)
+            else:
+                def FSource_plane_():
+                    buffer = np.empty(plane_shape, dtype=np.double)
+                    for k1 in range(len(self.zgrid)):
+                        yield read_plane(k1, buffer)
+            self.Fsource_plane = FSource_plane_()
+        elif (data_source == 'shared'):
+            # this provider views a subarray of the plane read by the stream
+            ko_start = np.searchsorted(shared_stream.ko_indices, self.ko_indices[0])
+            ko_selection = slice(ko_start, ko_start + len(self.ogrid))
+            if not(np.array_equal(shared_stream.ko_indices[ko_selection], self.ko_indices) and (kr_step == shared_stream.kr_step) and
+                   (kz_step == shared_stream.kz_step) and (len(self.rgrid) == len(shared_stream.rgrid))):
+                raise ValueError('The selection does not correspond to the shared stream.')
             def FSource_plane_():
-                for k1 in range(len(self.zgrid)):
-                    yield np.squeeze(
-                            h5_handle[h5_path][k1*kz_step,0:kr_max:kr_step,ko_min:ko_max:ko_step,0]
-                            +
-                            1j*h5_handle[h5_path][k1*kz_step,0:kr_max:kr_step,ko_min:ko_max:ko_step,1]).T
+                for plane in shared_stream.planes(consumer):
+                    yield plane[ko_selection,:]
+            self.Fsource_plane = FSource_plane_()
+        elif (data_source == 'temporary_files'):
+            kr_indices = np.arange(len(rgrid))[0:kr_max:kr_step]
+            def read_plane(k1, buffer):
+                return temporary_files.read_plane(k1*kz_step, self.ko_indices, kr_indices, buffer)
+            
+            plane_shape = (len(self.ogrid), len(self.rgrid))
+            if (prefetch > 0):
+                def FSource_plane_():
+                    buffers = [np.empty(plane_shape, dtype=np.cdouble) for _ in range(prefetch+2)]
+                    yield from prefetched_planes(read_plane, len(self.zgrid), buffers)
+            else:
+                def FSource_plane_():
+                    buffer = np.empty(plane_shape, dtype=np.cdouble)
+                    for k1 in range(len(self.zgrid)):
+                        yield read_plane(k1, buffer)
             self.Fsource_plane = FSource_plane_()
         else:
             raise ValueError('Wrongly specified input of the class.')
@@ -82,6 +217,485 @@ class FSources_provider:
             
                 
 
+class Shared_FSource_stream:
+    """
+    This class reads the source planes from the hdf5 dataset by a single process
+    and shares them with more consumer processes (multiprocessing) through a ring of
+    shared-memory buffers. The I/O volume is thus independent of the number of
+    consumers. The consumers access the planes by 'FSources_provider' with
+    data_source = 'shared' (zero-copy views of the buffers).
+    
+    The reader calls 'feed()', each plane is then read once (both real and imaginary
+    parts) into a free buffer and announced to all the consumers. A buffer is reused
+    after all the consumers request the next plane. The instance must be created
+    before the consumer processes are started and 'close()' releases the shared memory
+    (also when a consumer fails, 'feed' checks the consumer processes while waiting).
+    
+    Attributes:
+        zgrid, rgrid, ogrid: the grids of the selection (analogous to FSources_provider)
+        ko_indices, kr_step, kz_step: the selection in the original grids
+    """
+    
+    def __init__(self,
+                 zgrid, rgrid, ogrid,
+                 h5_handle,
+                 h5_path,
+                 N_consumers,
+                 ko_min  =  0,
+                 ko_step =  1,
+                 ko_max  = 'end',
+                 kr_step =  1,
+                 kr_max  = 'end',
+                 kz_step =  1,
+                 ko_indices = None,
+                 N_buffers = 4):
+        
+        if (ko_max  == 'end'): ko_max = len(ogrid)
+        if (kr_max  == 'end'): kr_max = len(rgrid)
+        if (ko_indices is None): ko_indices = np.arange(ko_min, ko_max, ko_step)
+        self.ko_indices = np.asarray(ko_indices)
+        self.zgrid = zgrid[0:-1:kz_step]
+        self.rgrid = rgrid[0:kr_max:kr_step]
+        self.ogrid = ogrid[self.ko_indices]
+        self.kr_step = kr_step; self.kz_step = kz_step
+        
+        self.h5_handle = h5_handle
+        self.h5_path = h5_path
+        self.selections = [(np.s_[0:kr_max:kr_step,ko_source,:], np.s_[:,ko_buffer,:])
+                           for ko_source, ko_buffer in index_runs(self.ko_indices)]
+        self.N_consumers = N_consumers
+        
+        # buffers [r,omega,(real,imag)] and the synchronisation: the announcements
+        # of filled buffers for each consumer and the counts of the released buffers
+        self.plane_shape = (len(self.rgrid), len(self.ogrid), 2)
+        plane_size = int(np.prod(self.plane_shape)) * np.dtype(np.double).itemsize
+        self.shared_buffers = [shared_memory.SharedMemory(create = True, size = plane_size)
+                               for _ in range(N_buffers)]
+        self.filled = [mp.Queue() for _ in range(N_consumers)]
+        self.released = [mp.Semaphore(0) for _ in range(N_buffers)]
+        
+    def buffer(self, k_buffer):
+        return np.ndarray(self.plane_shape, dtype = np.double,
+                          buffer = self.shared_buffers[k_buffer].buf)
+        
+    def feed(self, processes = [], poll_interval = 1.):
+        """
+        It reads all the planes, it is called by the reader. The consumer 'processes'
+        are checked every 'poll_interval' seconds while waiting for them.
+        """
+        N_buffers = len(self.shared_buffers)
+        for k1 in range(len(self.zgrid)):
+            k_buffer = k1 % N_buffers
+            if (k1 >= N_buffers): # wait till all the consumers release the buffer
+                for _ in range(self.N_consumers):
+                    while not(self.released[k_buffer].acquire(timeout = poll_interval)):
+                        check_processes(processes)
+            for source_selection, buffer_selection in self.selections:
+                self.h5_handle[self.h5_path].read_direct(self.buffer(k_buffer),
+                                                         (k1*self.kz_step,) + source_selection,
+                                                         buffer_selection)
+            for filled in self.filled: filled.put(k_buffer)
+            
+    def planes(self, consumer):
+        """The generator of the planes [omega,r] for the consumer 'consumer'."""
+        k_buffer_previous = None
+        for k1 in range(len(self.zgrid)):
+            if not(k_buffer_previous is None): self.released[k_buffer_previous].release()
+            k_buffer = self.filled[consumer].get()
+            yield self.buffer(k_buffer).view(np.cdouble)[:,:,0].T
+            k_buffer_previous = k_buffer
+            
+    def close(self):
+        for shared_buffer in self.shared_buffers:
+            shared_buffer.close()
+            shared_buffer.unlink()
+
+
+class MPI_FSource_stream:
+    """
+    This class is the MPI analogy of 'Shared_FSource_stream': the source planes
+    are read from the hdf5 dataset only by the rank 'root' and broadcast to all
+    the ranks of the communicator 'comm' (mpi4py). The consumers access the planes
+    by 'FSources_provider' with data_source = 'shared'. The broadcast is collective,
+    all the ranks must thus consume all the planes (in the same order).
+
+    Attributes:
+        zgrid, rgrid, ogrid: the grids of the selection (analogous to FSources_provider)
+        ko_indices, kr_step, kz_step: the selection in the original grids
+    """
+
+    def __init__(self,
+                 zgrid, rgrid, ogrid,
+                 h5_handle,
+                 h5_path,
+                 comm,
+                 root = 0,
+                 ko_min  =  0,
+                 ko_step =  1,
+                 ko_max  = 'end',
+                 kr_step =  1,
+                 kr_max  = 'end',
+                 kz_step =  1,
+                 ko_indices = None):
+
+        if (ko_max  == 'end'): ko_max = len(ogrid)
+        if (kr_max  == 'end'): kr_max = len(rgrid)
+        if (ko_indices is None): ko_indices = np.arange(ko_min, ko_max, ko_step)
+        self.ko_indices = np.asarray(ko_indices)
+        self.zgrid = zgrid[0:-1:kz_step]
+        self.rgrid = rgrid[0:kr_max:kr_step]
+        self.ogrid = ogrid[self.ko_indices]
+        self.kr_step = kr_step; self.kz_step = kz_step
+
+        self.h5_handle = h5_handle
+        self.h5_path = h5_path
+        self.selections = [(np.s_[0:kr_max:kr_step,ko_source,:], np.s_[:,ko_buffer,:])
+                           for ko_source, ko_buffer in index_runs(self.ko_indices)]
+        self.comm = comm; self.root = root
+
+        # buffer [r,omega,(real,imag)]
+        self.buffer = np.empty((len(self.rgrid), len(self.ogrid), 2), dtype = np.double)
+
+    def planes(self, consumer = None):
+        """The generator of the planes [omega,r], the plane is valid till the next one is requested."""
+        for k1 in range(len(self.zgrid)):
+            if (self.comm.Get_rank() == self.root):
+                for source_selection, buffer_selection in self.selections:
+                    self.h5_handle[self.h5_path].read_direct(self.buffer,
+                                                             (k1*self.kz_step,) + source_selection,
+                                                             buffer_selection)
+            self.comm.Bcast(self.buffer, root = self.root)
+            yield self.buffer.view(np.cdouble)[:,:,0].T
+
+
+class TDSE_temporary_files:
+    """
+    This class indexes the per-process output files of 1DTDSE ('hdf5_temp_*.h5'),
+    so the source planes can be read directly from them without merging them into
+    the archive ('1DTDSE/python/merge.py'), see 'FSources_provider' with
+    data_source = 'temporary_files'.
+    
+    Each file contains the simulations computed by one process, FSourceTerm
+    [omega,(real,imag),simulation], and their 'keys' = kr + kz*Nr_orig in the
+    coarse grids (see 'mn.n1n2mapping', the unused keys are -1). The keys are read
+    once and sorted, a plane is then found in each file by a binary search and read
+    by a hyperslab for each run of its simulations (the keys of a process increase,
+    so the simulations of a plane are usually contiguous). 'refresh()' reads the
+    keys added since, e.g. for the files still written by TDSE.
+    
+    ! NOTE: with 'streaming', the files are read while TDSE is running:
+            'file_names' is a glob pattern evaluated again by each 'refresh()'
+            (the files are created by the processes of TDSE with their first
+            simulation), 'read_plane' waits until all the radial points of the
+            plane are stored (polling every 'poll_interval' seconds, at most
+            'timeout' seconds if specified). A simulation is counted once
+            'number_of_local_simulations' includes it, TDSE flushes the outputs
+            before updating this counter (the commit marker), so the simulations
+            counted are complete. The files are opened without the HDF5 file
+            locking (TDSE is never blocked) and without the sieve buffer (the raw
+            data are always read from the file). The handles are kept open once
+            a file has a committed simulation, each 'refresh()' then reads only
+            the counters and the new keys.
+    
+    Attributes:
+        zgrid, rgrid, ogrid: the coarse grids of TDSE ('zgrid_coarse', 'rgrid_coarse', 'omegagrid')
+        Nz, Nr: the numbers of the planes and of the radial points of the coarse grids
+    """
+    
+    def __init__(self, file_names, streaming = False, poll_interval = 10., timeout = None):
+        if isinstance(file_names, str):
+            self.file_pattern = file_names; self.file_names = []
+        else:
+            self.file_pattern = None; self.file_names = sorted(file_names)
+        self.streaming = streaming; self.poll_interval = poll_interval; self.timeout = timeout
+        self.handles = {}; self.handles_pid = None
+        self.file_keys = [np.zeros(0, dtype = int) for _ in self.file_names]
+        
+        t_start = time.perf_counter()
+        while True:
+            self.refresh()
+            try:
+                with self.open_file(self.file_names[0]) as temporary_file:
+                    self.ogrid = temporary_file['omegagrid'][()]
+                    self.rgrid = temporary_file['rgrid_coarse'][()]
+                    self.zgrid = temporary_file['zgrid_coarse'][()]
+                    self.Nr = int(mn.readscalardataset(temporary_file, 'Nr_orig', 'N')[0])
+                    self.Nz = int(mn.readscalardataset(temporary_file, 'Nz_orig', 'N')[0])
+                break
+            except (IndexError, OSError, KeyError):
+                if not(self.streaming):
+                    raise ValueError('No readable temporary files of TDSE given.')
+                self.wait(t_start, 'the temporary files of TDSE')
+        self.close() # the handles are opened by each process that reads (e.g. the forked workers)
+    
+    def open_file(self, file_name):
+        if not(self.streaming): return h5py.File(file_name, 'r')
+        file_access = h5py.h5p.create(h5py.h5p.FILE_ACCESS)
+        file_access.set_file_locking(False, True)
+        file_access.set_sieve_buf_size(0)
+        return h5py.File(h5py.h5f.open(os.fsencode(file_name), h5py.h5f.ACC_RDONLY, file_access))
+    
+    def wait(self, t_start, awaited):
+        if not(self.timeout is None) and (time.perf_counter() - t_start > self.timeout):
+            raise ValueError('Timeout when waiting for '+awaited+'.')
+        time.sleep(self.poll_interval)
+    
+    def refresh(self):
+        """It reads the new keys of all the files (and finds the new files for a glob pattern)."""
+        if not(self.file_pattern is None):
+            new_files = sorted(set(glob.glob(self.file_pattern)) - set(self.file_names))
+            self.file_names += new_files
+            self.file_keys += [np.zeros(0, dtype = int) for _ in new_files]
+        for k_file in range(len(self.file_names)):
+            try:
+                temporary_file = self.handle(k_file)
+                N_local = int(mn.readscalardataset(temporary_file, 'number_of_local_simulations', 'N')[0])
+                N_known = len(self.file_keys[k_file])
+                if (N_local > N_known):
+                    self.file_keys[k_file] = np.concatenate((self.file_keys[k_file], temporary_file['keys'][N_known:N_local]))
+            except (OSError, KeyError): # the file is just being created
+                if not(self.streaming): raise
+                N_local = 0
+            if (N_local == 0): self.close_file(k_file) # opened again when the file is complete
+        if not(self.streaming): self.close()
+        
+        self.sorted_keys = []; self.key_order = []
+        for keys in self.file_keys:
+            order = np.flatnonzero(keys >= 0)
+            order = order[np.argsort(keys[order], kind='stable')]
+            self.sorted_keys.append(keys[order]); self.key_order.append(order)
+    
+    def complete_planes(self):
+        """The boolean array [kz], True for the planes with all the radial points computed."""
+        counts = np.bincount(np.concatenate(self.sorted_keys) // self.Nr, minlength = self.Nz)
+        return (counts[:self.Nz] == self.Nr)
+    
+    def handle(self, k_file):
+        # the files are opened by each process separately (e.g. the forked workers)
+        if not(self.handles_pid == os.getpid()):
+            self.handles = {}; self.handles_pid = os.getpid()
+        if not(k_file in self.handles):
+            self.handles[k_file] = self.open_file(self.file_names[k_file])
+        return self.handles[k_file]
+    
+    def read_plane(self, kz, ko_indices, kr_indices, plane):
+        """
+        It reads the plane 'kz' on the increasing indices 'ko_indices' and 'kr_indices'
+        of the coarse grids into 'plane'[omega,r] (complex) and returns it.
+        """
+        if self.streaming and not(self.complete_planes()[kz]):
+            t_start = time.perf_counter()
+            while True:
+                self.refresh()
+                if self.complete_planes()[kz]: break
+                self.wait(t_start, 'the plane '+str(kz)+' from TDSE')
+            print('plane', kz, 'received from TDSE after waiting', time.perf_counter() - t_start, 's')
+        return self.read_indexed_plane(kz, ko_indices, kr_indices, plane)
+    
+    def read_indexed_plane(self, kz, ko_indices, kr_indices, plane):
+        ko_indices = np.asarray(ko_indices)
+        ko_range = slice(int(ko_indices[0]), int(ko_indices[-1])+1)
+        kr_positions = np.full(self.Nr, -1); kr_positions[kr_indices] = np.arange(len(kr_indices))
+        N_read = 0
+        for k_file, keys in enumerate(self.sorted_keys):
+            first, last = np.searchsorted(keys, [kz*self.Nr, (kz+1)*self.Nr])
+            if (first == last): continue
+            simulations = self.key_order[k_file][first:last]
+            simulation_order = np.argsort(simulations)
+            simulations = simulations[simulation_order]
+            positions = kr_positions[keys[first:last][simulation_order] - kz*self.Nr]
+            for simulation_selection, run in index_runs(simulations):
+                selected = (positions[run] >= 0)
+                if not(selected.any()): continue
+                data = self.handle(k_file)['FSourceTerm'][ko_range,:,simulation_selection][ko_indices - ko_range.start]
+                plane[:,positions[run][selected]] = data[:,0,selected] + 1j*data[:,1,selected]
+                N_read += np.count_nonzero(selected)
+        if not(N_read == len(kr_indices)):
+            raise ValueError('The plane '+str(kz)+' is not complete in the temporary files of TDSE.')
+        return plane
+    
+    def close_file(self, k_file):
+        if (self.handles_pid == os.getpid()) and (k_file in self.handles):
+            self.handles.pop(k_file).close()
+    
+    def close(self):
+        if (self.handles_pid == os.getpid()):
+            for handle in self.handles.values(): handle.close()
+        self.handles = {}
+
+
+def harmonic_window_indices(ogrid, omega0, harmonic_orders, half_width):
+    """
+    It returns the indices of 'ogrid' within the windows |omega/omega0 - H| <= half_width
+    around the harmonic orders H in 'harmonic_orders' (for 'ko_indices' of 'FSources_provider').
+    """
+    orders = np.asarray(ogrid) / omega0
+    return np.flatnonzero(np.any(np.abs(orders[:,np.newaxis] - np.asarray(harmonic_orders)[np.newaxis,:]) <= half_width,
+                                 axis = 1))
+
+
+def source_spectral_power(target):
+    """
+    It returns the spectral power of the source sum_z int |source|^2 r dr [omega]
+    on 'target.ogrid' (the class FSources_provider, all the planes are read once).
+    It is used to select the frequencies where the source is significant.
+    """
+    power = np.zeros(len(target.ogrid))
+    for plane in target.Fsource_plane:
+        power += integrate.trapezoid(target.rgrid * np.abs(plane)**2, x=target.rgrid, axis=-1)
+    return power
+
+
+def check_processes(processes):
+    """It raises an error if any of the worker 'processes' failed (an exception, killed, ...)."""
+    for process in processes:
+        if not(process.is_alive()) and not(process.exitcode == 0):
+            raise RuntimeError('A worker process failed with the exit code '+str(process.exitcode)+'.')
+
+
+def get_from_workers(results_queue, processes, poll_interval = 1.):
+    """
+    It returns the next item of 'results_queue' filled by the worker 'processes',
+    the workers are checked every 'poll_interval' seconds, so a failed worker
+    raises an error instead of waiting forever.
+    """
+    while True:
+        try:
+            return results_queue.get(timeout = poll_interval)
+        except queue.Empty:
+            check_processes(processes)
+
+
+class Shared_output_arrays:
+    """
+    This class allocates the outputs of 'Hankel_long' for the whole screen in
+    shared memory (multiprocessing). The workers computing the subarrays of the
+    screen (tiles) write directly into these arrays (the 'output_arrays' of
+    'Hankel_long'), the results are thus assembled without any copying or pickling.
+    The instance must be created before the worker processes are started and
+    'close()' releases the shared memory.
+    
+    Attributes:
+        shapes (dict): the shapes of the outputs, the screen [r_FF,omega] is in the last two dimensions
+    """
+    
+    def __init__(self, shapes, dtype = np.cdouble):
+        self.shapes = shapes
+        self.dtype = np.dtype(dtype)
+        self.shared_buffers = {name: shared_memory.SharedMemory(create = True,
+                                                                size = max(1,int(np.prod(shape)) * self.dtype.itemsize))
+                               for name, shape in shapes.items()}
+        
+    def array(self, name):
+        return np.ndarray(self.shapes[name], dtype = self.dtype,
+                          buffer = self.shared_buffers[name].buf)
+    
+    def tile(self, r_FF_slice, omega_slice):
+        """The views of all the outputs restricted to the tile [r_FF_slice, omega_slice]."""
+        return {name: self.array(name)[..., r_FF_slice, omega_slice] for name in self.shapes.keys()}
+    
+    def close(self):
+        for shared_buffer in self.shared_buffers.values():
+            shared_buffer.close()
+            shared_buffer.unlink()
+
+
+def screen_tiles(N_r_FF, N_omega, tile_size_r_FF, tile_size_omega):
+    """
+    It splits the screen [r_FF,omega] into rectangular tiles with at most
+    'tile_size_r_FF' x 'tile_size_omega' points (the tiles in each dimension
+    are balanced by 'np.array_split'). The tiles are given by their coordinates
+    (r_FF_slice, omega_slice) on the screen, these are used both to compute
+    and to store the subarrays.
+    """
+    def splitting(N, tile_size):
+        N_parts = -(-N // max(1,min(tile_size,N))) # ceiling
+        bounds = np.cumsum([0] + [len(part) for part in np.array_split(np.arange(N), N_parts)])
+        return [slice(int(bounds[k1]), int(bounds[k1+1])) for k1 in range(N_parts)]
+    
+    return [(r_FF_slice, omega_slice) for omega_slice in splitting(N_omega, tile_size_omega)
+                                      for r_FF_slice in splitting(N_r_FF, tile_size_r_FF)]
+
+
+class FField_FF_provider:
+    """
+    This class provides the raw transforms of the planes stored by 'Hankel_long'
+    (see its option 'raw_transforms_output'). The raw transform is the far-field
+    of a single plane without the pre-factor. The pre-factor is independent of r
+    for scalar pressure and z-modulated density, so it commutes with the radial
+    transform and the longitudinal integral can be re-computed for any medium
+    without repeating the transforms. The class contains:
+        ogrid: frequency grid of the field
+        rgrid: radial grid of the source planes
+        zgrid: longitudinal grid
+        rgrid_FF: radial grid of the far-field screen
+        distance: the distance of the screen used for the transforms
+        near_field_factor: whether the near-field factor was included
+        FField_FF_plane: the generator yielding the raw transforms (FField_FF[r_FF,omega])
+                         along the z-grid
+        ! NOTE: the source data-stream must be available (e.g. inside a 'with' block)
+    """
+    
+    def __init__(self, h5_handle, h5_path):
+        
+        raw_group = h5_handle[h5_path]
+        self.zgrid = raw_group['zgrid'][:]
+        self.rgrid = raw_group['rgrid'][:]
+        self.ogrid = raw_group['ogrid'][:]
+        self.rgrid_FF = raw_group['rgrid_FF'][:]
+        self.distance = raw_group['distance'][()]
+        self.near_field_factor = (raw_group['near_field_factor'][()] == 1)
+        
+        def FField_FF_plane_():
+            for k1 in range(len(self.zgrid)):
+                plane = raw_group['raw_plane_transforms'][k1,:,:,:]
+                yield plane[:,:,0] + 1j*plane[:,:,1]
+        self.FField_FF_plane = FField_FF_plane_()
+
+
+def prepare_raw_transforms_output(out_group, zgrid, rgrid, ogrid, rgrid_FF, distance, near_field_factor,
+                                  dtype = np.double):
+    """
+    It prepares the hdf5-group to store the raw transforms of the planes read by
+    'FField_FF_provider'. The transforms are stored in the dataset 'raw_plane_transforms'
+    [z,r_FF,omega,(real,imag)] chunked by planes, 'dtype' is the precision of the
+    stored parts.
+
+    Returns
+    -------
+    h5py dataset
+        the dataset to store the raw transforms
+
+    """
+    mn.adddataset(out_group, 'zgrid', zgrid, '[SI]')
+    mn.adddataset(out_group, 'rgrid', rgrid, '[SI]')
+    mn.adddataset(out_group, 'ogrid', ogrid, '[SI]')
+    mn.adddataset(out_group, 'rgrid_FF', rgrid_FF, '[SI]')
+    mn.adddataset(out_group, 'distance', distance, '[SI]')
+    mn.adddataset(out_group, 'near_field_factor', int(near_field_factor), '[-]')
+    return prepare_planes_output(out_group, 'raw_plane_transforms', len(zgrid), len(rgrid_FF), len(ogrid),
+                                 dtype = dtype)
+
+
+def prepare_planes_output(out_group, name, N_planes, Nr_FF, No, dtype = np.double):
+    """
+    It creates the dataset 'name' [plane,r_FF,omega,(real,imag)] chunked by planes in
+    the hdf5-group 'out_group' to store far-field planes one-by-one. The chunks are
+    allocated at once, the writing of the planes then does not modify the metadata
+    of the file (a flushed file stays readable if the writing process is killed).
+    'dtype' is the precision of the stored parts.
+    """
+    dcpl = h5py.h5p.create(h5py.h5p.DATASET_CREATE)
+    dcpl.set_alloc_time(h5py.h5d.ALLOC_TIME_EARLY)
+    dset = out_group.create_dataset(name,
+                                    (N_planes, Nr_FF, No, 2),
+                                    dtype = dtype,
+                                    chunks = (1, Nr_FF, No, 2),
+                                    dcpl = dcpl)
+    dset.attrs['units'] = np.bytes_('[arb. u.]')
+    return dset
+                
+
 def get_propagation_pre_factor_function(zgrid,
                                 rgrid,
                                 ogrid,
@@ -91,7 +705,8 @@ def get_propagation_pre_factor_function(zgrid,
                                 include_absorption = True,
                                 dispersion_tables = 'Henke',
                                 include_dispersion = True,
-                                effective_IR_refrective_index = 1.):
+                                effective_IR_refrective_index = 1.,
+                                return_exponent = False):
     """
     This function provides the *pre-factor*
     $\varrho(\tilde{z},\tilde{\rho})\exp(\Phi(\tilde{z},\tilde{\rho},\omega))$.
@@ -124,12 +739,17 @@ def get_propagation_pre_factor_function(zgrid,
        default: True; easy switch to turn off dispersion
     effective_IR_refrective_index : function handle, optional
         This sets the refractive according to the formula for $\Phi$ (1 for reference vacuum frame)
+    return_exponent : boolean, optional
+        default: False; adds the function providing the exponent $\Phi$ [omega] of the pre-factor,
+        only for the pre-factors independent of r (used by the Filon-type integrator)
 
     Returns
     -------
     pre_factor, exp_renorm: functions
         functions of the index corresponding to 'zgrid',k they provide the pre-factor value and the
         renormalisation factor if the cumulative signal is required.
+    exponent: function
+        returned if 'return_exponent'
 
     """
     
@@ -139,7 +759,29 @@ def get_propagation_pre_factor_function(zgrid,
     # switch over the options for density profiles:
     # the if-tree treats various options for the pressure modulation and further
     # branches to allow optionality for both dispersion and absorption.
+    # The tables are computed by array operations over (z,omega) or (z,r) at once.
     if isinstance(pressure,dict):
+        
+        def table_to_zgrid(table): # linear interpolation of the tables along z (axis 0)
+            return interpolate.interp1d(pressure['zgrid'],
+                                        table,
+                                        axis = 0,
+                                        bounds_error = False,
+                                        fill_value = (table[0], table[-1]),
+                                        copy = False
+                                        )(zgrid)
+        
+        def table_to_rgrid(table): # linear interpolation of the tables along r (last axis)
+            return interpolate.interp1d(pressure['rgrid'],
+                                        table,
+                                        axis = -1,
+                                        bounds_error = False,
+                                        fill_value = (table[...,0], table[...,-1]),
+                                        copy = False
+                                        )(rgrid)
+            
+        if include_absorption:
+            beta_factor = XUV_index.beta_factor_ref(ogrid, preset_gas+'_'+absorption_tables) # [omega]
 
         # usual case: modulation in the z-direction
         # the omega-and-z-integrals are pre-computed, r is obtained on-the-fly
@@ -147,94 +789,47 @@ def get_propagation_pre_factor_function(zgrid,
             
             print('z modulation')            
             
-            pre_factor_value = np.empty((Nz,No),dtype=np.cdouble)
-            absorption_factor_omega = np.empty((Nz,No),dtype=np.double)
-            
-            Nz_table = len(pressure['zgrid'])            
-            pressure_modulation_local = interpolate.interp1d(
-                                            pressure['zgrid'],
-                                            pressure['value'],
-                                            bounds_error = False,
-                                            fill_value = (pressure['value'][0],
-                                                          pressure['value'][-1]),
-                                            copy = False
-                                            )(zgrid)
-            
-            for k1 in range(No):
-                if include_dispersion: 
-                    
-                    integrand = XUV_index.dispersion_function(
-                        ogrid[k1], 
-                        pressure['value'],                
-                        preset_gas+'_'+dispersion_tables,
-                        n_IR = effective_IR_refrective_index)
-                    
-                    integral_for_phase_factor = integrate.cumulative_trapezoid(
-                                                        integrand,
-                                                        x=pressure['zgrid'],
-                                                        initial=0.
-                                                        )
-                    
-                    dispersion_factor = 1j *\
-                                        interpolate.interp1d(                               # dispersion factor
-                                          pressure['zgrid'],
-                                          integral_for_phase_factor,
-                                          bounds_error = False,
-                                          fill_value = (integral_for_phase_factor[0],
-                                                        integral_for_phase_factor[-1]),
-                                          copy = False
-                                          )(zgrid)
-                else:
-                    # dispersion_factor = 0.    
-                    # correction with respect to the co-moving frame according to the formula:
-                    # dispersion_factor = ((1./v_co_moving) - (1./units.c_light)), v_co_moving = n*c
-                    dispersion_factor = 1j * (effective_IR_refrective_index - 1.)/units.c_light 
-                  
-                    
-                if include_absorption:
-                    integral_beta_factor = XUV_index.beta_factor_ref(
-                                            ogrid[k1],
-                                            preset_gas+'_'+absorption_tables) * \
-                                       integrate.cumulative_trapezoid(
-                                            pressure['value'],
-                                            x=pressure['zgrid'],
-                                            initial=0.
-                                            )
-                                       
-                    absorption_factor = (1./units.c_light) *\
-                                        interpolate.interp1d(
-                                          pressure['zgrid'],
-                                          integral_beta_factor,
-                                          bounds_error = False,
-                                          fill_value = (integral_beta_factor[0],
-                                                        integral_beta_factor[-1]),
-                                          copy = False
-                                        )(zgrid)
-                     
-                    absorption_factor_omega[:,k1] = ogrid[k1]*absorption_factor
-                    absorption_factor = absorption_factor - absorption_factor[-1]
-                                        
-                else:   
-                    absorption_factor = 0.
-                    absorption_factor_omega[:,k1] = 0.
-                    
+            pressure_modulation_local = table_to_zgrid(pressure['value'])
+            
+            if include_dispersion: 
+                integrand = XUV_index.dispersion_function(ogrid[np.newaxis,:],
+                                                          pressure['value'][:,np.newaxis],
+                                                          preset_gas+'_'+dispersion_tables,
+                                                          n_IR = effective_IR_refrective_index) # [z_table,omega]
+                dispersion_factor = 1j * table_to_zgrid(integrate.cumulative_trapezoid(integrand,
+                                                                                        x = pressure['zgrid'],
+                                                                                        axis = 0,
+                                                                                        initial = 0.))
+            else:
+                # correction with respect to the co-moving frame according to the formula:
+                # dispersion_factor = ((1./v_co_moving) - (1./units.c_light)), v_co_moving = n*c
+                dispersion_factor = 1j * np.outer(zgrid, np.ones(No)) * (effective_IR_refrective_index - 1.)/units.c_light 
                 
-                                       
-                pre_factor_value[:,k1] = pressure_modulation_local *\
-                                            np.exp(
-                                                ogrid[k1] *
-                                                    (dispersion_factor
-                                                    + 
-                                                    absorption_factor
-                                                    )
-                                            )
+            if include_absorption:
+                absorption_factor = (1./units.c_light) * np.outer(table_to_zgrid(integrate.cumulative_trapezoid(pressure['value'],
+                                                                                                                x = pressure['zgrid'],
+                                                                                                                initial = 0.)),
+                                                                  beta_factor)
+                absorption_factor_omega = ogrid * absorption_factor
+                absorption_factor = absorption_factor - absorption_factor[-1,:]
+            else:
+                absorption_factor = 0.
+                absorption_factor_omega = np.zeros((Nz,No))
+            
+            exponent_value = ogrid * (dispersion_factor + absorption_factor) # [z,omega]
+            pre_factor_value = pressure_modulation_local[:,np.newaxis] * np.exp(exponent_value)
             
             def exp_renorm(kz):
                 # return np.exp((zgrid[-1]-zgrid[kz]) * abs_factor_omega)
                 return np.exp(absorption_factor_omega[-1,:] - absorption_factor_omega[kz,:])
             
             def pre_factor(kz):
-                return np.outer(np.ones(len(rgrid)),np.squeeze(pre_factor_value[kz,:]))
+                return np.outer(np.ones(len(rgrid)),pre_factor_value[kz,:])
+            
+            if return_exponent:
+                def exponent(kz):
+                    return exponent_value[kz,:]
+                return pre_factor, exp_renorm, exponent
             
             return pre_factor, exp_renorm
                 
@@ -244,158 +839,78 @@ def get_propagation_pre_factor_function(zgrid,
         elif (not('zgrid' in pressure.keys()) and ('rgrid' in pressure.keys())):
             print('r modulation')
             
-            
-            # First, we obtain the pressure modulation on the "(pressure z-grid, computational r-grid)"
-            # pressure_my_rgrid = np.empty((Nr,))
-            pressure_my_rgrid = interpolate.interp1d(
-                                          pressure['rgrid'],
-                                          pressure['value'][k1,:],
-                                          bounds_error = False,
-                                          fill_value = (pressure['value'][k1,0],
-                                                        pressure['value'][k1,-1]),
-                                          copy = False
-                                          )(rgrid)
-               
-            dispersion_factor_omega = np.empty((Nr,No),dtype=np.cdouble)
+            pressure_my_rgrid = table_to_rgrid(pressure['value']) # [r]
             
             if include_dispersion:   
                 print('dispersion applied')
-                for k1 in range(Nr):
-                    dispersion_factor_omega[k1,:] = 1j * ogrid * \
-                                                    XUV_index.dispersion_function(
-                                                            ogrid, 
-                                                            pressure['value'][k1],             
-                                                            preset_gas+'_'+dispersion_tables,
-                                                            n_IR = effective_IR_refrective_index)
+                dispersion_factor_omega = 1j * ogrid * XUV_index.dispersion_function(ogrid[np.newaxis,:],
+                                                                                     pressure_my_rgrid[:,np.newaxis],
+                                                                                     preset_gas+'_'+dispersion_tables,
+                                                                                     n_IR = effective_IR_refrective_index) # [r,omega]
             else:
                 print('no dispersion')
-                # dispersion_factor = 0.    
                 # correction with respect to the co-moving frame according to the formula:
                 # dispersion_factor = ((1./v_co_moving) - (1./units.c_light)), v_co_moving = n*c
-                for k1 in range(Nr):
-                    dispersion_factor_omega[k1,:] = 1j * ogrid * \
-                                                    (effective_IR_refrective_index - 1.)/units.c_light 
+                dispersion_factor_omega = 1j * np.outer(np.ones(Nr), ogrid) * (effective_IR_refrective_index - 1.)/units.c_light 
             
-            absorption_factor_omega = np.zeros((Nr,No),dtype=np.double)   
             if include_absorption: 
                 print('absorption applied')                
-                for k1 in range(Nr):
-                    absorption_factor_omega[k1,:] =  ogrid * \
-                                                (pressure['value'][k1]/units.c_light) *\
-                                                XUV_index.beta_factor_ref(
-                                                    ogrid,
-                                                    preset_gas+'_'+absorption_tables)
+                absorption_factor_omega = np.outer(pressure_my_rgrid/units.c_light, ogrid * beta_factor) # [r,omega]
             else:
                 print('no absorption')
-                pass # done in the allocation
+                absorption_factor_omega = np.zeros((Nr,No))
 
-                
             def pre_factor(kz):
-                return pressure * np.exp(
-                                          (zgrid[kz]*dispersion_factor
-                                           +
-                                          (zgrid[kz]-zgrid[-1])*absorption_factor)
-                                         )
-                                                  
+                return pressure_my_rgrid[:,np.newaxis] * np.exp(zgrid[kz]*dispersion_factor_omega
+                                                                +
+                                                                (zgrid[kz]-zgrid[-1])*absorption_factor_omega)
 
-            
+            if return_exponent:
+                raise NotImplementedError('The exponent is provided only for the pre-factor independent of r.')
             return pre_factor, None # renormalisation not implemented
 
             
         # modulation in the both z- and r-direction
-        # the full pre-factor as a function of (z,omega,r) is kept by the function (in this variable order)   
+        # only the tables [z,r] are kept, the pre-factor [r,omega] is evaluated for each plane
         elif (('zgrid' in pressure.keys()) and ('rgrid' in pressure.keys())):
             print('zr modulation')
-            pre_factor_value = np.empty((Nz,No,Nr),dtype=np.cdouble)  # we store pre-factor in memory
-            
-            # First, we obtain the pressure modulation on the "(pressure z-grid, computational r-grid)"
-            Nz_table = len(pressure['zgrid'])
-            pressure_my_rgrid = np.empty((Nz_table,Nr))
-            for k1 in range(Nz_table):
-                pressure_my_rgrid[k1,:] = interpolate.interp1d(
-                                              pressure['rgrid'],
-                                              pressure['value'][k1,:],
-                                              bounds_error = False,
-                                              fill_value = (pressure['value'][k1,0],
-                                                            pressure['value'][k1,-1]),
-                                              copy = False
-                                              )(rgrid)
-            
-            
-            # We compute partial integrals for each r
-            for k1 in range(Nr):
-                
-                # get pressure modulation for this particular r on the computational zgrid
-                pressure_modulation_local = interpolate.interp1d(
-                                                pressure['zgrid'],
-                                                pressure_my_rgrid[:,k1],
-                                                bounds_error = False,
-                                                fill_value = (pressure_my_rgrid[0,k1],
-                                                             pressure_my_rgrid[-1,k1]),
-                                                copy = False
-                                                )(zgrid)                        
-                
-                for k2 in range(No):                    
-                    if include_dispersion: 
-                        integral_for_phase_factor = integrate.cumulative_trapezoid(
-                                                            XUV_index.dispersion_function(
-                                                                ogrid[k2], 
-                                                                pressure_my_rgrid[:,k1],
-                                                                preset_gas+'_'+dispersion_tables,
-                                                                n_IR = effective_IR_refrective_index),
-                                                            x = pressure['zgrid'],
-                                                            initial=0.
-                                                            )
-                        
-                        dispersion_factor = 1j *\
-                                            interpolate.interp1d(                                                
-                                              pressure['zgrid'],
-                                              integral_for_phase_factor,                                              
-                                              bounds_error = False,
-                                              fill_value = (integral_for_phase_factor[0],
-                                                            integral_for_phase_factor[-1]),
-                                              copy = False
-                                              )(zgrid)
-                    else:
-                        # dispersion_factor = 0.    
-                        # correction with respect to the co-moving frame according to the formula:
-                        # dispersion_factor = ((1./v_co_moving) - (1./units.c_light)), v_co_moving = n*c
-                        dispersion_factor = 1j * (effective_IR_refrective_index - 1.)/units.c_light 
-                      
-                        
-                    if include_absorption:
-                        integral_beta_factor = XUV_index.beta_factor_ref(
-                                                ogrid[k2],
-                                                preset_gas+'_'+dispersion_tables) * \
-                                           integrate.cumulative_trapezoid(
-                                                pressure_my_rgrid[:,k1],
-                                                x = pressure['zgrid'],
-                                                initial=0.
-                                                )
-                                           
-                        absorption_factor = (1./units.c_light) *\
-                                            interpolate.interp1d(
-                                              pressure['zgrid'],
-                                              integral_beta_factor,
-                                              bounds_error = False,
-                                              fill_value = (integral_beta_factor[0],
-                                                            integral_beta_factor[-1]),
-                                              copy = False
-                                            )(zgrid)                   
-                    else:   
-                        absorption_factor = 0.
-                                           
-                    pre_factor_value[:,k2,k1] = pressure_modulation_local *\
-                                                np.exp(
-                                                    ogrid[k2] *
-                                                        (dispersion_factor
-                                                        + 
-                                                        absorption_factor
-                                                        )
-                                                )
+            
+            pressure_my_rgrid = table_to_rgrid(pressure['value'])                 # [z_table,r]
+            pressure_modulation_local = table_to_zgrid(pressure_my_rgrid)         # [z,r]
+            pressure_integral = table_to_zgrid(integrate.cumulative_trapezoid(pressure_my_rgrid,
+                                                                              x = pressure['zgrid'],
+                                                                              axis = 0,
+                                                                              initial = 0.)) # [z,r]
+            
+            # the dispersion function is affine in pressure, A + B(omega)*pressure, its
+            # z-integral is thus given by the integral of the pressure
+            if include_dispersion:
+                dispersion_A = XUV_index.dispersion_function(ogrid, 0., preset_gas+'_'+dispersion_tables,
+                                                             n_IR = effective_IR_refrective_index)
+                dispersion_B = XUV_index.dispersion_function(ogrid, 1., preset_gas+'_'+dispersion_tables,
+                                                             n_IR = effective_IR_refrective_index) - dispersion_A
+                def dispersion_factor(kz):
+                    return 1j * (dispersion_A[:,np.newaxis] * (np.clip(zgrid[kz], pressure['zgrid'][0], pressure['zgrid'][-1])-pressure['zgrid'][0]) +
+                                 np.outer(dispersion_B, pressure_integral[kz,:])) # [omega,r]
+            else:
+                def dispersion_factor(kz):
+                    # correction with respect to the co-moving frame according to the formula:
+                    # dispersion_factor = ((1./v_co_moving) - (1./units.c_light)), v_co_moving = n*c
+                    return 1j * zgrid[kz] * (effective_IR_refrective_index - 1.)/units.c_light
+            
+            if include_absorption:
+                def absorption_factor(kz): # normalised to the exit of the medium as for the other profiles
+                    return (1./units.c_light) * np.outer(beta_factor, pressure_integral[kz,:] - pressure_integral[-1,:])
+            else:
+                def absorption_factor(kz):
+                    return 0.
+            
             def pre_factor(kz):
-                return np.squeeze(pre_factor_value[kz,:,:])
+                return (pressure_modulation_local[kz,np.newaxis,:] *
+                        np.exp(ogrid[:,np.newaxis] * (dispersion_factor(kz) + absorption_factor(kz)))).T # [r,omega]
             
+            if return_exponent:
+                raise NotImplementedError('The exponent is provided only for the pre-factor independent of r.')
             return pre_factor, None # renormalisation not implemented
             
         else:
@@ -436,26 +951,554 @@ def get_propagation_pre_factor_function(zgrid,
         def exp_renorm(kz):
             return np.exp((zgrid[-1]-zgrid[kz]) * abs_factor_omega)
             
+        def exponent(kz):
+            return ogrid * (zgrid[kz]*dispersion_factor + (zgrid[kz]-zgrid[-1])*absorption_factor)
+            
         def pre_factor(kz):
-            return pressure * np.outer(np.ones(len(rgrid)),
-                                        np.exp(
-                                              ogrid * (zgrid[kz]*dispersion_factor
-                                                        +
-                                                        (zgrid[kz]-zgrid[-1])*absorption_factor)
-                                              )
-                                        )
+            return pressure * np.outer(np.ones(len(rgrid)), np.exp(exponent(kz)))
         
+        if return_exponent:
+            return pre_factor, exp_renorm, exponent
         return pre_factor, exp_renorm 
         
         
         
+def get_pre_factor_tables(zgrid, rgrid, ogrid, **medium):
+    """
+    It evaluates the pre-factor (see 'get_propagation_pre_factor_function' for
+    the arguments 'medium') for all the planes at once. Only for the pre-factors
+    independent of r (scalar pressure and z-modulated density).
+
+    Returns
+    -------
+    dict of arrays [z,omega]
+        'pre_factor', 'renorm' (the renormalisation factor) and 'exponent' (the
+        exponent of the pre-factor), the frequency subsets are thus obtained by
+        slicing the second dimension
+
+    """
+    pre_factor, exp_renorm, exponent = get_propagation_pre_factor_function(zgrid, rgrid, ogrid,
+                                                                           return_exponent = True,
+                                                                           **medium)
+    return {'pre_factor': np.array([pre_factor(kz)[0,:] for kz in range(len(zgrid))]),
+            'renorm': np.array([exp_renorm(kz) for kz in range(len(zgrid))]),
+            'exponent': np.array([exponent(kz) for kz in range(len(zgrid))])}
+
+
+def pre_factor_functions(tables, Nr):
+    """
+    It returns the functions (pre_factor, exp_renorm, exponent) of the plane index
+    analogous to 'get_propagation_pre_factor_function' from the tables provided by
+    'get_pre_factor_tables', 'Nr' is the length of the radial grid.
+    """
+    def pre_factor(kz):
+        return np.outer(np.ones(Nr), tables['pre_factor'][kz,:])
+    def exp_renorm(kz):
+        return tables['renorm'][kz,:]
+    def exponent(kz):
+        return tables['exponent'][kz,:]
+    return pre_factor, exp_renorm, exponent
+
+
+def simpson_weights(z0, z1, z2):
+    """
+    It returns the weights of the values at z0, z1, z2 for the integrals of the
+    quadratic interpolant through these points (non-uniform spacing). The weights
+    are given for the whole interval [z0,z2] (Simpson's rule) and for the
+    sub-intervals [z0,z1] and [z1,z2].
+    """
+    h0 = z1 - z0; h1 = z2 - z1; h = h0 + h1
+    whole = (h*(2. - h1/h0)/6., h**3/(6.*h0*h1), h*(2. - h0/h1)/6.)
+    first = (h0*(3.*h - h0)/(6.*h), h0*(3.*h - 2.*h0)/(6.*h1), -h0**3/(6.*h*h1))
+    second = (-h1**3/(6.*h*h0), h1*(3.*h - 2.*h1)/(6.*h0), h1*(3.*h - h1)/(6.*h))
+    return whole, first, second
+
+
+def filon_weights(exponent_difference):
+    """
+    It returns the weights (w1, w2) of the integrands at the ends of an interval
+    of the unit length for the Filon-type rule. The integrand is
+    G(t)*exp(Phi(t)), G is linear and the exponent Phi is linear with the
+    difference 'exponent_difference' = Phi(1) - Phi(0) along the interval. The
+    rule is w1*G(0)*exp(Phi(0)) + w2*G(1)*exp(Phi(1)), it is exact for any oscillations
+    of exp(Phi) and it reduces to the trapezoidal rule (1/2, 1/2) for the vanishing difference.
+    """
+    a = np.asarray(exponent_difference, dtype=np.cdouble)
+    small = (np.abs(a) < 1e-3)
+    a_safe = np.where(small, 1., a)
+    w1 = np.where(small, 0.5 + a/6. + a**2/24., (np.exp(a_safe) - 1. - a_safe)/a_safe**2)
+    w2 = np.where(small, 0.5 - a/6. + a**2/24., (a_safe - 1. + np.exp(-a_safe))/a_safe**2)
+    return w1, w2
+
+
+def radial_quadrature_weights(rgrid, integrator = trapezoidal_integrator):
+    """
+    It returns the weights $w_k$ of the radial quadrature such that
+    'integrator(y,rgrid)' = sum_k w_k*y[k]. The trapezoidal weights are
+    constructed directly, any other integrator is probed by unit vectors
+    (it thus has to be linear in 'y', which holds for all quadrature rules).
+
+    Parameters
+    ----------
+    rgrid : array_like
+        the radial grid [SI]
+    integrator : function handle, optional
+        The integrator called as 'integrator(integrand,rgrid)'.
+        The default is trapezoidal_integrator.
+
+    Returns
+    -------
+    weights : 1D array
+        the quadrature weights on 'rgrid'
+
+    """
+    Nr = len(rgrid)
+    if (integrator is trapezoidal_integrator):
+        dr = np.diff(rgrid)
+        weights = np.zeros(Nr, dtype=np.double)
+        weights[:-1] += 0.5*dr
+        weights[1:]  += 0.5*dr
+        return weights
+    
+    unit_vector = np.zeros(Nr, dtype=np.double)
+    weights = np.empty(Nr, dtype=np.double)
+    for k1 in range(Nr):
+        unit_vector[k1] = 1.
+        weights[k1] = integrator(unit_vector,rgrid)
+        unit_vector[k1] = 0.
+    return weights
+
+
+def radial_truncation(energy_density, threshold):
+    """
+    It finds the radial points that can be dropped for each frequency: the outer
+    points whose energy is at most 'threshold' of the total energy.
+
+    Parameters
+    ----------
+    energy_density : 2D array
+        the contributions of the radial points to the energy [omega,r], e.g.
+        w_k*r_k*|source|^2 with the quadrature weights w_k
+    threshold : scalar
+        the relative energy allowed to be dropped
+
+    Returns
+    -------
+    N_kept : 1D array of int
+        the numbers of the kept points (from the axis) [omega]
+    dropped_energy : 1D array
+        the relative dropped energy [omega]
+
+    """
+    No, Nr = np.shape(energy_density)
+    tail = np.zeros((No, Nr+1)) # tail[:,k] is the energy of the points k, k+1, ...
+    tail[:,:-1] = np.cumsum(energy_density[:,::-1], axis=1)[:,::-1]
+    total = tail[:,0]
+    N_kept = np.argmax(tail <= threshold*total[:,np.newaxis], axis=1)
+    dropped_energy = np.divide(tail[np.arange(No),N_kept], total, out=np.zeros(No), where=(total > 0.))
+    return N_kept, dropped_energy
+
+
+# the tables of 'tabulated_j0': the linear interpolation of J0 on [0, J0_asymptotic_threshold]
+# and the coefficients of the asymptotic expansion (A&S 9.2.5, 9.2.9, 9.2.10)
+J0_table_step = 1./2048
+J0_asymptotic_threshold = 12.
+J0_table = special.j0(np.arange(0., J0_asymptotic_threshold + 2*J0_table_step, J0_table_step))
+J0_table_differences = np.diff(J0_table)
+J0_asymptotic_coefficients = np.cumprod([1.] + [(2*k-1)**2/(8.*k) for k in range(1,8)]) # a_k = prod_j (2j-1)^2/(8j)
+J0_asymptotic_P = (np.array([1., -1., 1., -1.]) * J0_asymptotic_coefficients[0::2]).astype(np.single)
+J0_asymptotic_Q = (np.array([-1., 1., -1., 1.]) * J0_asymptotic_coefficients[1::2]).astype(np.single)
+
+
+def tabulated_j0(x, dtype = np.double, chunk = 2**14):
+    """
+    It evaluates J0(x) for x >= 0 faster than 'special.j0'. The small arguments
+    x < J0_asymptotic_threshold (= 12) are interpolated linearly from a dense table
+    (the step 1/2048), the large arguments use the asymptotic expansion
+    J0(x) = sqrt(2/(pi*x)) * (P(x)*cos(x-pi/4) - Q(x)*sin(x-pi/4))
+    with P up to x^-6 and Q up to x^-7. The phase is reduced to [-pi,pi] in double
+    precision, the rest is evaluated in single precision (vectorised trigonometric
+    functions). The array is processed in chunks of 'chunk' points to keep the
+    temporaries in cache.
+    
+    The absolute error is below 1e-7 for all x >= 0: the interpolation contributes
+    at most step^2/16 = 1.5e-8, the truncation of the expansion at most its first
+    omitted term (3.3e-9 at x = 12) and the single-precision rounding 6e-8
+    (5.5e-8 observed). It is thus suitable for the kernels of the quadratures,
+    but it is not a replacement of 'special.j0' in general.
+
+    Parameters
+    ----------
+    x : array_like
+        the non-negative arguments
+    dtype : numpy dtype, optional
+        The type of the result. The default is np.double.
+    chunk : int, optional
+        The number of the points processed at once. The default is 2**14.
+
+    Returns
+    -------
+    array
+        J0(x) of the shape of x
+
+    """
+    x = np.asarray(x, dtype = np.double)
+    J0 = np.empty(x.shape, dtype = dtype)
+    x_flat = x.reshape(-1); J0_flat = J0.reshape(-1)
+    P = J0_asymptotic_P; Q = J0_asymptotic_Q
+    for k1 in range(0, x_flat.size, chunk):
+        x_chunk = x_flat[k1:k1+chunk]; J0_chunk = J0_flat[k1:k1+chunk]
+        small = (x_chunk < J0_asymptotic_threshold)
+        any_small = small.any()
+        if any_small: # the table (the large arguments are clamped to its end)
+            position = np.minimum(x_chunk * (1./J0_table_step), len(J0_table_differences)-1)
+            index = position.astype(np.intp); position -= index
+            J0_small = J0_table_differences.take(index); J0_small *= position; J0_small += J0_table.take(index)
+            if small.all():
+                J0_chunk[...] = J0_small; continue
+        
+        phase = x_chunk - 0.25*np.pi
+        phase -= (2.*np.pi) * np.rint(phase * (0.5/np.pi))
+        phase = phase.astype(np.single)
+        y = np.maximum(x_chunk.astype(np.single), np.single(J0_asymptotic_threshold)); np.reciprocal(y, out=y); y2 = y*y
+        J0_large = ((P[3]*y2 + P[2])*y2 + P[1])*y2 + P[0]
+        J0_large *= np.cos(phase)
+        J0_large -= ((((Q[3]*y2 + Q[2])*y2 + Q[1])*y2 + Q[0])*y) * np.sin(phase)
+        y *= np.single(2./np.pi); np.sqrt(y, out=y); J0_large *= y
+        
+        if any_small: np.copyto(J0_chunk, np.where(small, J0_small, J0_large))
+        else:         J0_chunk[...] = J0_large
+    return J0
+
+
+def J0_evaluator(J0_backend, real_dtype):
+    """The function evaluating the kernel J0(x) in 'real_dtype' by J0_backend ∈ {'scipy', 'tabulated'}."""
+    if (J0_backend == 'scipy'):
+        def J0(x): return special.j0(x.astype(real_dtype, copy=False))
+    elif (J0_backend == 'tabulated'):
+        def J0(x): return tabulated_j0(x, dtype = real_dtype)
+    else:
+        raise ValueError('Wrongly specified J0_backend.')
+    return J0
+
+
+def near_field_phase_factor(ogrid, rgrid, distance):
+    """
+    It returns the near-field factor exp(-i*omega*r^2/(2*c*distance)) on the (omega,r)-grid.
+
+    Parameters
+    ----------
+    ogrid : array_like
+        frequency grid [SI]
+    rgrid : array_like
+        radial grid [SI]
+    distance : scalar
+        The distance of the generating plane from the observational screen [SI]
+
+    Returns
+    -------
+    2D array
+        the near-field factor [omega,r]
+
+    """
+    return np.exp(np.outer(-1j * np.asarray(ogrid) / units.c_light,
+                           (np.asarray(rgrid) ** 2) / (2.0 * distance)))
+
+
+def grid_signature(*items):
+    """
+    It returns a hash (hex string) of the grids and parameters 'items' (arrays or scalars),
+    the arrays are hashed by their type, shape and content.
+    """
+    signature = hashlib.sha1()
+    for item in items:
+        if isinstance(item, np.ndarray):
+            signature.update((item.dtype.str + str(item.shape)).encode())
+            signature.update(np.ascontiguousarray(item).tobytes())
+        else:
+            if isinstance(item, np.floating): item = float(item) # the same signature as Python floats
+            signature.update(repr(item).encode())
+        signature.update(b';')
+    return signature.hexdigest()
+
+
+class Kernel_cache:
+    """
+    This class caches the kernels of 'HankelTransform' (the blocks of J0(k*r*r_FF/distance)
+    of the 'matrix' engine and the near-field factors), so the same kernels are not evaluated
+    again. They are keyed by the hash of the grids and of the distance ('grid_signature').
+    The kernels are kept in memory (least recently used are released above 'max_bytes'),
+    they can be also stored in the directory 'store' (an hdf5 file for each kernel named
+    by the hash), where they are found by later runs (e.g. with another medium) and by
+    other simulations with the same grids. The files are written atomically, the store
+    can be thus shared by more processes.
+    
+    The kernel of the radial screen depends on the distance of each plane, the kernels
+    are thus reused within a run only for the angular screen (all the transforms at the
+    same distance) and for the repeated transforms. The cached kernels are read-only.
+    The store grows by the kernels of all the planes (Nz x No/frequency_block files for
+    the radial screen), it is thus limited by 'max_store_bytes' for each run (all or
+    nothing): the kernels of a run are stored only if all of them fit into the store,
+    otherwise the files written by the run are removed and it stores no more kernels
+    (evicting them one by one would remove the files requested first by the next run).
+    'end_run()' then removes the least recently used files of the other runs (by their
+    modification time, updated when a file is read) above 'max_store_bytes', the store
+    is thus scanned once per run.
+    
+    Attributes:
+        max_bytes (int): the memory limit of the kernels in memory
+        store (str): the directory of the stored kernels or None
+        max_store_bytes (int): the limit of the size of the store
+        hits, store_hits, misses (int): the numbers of the kernels found in memory, in the store and evaluated
+    """
+    
+    def __init__(self, max_bytes = 2**30, store = None, max_store_bytes = 2**32):
+        self.max_bytes = max_bytes
+        self.store = store
+        self.max_store_bytes = max_store_bytes
+        if not(store is None): os.makedirs(store, exist_ok = True)
+        self.kernels = collections.OrderedDict()
+        self.size = 0
+        self.hits = 0; self.store_hits = 0; self.misses = 0
+        self.start_run()
+    
+    def start_run(self):
+        """It starts a new run of the store, its kernels are counted from now."""
+        self.run_keys = set(); self.run_bytes = 0; self.run_files = []
+        self.storing = not(self.store is None)
+    
+    def end_run(self):
+        """It limits the size of the store after a run (called by 'Hankel_long') and starts the next run."""
+        if not(self.store is None): self.clean_store()
+        self.start_run()
+    
+    def count_run_kernel(self, key, store_file):
+        # the kernels of the run exceeding the store are not stored at all
+        if not(key in self.run_keys):
+            try:
+                self.run_bytes += os.path.getsize(store_file)
+            except OSError: # removed by another process
+                pass
+            self.run_keys.add(key)
+        if self.storing and (self.run_bytes > self.max_store_bytes):
+            self.storing = False
+            for path in self.run_files:
+                try:
+                    os.remove(path)
+                except OSError: # removed by another process
+                    pass
+            self.run_files = []
+    
+    def get(self, kind, grids, evaluate):
+        """
+        It returns the kernel 'kind' given by 'grids' (a tuple of arrays and scalars),
+        'evaluate()' computes the kernel if it is not cached.
+        """
+        key = grid_signature(kind, *grids)
+        if (key in self.kernels):
+            self.kernels.move_to_end(key)
+            self.hits += 1
+            return self.kernels[key]
+        
+        store_file = None if (self.store is None) else os.path.join(self.store, key + '.h5')
+        kernel = None
+        if not(store_file is None) and os.path.exists(store_file):
+            try:
+                with h5py.File(store_file, 'r') as kernel_file:
+                    kernel = kernel_file['kernel'][()]
+                os.utime(store_file) # the recently used files are kept in the store
+                self.store_hits += 1
+            except OSError: # removed by another process
+                kernel = None
+        if (kernel is None):
+            kernel = evaluate()
+            self.misses += 1
+        if self.storing and not(os.path.exists(store_file)):
+            temporary_file = store_file + '.%d.tmp' % os.getpid()
+            with h5py.File(temporary_file, 'w') as kernel_file:
+                kernel_file.create_dataset('kernel', data = kernel)
+            os.replace(temporary_file, store_file)
+            self.run_files.append(store_file)
+        if self.storing: self.count_run_kernel(key, store_file)
+        
+        kernel.flags.writeable = False
+        if (kernel.nbytes <= self.max_bytes):
+            while (self.size + kernel.nbytes > self.max_bytes):
+                self.size -= self.kernels.popitem(last = False)[1].nbytes
+            self.kernels[key] = kernel
+            self.size += kernel.nbytes
+        return kernel
+    
+    def clean_store(self):
+        """
+        It removes the least recently used files of the store above 'max_store_bytes',
+        the files of the current run are kept.
+        """
+        run_names = set(key + '.h5' for key in self.run_keys) if self.storing else set()
+        files = []
+        for entry in os.scandir(self.store):
+            if entry.name.endswith('.h5') and not(entry.name in run_names):
+                try:
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+                except OSError: # removed by another process
+                    pass
+        store_size = self.run_bytes if self.storing else 0
+        store_size += sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if (store_size <= self.max_store_bytes): break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            store_size -= size
+    
+    def report(self):
+        print('kernel cache: hits', self.hits, 'store hits', self.store_hits, 'evaluated', self.misses,
+              'memory', self.size, 'B')
+
+
+def cached_kernel(kernel_cache, kind, grids, evaluate):
+    """'evaluate()' or the kernel from 'kernel_cache' (the class Kernel_cache) if provided."""
+    if (kernel_cache is None): return evaluate()
+    return kernel_cache.get(kind, grids, evaluate)
+
+
+def log_resampled_Hankel_transform(ogrid, rgrid, source, distance, rgrid_FF,
+                                   near_field_factor = False,
+                                   oversampling = 2):
+    """
+    It computes the Hankel transform
+    FField_FF[omega,r_FF] = int source[omega,r] * J0(k*r*r_FF/distance) * r dr
+    by the fast Hankel transform (FFTLog, 'scipy.fft.fht'). The source is resampled
+    (linearly) from 'rgrid' onto a logarithmic grid, where the transform is computed
+    by FFT for each frequency, and the result is interpolated from the logarithmic
+    grid in q = k*r_FF/distance to 'rgrid_FF'. The source is zero beyond 'rgrid'.
+    The near-field factor is applied after the resampling.
+    
+    The logarithmic grid spans the source and the inverse of the requested range of q.
+    It starts six decades below (the periodic FFTLog sequence r*source must vanish at
+    both ends to avoid ringing) and ends one decade above. Its step resolves the step
+    of 'rgrid' at the largest radius 'oversampling'-times. The cost is thus N*log(N) with N given
+    by these ranges instead of Nr*Nr_FF. The points with r_FF = 0 are evaluated directly
+    (J0 = 1) by the trapezoidal rule.
+
+    Parameters
+    ----------
+    ogrid : array_like
+        grid of the source in frequencies [SI]
+    rgrid : array_like
+        grid of the source in the radial coordinate [SI]
+    source : 2D array
+        The source including the pre-factor (source[omega,r]).
+    distance : scalar
+       The distance of the generating plane from the observational screen
+    rgrid_FF : array_like
+        The grid used to investigate the transformed field
+    near_field_factor : logical, optional
+        Include near field factor. The default is False.
+    oversampling : scalar, optional
+        The resolution of the logarithmic grid relative to 'rgrid'. The default is 2.
+
+    Returns
+    -------
+    FField_FF : 2D array
+         The far-field spectra on ogrid and rgrid_FF
+
+    """
+    rgrid = np.asarray(rgrid); rgrid_FF = np.asarray(rgrid_FF)
+    k_omega = np.asarray(ogrid) / units.c_light
+    No = len(ogrid); Nr_FF = len(rgrid_FF)
+    FField_FF = np.empty((No,Nr_FF), dtype=np.cdouble)
+    
+    # on-axis points
+    on_axis = (rgrid_FF == 0.)
+    if on_axis.any():
+        if near_field_factor: source_on_axis = source * near_field_phase_factor(ogrid, rgrid, distance)
+        else:                 source_on_axis = source
+        FField_FF[:,on_axis] = np.outer(integrate.trapezoid(rgrid*source_on_axis, x=rgrid, axis=-1),
+                                        np.ones(np.count_nonzero(on_axis)))
+    if on_axis.all(): return FField_FF
+    
+    # the logarithmic grids
+    rgrid_positive = rgrid[rgrid > 0.]
+    q_FF = np.outer(k_omega, rgrid_FF[~on_axis] / distance)
+    r_min = 1e-6*min(rgrid_positive[0], 1./q_FF.max())
+    r_max = 10.*max(rgrid[-1], 1./q_FF.min())
+    dln = np.min(np.diff(rgrid)) / (oversampling * rgrid[-1])
+    N_log = fft.next_fast_len(int(np.ceil(np.log(r_max/r_min)/dln)) + 1)
+    dln = np.log(r_max/r_min)/(N_log - 1)
+    r_c = np.sqrt(r_min*r_max)
+    offset = fft.fhtoffset(dln, 0.)
+    log_steps = dln * (np.arange(N_log) - 0.5*(N_log - 1))
+    r_log = r_c * np.exp(log_steps)
+    k_log = (np.exp(offset) / r_c) * np.exp(log_steps)
+    
+    # resampled source ('fht' computes int a(r) J0(kr) k dr)
+    a_log = r_log * interpolate.interp1d(rgrid, source, axis = -1,
+                                         bounds_error = False,
+                                         fill_value = 0.,
+                                         copy = False)(r_log)
+    if near_field_factor:
+        a_log = a_log * near_field_phase_factor(ogrid, r_log, distance)
+    FField_log = (fft.fht(a_log.real, dln, 0., offset=offset) +
+                  1j*fft.fht(a_log.imag, dln, 0., offset=offset)) / k_log
+    
+    for k1 in range(No):
+        log_q = np.log(q_FF[k1,:])
+        FField_FF[k1,~on_axis] = np.interp(log_q, np.log(k_log), FField_log[k1,:].real) +\
+                                 1j*np.interp(log_q, np.log(k_log), FField_log[k1,:].imag)
+    
+    return FField_FF
+
+
 def HankelTransform(ogrid, rgrid, FField, distance, rgrid_FF,
                     integrator = trapezoidal_integrator,
                     near_field_factor = True,
-                    pre_factor = 1.):
+                    pre_factor = 1.,
+                    engine = 'matrix',
+                    frequency_block = 16,
+                    oversampling = 2,
+                    near_axis_order = 2,
+                    near_axis_tolerance = 1e-3,
+                    radial_threshold = 0.,
+                    return_dropped_energy = False,
+                    kernel_cache = None,
+                    J0_backend = 'scipy',
+                    dtype = np.cdouble):
     """
     It computes Hankel transform with an optional near-field factor.
     
+    There are two engines available. The 'matrix' engine builds the kernel
+    J0(k*r*r_FF/distance) for a block of frequencies at once and applies the
+    radial quadrature as a matrix product (the integrator is replaced by its
+    quadrature weights, see 'radial_quadrature_weights'). The 'scalar' engine
+    is the original point-by-point evaluation calling the integrator for each
+    point of the screen; it is kept for validation. The 'fht' engine uses the fast
+    Hankel transform on logarithmically resampled grids (see 'log_resampled_Hankel_transform'),
+    its cost is N*log(N) instead of Nr*Nr_FF, which is advantageous for dense screens.
+    The radial integrator is not used by this engine. The 'near_axis' engine
+    expands J0(x) = sum_n (-x^2/4)^n/(n!)^2 up to the order 'near_axis_order', so
+    only the radial moments int source * r^(2n) * r dr are computed (Nr operations
+    per frequency and term). It is exact on the axis (r_FF = 0), which is the fast
+    path for on-axis spectra, and accurate near the axis (k*r*r_FF/distance < 1).
+    A warning is issued if the first omitted term of the expansion exceeds
+    'near_axis_tolerance' on the screen.
+    
+    The 'matrix' and 'near_axis' engines can truncate the source radially for each
+    frequency ('radial_threshold'): the outer points carrying at most this fraction
+    of the energy int |source|^2 r dr are dropped (see 'radial_truncation'), so the
+    kernel spans only the core of the source (e.g. for high harmonics).
+    
+    The kernels of the 'matrix' engine and the near-field factors can be cached
+    ('kernel_cache', see the class 'Kernel_cache'). The kernel of the 'matrix' engine
+    can be evaluated by 'tabulated_j0' (J0_backend = 'tabulated'), which is about twice
+    faster than 'special.j0' with the absolute error below 1e-7.
+    
+    The precision is given by 'dtype'. In single precision (np.csingle), the 'matrix'
+    engine builds the kernel and applies it in single precision (half the memory and
+    bandwidth), the other engines compute in double precision and only the result is
+    converted.
 
     Parameters
     ----------
@@ -476,11 +1519,38 @@ def HankelTransform(ogrid, rgrid, FField, distance, rgrid_FF,
         The default is integrate.trapz (from scipy).
     near_field_factor : logical, optional
         Include near field factor. The default is True.
+    pre_factor : scalar or 2D array, optional
+        The pre-factor applied on the source (pre_factor[r,omega] if 2D). The default is 1.
+    engine : string, optional
+        ∈ {'matrix', 'scalar', 'fht', 'near_axis'}. The default is 'matrix'.
+    frequency_block : int, optional
+        The number of frequencies processed together by the 'matrix' engine,
+        it controls the memory of the kernel (frequency_block*Nr_FF*Nr). The default is 16.
+    oversampling : scalar, optional
+        The resolution of the logarithmic grid of the 'fht' engine relative to rgrid. The default is 2.
+    near_axis_order : int, optional
+        The highest power of (x^2/4) in the expansion of J0 of the 'near_axis' engine. The default is 2.
+    near_axis_tolerance : scalar, optional
+        The bound of the first omitted term (x^2/4)^(n+1)/((n+1)!)^2 of the 'near_axis' engine, a warning
+        is issued above it. The default is 1e-3.
+    radial_threshold : scalar, optional
+        The relative energy of the source allowed to be dropped by the radial truncation,
+        0 means no truncation. The default is 0.
+    return_dropped_energy : logical, optional
+        Return also the relative dropped energy [omega]. The default is False.
+    kernel_cache : Kernel_cache, optional
+        The cache of the kernels. The default is None (no caching).
+    J0_backend : string, optional
+        The evaluation of J0 in the 'matrix' engine ∈ {'scipy', 'tabulated'}. The default is 'scipy'.
+    dtype : numpy dtype, optional
+        The complex type of the computation ∈ {np.cdouble, np.csingle}. The default is np.cdouble.
 
     Returns
     -------
     FField_FF : 2D array
          The far-field spectra on ogrid and rgrid_FF
+    dropped_energy : 1D array
+         returned if 'return_dropped_energy'
 
     """
        
@@ -491,35 +1561,194 @@ def HankelTransform(ogrid, rgrid, FField, distance, rgrid_FF,
     
     
     No = len(ogrid); Nr = len(rgrid); Nr_FF = len(rgrid_FF)
-    FField_FF = np.empty((No,Nr_FF), dtype=np.cdouble)
+    FField_FF = np.empty((No,Nr_FF), dtype=dtype)
+    real_dtype = np.finfo(dtype).dtype
     
+    if (radial_threshold > 0.):
+        if not(engine in ['matrix', 'near_axis']):
+            raise NotImplementedError('The radial truncation is implemented only for the matrix and near_axis engines.')
+        rgrid = np.asarray(rgrid)
+        source = FField * pre_factor.T if apply_radial_factor else FField
+        N_kept, dropped_energy = radial_truncation(rgrid * radial_quadrature_weights(rgrid, integrator) * np.abs(source)**2,
+                                                   radial_threshold)
+    else:
+        N_kept = np.full(No, Nr); dropped_energy = np.zeros(No)
     
-    integrand = np.empty((Nr), dtype=np.cdouble)
-    for k1 in range(No):
-        k_omega = ogrid[k1] / units.c_light # ogrid[k3] / units.c_light; ogrid[k1] * units.alpha_fine  # ??? units
-        for k2 in range(Nr_FF):
-            for k3 in range(Nr):
-                if near_field_factor:
-                    if apply_radial_factor:  radial_factor_local = pre_factor[k3,k1]
-                    else:                    radial_factor_local = 1.
-                    integrand[k3] = radial_factor_local *\
-                                    np.exp(-1j * k_omega * (rgrid[k3] ** 2) / (2.0 * distance)) * rgrid[k3] *\
-                                    FField[k1,k3] * special.jn(0, k_omega * rgrid[k3] * rgrid_FF[k2] / distance)
-                else:
-                    if apply_radial_factor:  radial_factor_local = pre_factor[k3,k1]
-                    else:                    radial_factor_local = 1.
-                    integrand[k3] = radial_factor_local *\
-                                    rgrid[k3] * FField[k1,k3] * special.jn(0, k_omega * rgrid[k3] * rgrid_FF[k2] / distance)
-                                    
-            FField_FF[k1,k2] = integrator(integrand,rgrid)
+    if (engine == 'matrix'):
+        rgrid = np.asarray(rgrid); rgrid_FF = np.asarray(rgrid_FF)
+        k_omega = np.asarray(ogrid) / units.c_light
+        
+        # all the r-dependent factors are merged with the source, the kernel is then real
+        source = (rgrid * radial_quadrature_weights(rgrid, integrator)) * FField
+        if apply_radial_factor:
+            source = source * pre_factor.T
+        if near_field_factor:
+            source = source * cached_kernel(kernel_cache, 'near_field', (np.asarray(ogrid), rgrid, distance),
+                                            lambda: near_field_phase_factor(ogrid, rgrid, distance))
+        if (radial_threshold > 0.): # each frequency is truncated exactly, the block spans the longest one
+            source = source * (np.arange(Nr)[np.newaxis,:] < N_kept[:,np.newaxis])
+        source = source.astype(dtype, copy=False)
+        
+        J0 = J0_evaluator(J0_backend, real_dtype)
+        
+        for k1 in range(0, No, frequency_block):
+            block = slice(k1, min(k1+frequency_block, No))
+            Nr_block = np.max(N_kept[block]) # the kernel spans the kept points of the block
+            kernel = cached_kernel(kernel_cache, 'J0', (k_omega[block], rgrid_FF, rgrid[:Nr_block], distance, real_dtype, J0_backend),
+                                   lambda: J0(k_omega[block,np.newaxis,np.newaxis] *
+                                              np.outer(rgrid_FF, rgrid[:Nr_block] / distance))) # kernel[omega,r_FF,r]
+            FField_FF[block,:] = np.matmul(kernel, source[block,:Nr_block,np.newaxis].real)[:,:,0] +\
+                                 1j*np.matmul(kernel, source[block,:Nr_block,np.newaxis].imag)[:,:,0]
+            
+    elif (engine == 'near_axis'):
+        rgrid = np.asarray(rgrid); rgrid_FF = np.asarray(rgrid_FF)
+        k_omega = np.asarray(ogrid) / units.c_light
+        
+        source = (rgrid * radial_quadrature_weights(rgrid, integrator)) * FField
+        if apply_radial_factor:
+            source = source * pre_factor.T
+        if near_field_factor:
+            source = source * cached_kernel(kernel_cache, 'near_field', (np.asarray(ogrid), rgrid, distance),
+                                            lambda: near_field_phase_factor(ogrid, rgrid, distance))
+        if (radial_threshold > 0.):
+            source = source * (np.arange(Nr)[np.newaxis,:] < N_kept[:,np.newaxis])
+        
+        x2_quarter = np.outer(k_omega, rgrid_FF / distance)**2 / 4. # (x/2)^2 without r^2 [omega,r_FF]
+        # the first omitted term of the expansion at the largest (kept) radius
+        x2_quarter_max = np.max(x2_quarter * rgrid[N_kept-1,np.newaxis]**2)
+        omitted_term = x2_quarter_max**(near_axis_order+1) / special.factorial(near_axis_order+1)**2
+        if (omitted_term > near_axis_tolerance):
+            warnings.warn('near_axis engine: the first omitted term of the expansion of J0 is ' + str(omitted_term) +
+                          ' (k*r*r_FF/distance up to ' + str(2.*np.sqrt(x2_quarter_max)) +
+                          '), increase near_axis_order or use the matrix engine')
+        term = np.ones((No,Nr_FF)) # (-x^2/4)^n/(n!)^2 without r^(2n)
+        FField_FF[...] = 0.
+        for n in range(near_axis_order+1):
+            if (n > 0): term = -term * x2_quarter / n**2
+            moment = np.matmul(source, rgrid**(2*n)) # int source * r^(2n) * r dr [omega]
+            FField_FF += moment[:,np.newaxis] * term
+            
+    elif (engine == 'fht'):
+        source = FField
+        if apply_radial_factor:
+            source = source * pre_factor.T
+        FField_FF = log_resampled_Hankel_transform(ogrid, rgrid, source, distance, rgrid_FF,
+                                                   near_field_factor = near_field_factor,
+                                                   oversampling = oversampling).astype(dtype, copy=False)
+            
+    elif (engine == 'scalar'):
+        integrand = np.empty((Nr), dtype=np.cdouble)
+        for k1 in range(No):
+            k_omega = ogrid[k1] / units.c_light # ogrid[k3] / units.c_light; ogrid[k1] * units.alpha_fine  # ??? units
+            for k2 in range(Nr_FF):
+                for k3 in range(Nr):
+                    if near_field_factor:
+                        if apply_radial_factor:  radial_factor_local = pre_factor[k3,k1]
+                        else:                    radial_factor_local = 1.
+                        integrand[k3] = radial_factor_local *\
+                                        np.exp(-1j * k_omega * (rgrid[k3] ** 2) / (2.0 * distance)) * rgrid[k3] *\
+                                        FField[k1,k3] * special.jn(0, k_omega * rgrid[k3] * rgrid_FF[k2] / distance)
+                    else:
+                        if apply_radial_factor:  radial_factor_local = pre_factor[k3,k1]
+                        else:                    radial_factor_local = 1.
+                        integrand[k3] = radial_factor_local *\
+                                        rgrid[k3] * FField[k1,k3] * special.jn(0, k_omega * rgrid[k3] * rgrid_FF[k2] / distance)
+                                        
+                FField_FF[k1,k2] = integrator(integrand,rgrid)
+    
+    else:
+        raise ValueError('Wrongly specified engine of the Hankel transform.')
 
 
     print('time spent only in the integrator ', time.perf_counter()-t_start)
     
+    if return_dropped_energy: return FField_FF, dropped_energy
     return FField_FF
 
         
         
+def HankelTransform_batch(ogrid, rgrid, FFields, distances, rgrid_FF,
+                          integrator = trapezoidal_integrator,
+                          near_field_factor = True,
+                          pre_factor = 1.,
+                          frequency_block = 16,
+                          kernel_cache = None,
+                          J0_backend = 'scipy',
+                          dtype = np.cdouble):
+    """
+    It computes the Hankel transforms of a stack of independent planes, e.g. thin
+    targets for the points of an intensity or pressure scan. It is equivalent to
+    calling 'HankelTransform' (the 'matrix' engine) for each plane, but the planes
+    at the same distance share the kernel: it is evaluated once for each block of
+    frequencies and applied to all these planes by a single matrix product
+    (kernel[omega,r_FF,r] @ sources[omega,r,plane]), which is much more efficient
+    than the matrix-vector products of the individual planes.
+
+    Parameters
+    ----------
+    ogrid : array_like
+        grid of the planes in frequencies [SI]
+    rgrid : array_like
+        grid of the planes in the radial coordinate [SI]
+    FFields : 3D array
+        The source terms of the planes (FFields[plane,omega,r]).
+    distances : scalar or array_like
+        The distances of the planes from the observational screen (a scalar for all the planes or distances[plane]).
+    rgrid_FF : array_like
+        The grid used to investigate the transformed field
+    integrator : function handle, optional
+        The radial integrator (see 'HankelTransform'). The default is trapezoidal_integrator.
+    near_field_factor : logical, optional
+        Include near field factor. The default is True.
+    pre_factor : scalar or 2D array, optional
+        The pre-factor applied on all the planes (pre_factor[r,omega] if 2D). The default is 1.
+    frequency_block : int, optional
+        The number of frequencies processed together, it controls the memory of the kernel. The default is 16.
+    kernel_cache : Kernel_cache, optional
+        The cache of the kernels (shared with 'HankelTransform'). The default is None (no caching).
+    J0_backend : string, optional
+        The evaluation of J0 ∈ {'scipy', 'tabulated'}. The default is 'scipy'.
+    dtype : numpy dtype, optional
+        The complex type of the computation ∈ {np.cdouble, np.csingle}. The default is np.cdouble.
+
+    Returns
+    -------
+    FField_FF : 3D array
+         The far-field spectra of the planes on ogrid and rgrid_FF (FField_FF[plane,omega,r_FF])
+
+    """
+    ogrid = np.asarray(ogrid); rgrid = np.asarray(rgrid); rgrid_FF = np.asarray(rgrid_FF)
+    k_omega = ogrid / units.c_light
+    N_planes, No, Nr = np.shape(FFields); Nr_FF = len(rgrid_FF)
+    distances = np.broadcast_to(np.asarray(distances, dtype=np.double), (N_planes,))
+    real_dtype = np.finfo(dtype).dtype
+    J0 = J0_evaluator(J0_backend, real_dtype)
+    FField_FF = np.empty((N_planes,No,Nr_FF), dtype=dtype)
+    
+    # all the r-dependent factors are merged with the sources, the kernel is then real
+    sources = (rgrid * radial_quadrature_weights(rgrid, integrator)) * np.asarray(FFields)
+    sources = sources * (pre_factor.T if (len(np.shape(pre_factor))==2) else pre_factor)
+    
+    group_distances, plane_groups = np.unique(distances, return_inverse=True)
+    for k_group, distance in enumerate(group_distances):
+        planes = np.flatnonzero(plane_groups == k_group)
+        source = sources[planes]
+        if near_field_factor:
+            source = source * cached_kernel(kernel_cache, 'near_field', (ogrid, rgrid, distance),
+                                            lambda: near_field_phase_factor(ogrid, rgrid, distance))
+        source = np.moveaxis(source, 0, -1).astype(dtype) # source[omega,r,plane]
+        
+        for k1 in range(0, No, frequency_block):
+            block = slice(k1, min(k1+frequency_block, No))
+            kernel = cached_kernel(kernel_cache, 'J0', (k_omega[block], rgrid_FF, rgrid, distance, real_dtype, J0_backend),
+                                   lambda: J0(k_omega[block,np.newaxis,np.newaxis] *
+                                              np.outer(rgrid_FF, rgrid / distance))) # kernel[omega,r_FF,r]
+            FField_FF_block = np.matmul(kernel, source[block].real) + 1j*np.matmul(kernel, source[block].imag)
+            FField_FF[planes,block,:] = np.moveaxis(FField_FF_block, -1, 0)
+    
+    return FField_FF
+
+
 class Hankel_long:
     """
     This is the main computational routine for computing the longitudinal diffraction integral. It
@@ -540,19 +1769,35 @@ class Hankel_long:
                  include_dispersion = True,
                  effective_IR_refrective_index = 1.,
                  integrator_Hankel = trapezoidal_integrator, # integrate.trapz,
+                 Hankel_engine = 'matrix',
                  integrator_longitudinal = 'trapezoidal',
                  near_field_factor = True,
+                 screen = 'radial',
                  store_cumulative_result = False,
                  store_non_normalised_cumulative_result = False,
-                 store_entry_and_exit_plane_transform = True
+                 store_entry_and_exit_plane_transform = True,
+                 raw_transforms_output = None,
+                 output_arrays = None,
+                 cumulative_output = None,
+                 cumulative_stride = 1,
+                 checkpoint_file = None,
+                 checkpoint_interval = 10,
+                 pre_factor_tables = None,
+                 radial_threshold = 0.,
+                 kernel_cache = None,
+                 J0_backend = 'scipy',
+                 dtype = np.cdouble
                  ):
-        """This routine implements the integral specified in the documentation. So far, the radial integrator can be arbitrary while
-        only trapezoidal rule is implemented for the longitudinal part.
+        """This routine implements the integral specified in the documentation. The radial integrator can be arbitrary while
+        the trapezoidal, Simpson's and Filon-type rules are implemented for the longitudinal part.
 
         Args:
             target (class FSources_provider): It uses the input class to make this procedure verstile for calculations
-            distance (float scalar): The distance of the observation screen from the first point of the medium
-            rgrid_FF (float array): The radial grid of the far-field (FF) camera
+            distance (float scalar or list): The distance of the observation screen from the first point of the medium
+            rgrid_FF (float array or list): The radial grid of the far-field (FF) camera
+              Several screens are given by the lists of the distances and of the radial grids. Each plane is then read and
+              pre-factored once and transformed onto all the screens. The outputs are the screens concatenated along r_FF
+              ('self.screen_slices' are their parts), see 'screen_outputs'. Only for the radial screen from the source planes.
             preset_gas (str, optional): Gas to load apropriate tables from the 'XUV_refractive_index' module. Defaults to 'vacuum'.
             pressure (scalar or dictionary, optional): See the documentation for the gas-specifier. Defaults to 1..
             absorption_tables (str, optional): Source of absorption tables (see the 'XUV_refractive_index' module). Defaults to 'Henke'.
@@ -562,17 +1807,65 @@ class Hankel_long:
             effective_IR_refrective_index (float scalar, optional): effective IR-refractive index to adjust for possible co-moving frames.
               See the module documentation. Defaults to 1. (i.e. frame co-moving with c).
             integrator_Hankel (function, optional): integrator_Hankel(y,x) is the integrator used to evaluate the Hankel transform. Defaults to trapezoidal_integrator.
-            integrator_longitudinal (str, optional): the integrator along $z$. Only 'trapezoidal' implemented so far. Defaults to 'trapezoidal'.
+            Hankel_engine (str, optional): The engine of 'HankelTransform' ∈ {'matrix', 'scalar', 'fht', 'near_axis'}, 'scalar' is the original loop kept
+              for validation, 'fht' is the fast Hankel transform for dense screens, 'near_axis' is the expansion of J0 for on-axis (exact) and
+              near-axis screens. Defaults to 'matrix'.
+            integrator_longitudinal (str, optional): the integrator along $z$ ∈ {'trapezoidal', 'simpson', 'filon'}. 'simpson' integrates
+              the quadratic interpolant (non-uniform grids are allowed). 'filon' treats the exponent of the pre-factor (phase-mismatch and absorption)
+              analytically between the planes and interpolates only the remaining part linearly, so the oscillations of the pre-factor along $z$
+              do not need to be resolved by the planes. Only for the pre-factor independent of r. Defaults to 'trapezoidal'.
             near_field_factor (bool, optional): This is the factor going beyond the far-field diffraction (see the documentation of the module). Defaults to True.
+            screen (str, optional): ∈ {'radial', 'angular'}. 'radial' evaluates the screen at 'rgrid_FF' for each plane separately. 'angular' describes the
+              screen by the angle theta = rgrid_FF/distance common for all the planes. The kernel J0 then does not depend on the plane, so the longitudinal
+              integral is done on the source planes (including the near-field factor of each plane) and only the final (and optionally
+              entry/exit and cumulative) planes are transformed. 'integrated' provides the spectrum integrated over the whole (infinite) angular
+              screen, int |E_FF|^2 2*pi*r_FF dr_FF, from the accumulated source planes of the angular screen by Parseval's theorem, so no kernel J0
+              is evaluated ('rgrid_FF' is not used). The outputs are then real spectra [1,omega] (stored as complex), they can be compared with
+              'screen_integrated_spectrum' of a full-screen result. Defaults to 'radial'.
             store_cumulative_result (bool, optional): If applied, the XUV signals are stored for all values along the 'target.zgrid'.
               The results are renormalised according to the absorption. Can be memory-consuming. Defaults to False.
             store_non_normalised_cumulative_result (bool, optional): If applied, the XUV signals are stored for all values along the 'target.zgrid'.
               The results are NOT renormalised according to the absorption. Can be memory-consuming. Defaults to False.
             store_entry_and_exit_plane_transform (bool, optional): Adds self.entry_plane_transform and self.exit_plane_transform for reference. Defaults to True.
+            raw_transforms_output (h5py group, optional): If provided, the raw transforms of the planes (without the pre-factor) are stored in this group,
+              see 'FField_FF_provider'. Only for the pre-factor independent of r (scalar pressure or z-modulated density) and the radial screen.
+              Defaults to None.
+            output_arrays (dict, optional): Preallocated arrays to store the outputs ('FF_integrated', 'entry_plane_transform', 'exit_plane_transform',
+              'cumulative_field', 'cumulative_field_no_norm'), e.g. views of shared-memory arrays for parallel workers. The outputs not present
+              in the dictionary are allocated. The attributes of the class are then these arrays. Defaults to None.
+            cumulative_output (h5py group, optional): If provided, the cumulative planes are streamed into the datasets 'cumulative_field' and
+              'cumulative_field_no_norm' [plane,r_FF,omega,(real,imag)] of this group as they are computed (see 'prepare_planes_output'), the memory
+              is thus independent of the length of the medium. The cumulative fields are then not the attributes of the class. Defaults to None.
+            cumulative_stride (int, optional): Only every 'cumulative_stride'-th cumulative plane is stored, their positions are
+              'self.zgrid_cumulative'. Defaults to 1.
+            checkpoint_file (str, optional): If provided, the running state of the longitudinal integration is stored in this hdf5-file every
+              'checkpoint_interval' planes and after the last plane (see 'write_Hankel_checkpoint'). If the file exists, the integration
+              is resumed from the stored state, the planes already integrated are only read from the target. The streamed outputs
+              ('raw_transforms_output', 'cumulative_output') are then continued in the existing datasets. Defaults to None.
+            checkpoint_interval (int, optional): The number of planes between the checkpoints. Defaults to 10.
+            pre_factor_tables (dict, optional): The precomputed pre-factor for 'target.zgrid' and 'target.ogrid' (see 'get_pre_factor_tables'),
+              the pre-factor is then not computed from the medium parameters. They must correspond to 'pressure' and the other medium
+              parameters. Defaults to None.
+            radial_threshold (float, optional): The relative energy of the source allowed to be dropped by the radial truncation of each transform
+              (see 'HankelTransform', the 'matrix' and 'near_axis' engines). The maximal relative dropped energy for each frequency (since the start
+              or the restart) is then 'self.radial_truncation_dropped_energy'. Defaults to 0. (no truncation).
+            kernel_cache (class Kernel_cache, optional): The cache of the kernels of the transforms and of the near-field factors, it can be
+              shared by more instances (e.g. re-computations with another medium). Defaults to None.
+            J0_backend (str, optional): The evaluation of the kernel J0 of the 'matrix' engine ∈ {'scipy', 'tabulated'}, 'tabulated' is the faster
+              'tabulated_j0' with the absolute error below 1e-7. Defaults to 'scipy'.
+            dtype (numpy dtype, optional): The complex type of the computation and of the outputs ∈ {np.cdouble, np.csingle}. The single precision
+              halves the memory and the bandwidth of the transforms (see 'HankelTransform') and of the streamed planes, the pre-factor is
+              evaluated in double precision. The accuracy can be checked by 'precision_report'. Defaults to np.cdouble.
+        
+        The target can be also 'FField_FF_provider' with stored raw transforms. The longitudinal integral is then re-computed by applying
+        the pre-factor of the given medium on the raw transforms, the Hankel transforms are not evaluated.
         """
         
-        if not(integrator_longitudinal == 'trapezoidal'):
-            raise NotImplementedError('only logitudinal trapezoidal integrator implemented so far')
+        if not(integrator_longitudinal in ['trapezoidal', 'simpson', 'filon']):
+            raise ValueError('Wrongly specified longitudinal integrator.')
+        if not(np.dtype(dtype) in [np.dtype(np.cdouble), np.dtype(np.csingle)]):
+            raise ValueError('Wrongly specified dtype, only np.cdouble and np.csingle are available.')
+        real_dtype = np.finfo(dtype).dtype
         
         # keep some inputs to pack I/O together
         self.include_dispersion = include_dispersion
@@ -581,14 +1874,34 @@ class Hankel_long:
         if include_absorption: self.absorption_tables = absorption_tables
         self.effective_IR_refrective_index = effective_IR_refrective_index
         self.integrator_Hankel = integrator_Hankel
+        self.Hankel_engine = Hankel_engine
         self.integrator_longitudinal = integrator_longitudinal
         self.near_field_factor = near_field_factor
+        self.screen = screen
         
         self.rgrid = rgrid_FF
+        
+        # several screens (distance, rgrid_FF) are concatenated along r_FF
+        multiple_screens = isinstance(distance, (list, tuple))
+        if multiple_screens:
+            if not(len(distance) == len(rgrid_FF)):
+                raise ValueError('The numbers of the distances and of the radial grids of the screens differ.')
+            if isinstance(target, FField_FF_provider) or not(raw_transforms_output is None) or not(screen == 'radial'):
+                raise NotImplementedError('Multiple screens are implemented only for the radial screen computed from the source planes.')
+            screens = list(zip(distance, rgrid_FF))
+            screen_bounds = np.cumsum([0] + [len(screen_rgrid_FF) for screen_rgrid_FF in rgrid_FF])
+            self.distance = list(distance)
+            self.screen_slices = [slice(screen_bounds[k1], screen_bounds[k1+1]) for k1 in range(len(screens))]
+        else:
+            screens = [(distance, rgrid_FF)]
         self.ogrid = np.copy(target.ogrid)
         
+        if (cumulative_stride < 1):
+            raise ValueError('cumulative_stride must be positive.')
+        cumulative_planes = range(cumulative_stride-1, len(target.zgrid)-1, cumulative_stride) # the indices of the stored cumulative planes
         if (store_cumulative_result or store_non_normalised_cumulative_result):
             self.zgrid = np.copy(target.zgrid)
+            self.zgrid_cumulative = target.zgrid[1:][cumulative_planes]
         
         if not(
                 ((preset_gas+'_'+absorption_tables in XUV_index.gases)
@@ -599,95 +1912,487 @@ class Hankel_long:
             ): raise ValueError('Wrongly specified preset gas (or tables).')
     
         Nz = len(target.zgrid)
-        Nr_FF = len(rgrid_FF)    
+        Nr_FF = sum(len(screen_rgrid_FF) for _, screen_rgrid_FF in screens) if not(screen == 'integrated') else 1
 
         
         # init pre_factor
-        pre_factor, renorm_factor = get_propagation_pre_factor_function(
-                                        target.zgrid,
-                                        target.rgrid,
-                                        target.ogrid,
-                                        preset_gas = preset_gas,
-                                        pressure = pressure,
-                                        absorption_tables = absorption_tables,
-                                        include_absorption = include_absorption,
-                                        dispersion_tables = dispersion_tables,
-                                        include_dispersion = include_dispersion,
-                                        effective_IR_refrective_index = effective_IR_refrective_index)
+        if (pre_factor_tables is None):
+            pre_factor, renorm_factor, *exponent = get_propagation_pre_factor_function(
+                                            target.zgrid,
+                                            target.rgrid,
+                                            target.ogrid,
+                                            preset_gas = preset_gas,
+                                            pressure = pressure,
+                                            absorption_tables = absorption_tables,
+                                            include_absorption = include_absorption,
+                                            dispersion_tables = dispersion_tables,
+                                            include_dispersion = include_dispersion,
+                                            effective_IR_refrective_index = effective_IR_refrective_index,
+                                            return_exponent = (integrator_longitudinal == 'filon'))
+        else:
+            if not(np.shape(pre_factor_tables['pre_factor']) == (Nz, len(target.ogrid))):
+                raise ValueError('The pre-factor tables do not correspond to the target.')
+            pre_factor, renorm_factor, *exponent = pre_factor_functions(pre_factor_tables, len(target.rgrid))
     
                               
         
 
                 
-        # we keep the data for now, consider on-the-fly change
-        print('Computing Hankel from planes')
-        t_start  = time.perf_counter()
-        t_check1 = t_start
-        
-        integrands_plane = next(target.Fsource_plane)
-        Fsource_plane1 = HankelTransform(target.ogrid,
-                                         target.rgrid,
-                                         integrands_plane,
-                                         distance-target.zgrid[0],
-                                         rgrid_FF,
-                                         integrator = integrator_Hankel,
-                                         near_field_factor = near_field_factor,
-                                         pre_factor = pre_factor(0)).T
-
-        if store_cumulative_result:
-             cumulative_field = np.empty((Nz-1,) + Fsource_plane1.shape, dtype=np.cdouble)
-        if store_non_normalised_cumulative_result:
-            cumulative_field_no_norm = np.empty((Nz-1,) + Fsource_plane1.shape, dtype=np.cdouble)        
-        if store_entry_and_exit_plane_transform:
-            self.entry_plane_transform = np.copy(Fsource_plane1)        
+        # The longitudinal integral accumulates the contributions of the planes, which are
+        # the transformed planes for the radial screen and the prepared source planes for the
+        # angular screen. 'read_out' then provides the far-field from the accumulated quantity.
+        from_raw_transforms = isinstance(target, FField_FF_provider)
+        radially_invariant_pre_factor = not(isinstance(pressure,dict) and ('rgrid' in pressure.keys()))
         
-        FF_integrated = 0.
-        for k1 in range(Nz-1):
-            t_check2 = time.perf_counter()
-            print('plane', k1, 'time:', t_check2-t_start, 'this iteration: ', t_check2-t_check1)
-            t_check1 = t_check2
+        if from_raw_transforms:
+            if not((screen == 'radial') and radially_invariant_pre_factor):
+                raise NotImplementedError('Raw transforms can be used only for the radial screen and the pre-factor independent of r.')
+            if not((distance == target.distance) and np.array_equal(rgrid_FF, target.rgrid_FF)
+                   and (near_field_factor == target.near_field_factor)):
+                raise ValueError('The screen does not correspond to the stored raw transforms.')
+            planes = target.FField_FF_plane
+        else:
+            planes = target.Fsource_plane
             
-          
-            integrands_plane = next(target.Fsource_plane) 
-            Fsource_plane2 = HankelTransform(target.ogrid,
+        if not(raw_transforms_output is None):
+            if from_raw_transforms or not((screen == 'radial') and radially_invariant_pre_factor):
+                raise NotImplementedError('Raw transforms can be stored only for the radial screen and the pre-factor independent of r.')
+            if ('raw_plane_transforms' in raw_transforms_output): # continued after a restart
+                raw_dset = raw_transforms_output['raw_plane_transforms']
+            else:
+                raw_dset = prepare_raw_transforms_output(raw_transforms_output,
+                                                         target.zgrid, target.rgrid, target.ogrid,
+                                                         rgrid_FF, distance, near_field_factor,
+                                                         dtype = real_dtype)
+        
+        dropped_energy = np.zeros(len(target.ogrid)) # the maximal relative energy dropped by the radial truncation
+        def transform(*args, **kwargs): # HankelTransform recording the dropped energy
+            if not(radial_threshold > 0.): return HankelTransform(*args, kernel_cache = kernel_cache, J0_backend = J0_backend, **kwargs)
+            FField_FF, dropped = HankelTransform(*args, radial_threshold = radial_threshold, return_dropped_energy = True,
+                                                 kernel_cache = kernel_cache, J0_backend = J0_backend, **kwargs)
+            np.maximum(dropped_energy, dropped, out=dropped_energy)
+            return FField_FF
+        
+        def screens_transform(kz, integrands_plane, **kwargs): # the plane transformed onto all the screens
+            return np.concatenate([transform(target.ogrid,
                                              target.rgrid,
                                              integrands_plane,
-                                             distance-target.zgrid[k1+1],
-                                             rgrid_FF,
+                                             screen_distance-target.zgrid[kz],
+                                             screen_rgrid_FF,
                                              integrator = integrator_Hankel,
                                              near_field_factor = near_field_factor,
-                                             pre_factor = pre_factor(k1+1)).T
+                                             engine = Hankel_engine,
+                                             dtype = dtype,
+                                             **kwargs).T
+                                   for screen_distance, screen_rgrid_FF in screens], axis = 0)
+        
+        if from_raw_transforms:
+            def plane_contribution(kz, raw_transform):
+                return pre_factor(kz)[0,:] * raw_transform
+            
+            def read_out(accumulated):
+                return np.copy(accumulated)
+            
+        elif ((screen == 'radial') and radially_invariant_pre_factor):
+            # the pre-factor commutes with the transform
+            def plane_contribution(kz, integrands_plane):
+                raw_transform = screens_transform(kz, integrands_plane)
+                if not(raw_transforms_output is None):
+                    raw_dset[kz,:,:,:] = np.stack((raw_transform.real, raw_transform.imag), axis=-1)
+                return pre_factor(kz)[0,:] * raw_transform
+            
+            def read_out(accumulated):
+                return np.copy(accumulated)
+            
+        elif (screen == 'radial'):
+            def plane_contribution(kz, integrands_plane):
+                return screens_transform(kz, integrands_plane, pre_factor = pre_factor(kz))
+            
+            def read_out(accumulated):
+                return np.copy(accumulated)
+            
+        elif (screen in ['angular', 'integrated']):
+            def plane_contribution(kz, integrands_plane):
+                source = pre_factor(kz).T * integrands_plane
+                if near_field_factor:
+                    plane_distance = distance-target.zgrid[kz]
+                    source = source * cached_kernel(kernel_cache, 'near_field', (target.ogrid, target.rgrid, plane_distance),
+                                                    lambda: near_field_phase_factor(target.ogrid,
+                                                                                    target.rgrid,
+                                                                                    plane_distance))
+                return source
+            
+            if (screen == 'angular'):
+                def read_out(accumulated):
+                    return transform(target.ogrid,
+                                     target.rgrid,
+                                     accumulated,
+                                     distance,
+                                     rgrid_FF,
+                                     integrator = integrator_Hankel,
+                                     near_field_factor = False,
+                                     engine = Hankel_engine,
+                                     dtype = dtype).T
+            else:
+                # Parseval's theorem of the Hankel transform:
+                # int |E_FF|^2 2*pi*r_FF dr_FF = (distance/k)^2 int |accumulated|^2 2*pi*r dr
+                radial_weights = 2.*np.pi * target.rgrid * radial_quadrature_weights(target.rgrid, integrator_Hankel)
+                screen_factor = (distance * units.c_light / target.ogrid)**2
+                def read_out(accumulated):
+                    return (screen_factor * np.matmul(np.abs(accumulated)**2, radial_weights))[np.newaxis,:].astype(dtype)
+            
+        else:
+            raise ValueError('Wrongly specified screen.')
+        
+        planes_contribution = plane_contribution # the contributions are accumulated in the working precision
+        def plane_contribution(kz, plane):
+            return planes_contribution(kz, plane).astype(dtype, copy=False)
+                
+        # The weights of the planes along z: the Filon-type weights are frequency dependent,
+        # they are applied along the frequency axis of the contributions
+        if (integrator_longitudinal == 'filon'):
+            exponent = exponent[0]
+            omega_axis = (slice(None), np.newaxis) if (screen in ['angular', 'integrated']) else (np.newaxis, slice(None))
+            def interval_weights(kz):
+                h = target.zgrid[kz+1]-target.zgrid[kz]
+                w1, w2 = filon_weights(exponent(kz+1) - exponent(kz))
+                return (h*w1[omega_axis]).astype(dtype), (h*w2[omega_axis]).astype(dtype)
+        else:
+            def interval_weights(kz):
+                h = target.zgrid[kz+1]-target.zgrid[kz]
+                return real_dtype.type(0.5*h), real_dtype.type(0.5*h)
+                
+        # we keep the data for now, consider on-the-fly change
+        print('Computing Hankel from planes')
+        t_start  = time.perf_counter()
+        t_check1 = t_start
+
+        if (output_arrays is None): output_arrays = {}
+        def store_output(name, value): # use the preallocated output if provided
+            if not(name in output_arrays): return value
+            output_arrays[name][...] = value
+            return output_arrays[name]
 
-            FF_integrated += 0.5*(target.zgrid[k1+1]-target.zgrid[k1])*(Fsource_plane1 + Fsource_plane2)
+        screen_shape = (Nr_FF, len(target.ogrid))
+        def cumulative_storage(name): # in-memory array or the dataset for streaming
+            if not(cumulative_output is None):
+                if (name in cumulative_output): return cumulative_output[name] # continued after a restart
+                return prepare_planes_output(cumulative_output, name, len(cumulative_planes), *screen_shape,
+                                             dtype = real_dtype)
+            if (name in output_arrays): return output_arrays[name]
+            return np.empty((len(cumulative_planes),) + screen_shape, dtype=dtype)
+        
+        if store_cumulative_result:
+            cumulative_field = cumulative_storage('cumulative_field')
+        if store_non_normalised_cumulative_result:
+            cumulative_field_no_norm = cumulative_storage('cumulative_field_no_norm')
+        N_cumulative_stored = [0] # the number of the stored cumulative planes (they are stored in order)
+        if not(cumulative_output is None):
+            def write_cumulative(storage, k_stored, plane):
+                storage[k_stored,:,:,:] = complex_to_real_stack(plane.astype(dtype, copy=False))
+                N_cumulative_stored[0] = k_stored + 1
+        else:
+            def write_cumulative(storage, k_stored, plane):
+                storage[k_stored,:,:] = plane
+                N_cumulative_stored[0] = k_stored + 1
+        def store_cumulative(k1, accumulated):
+            if not(store_cumulative_result or store_non_normalised_cumulative_result) or ((k1+1) % cumulative_stride != 0):
+                return
+            FF_integrated = read_out(accumulated)
+            k_stored = (k1+1) // cumulative_stride - 1
             
             if store_cumulative_result:
                 
                 if isinstance(pressure,dict): 
                   if ('rgrid' in pressure.keys()):
                     raise NotImplementedError('Renormalisation of the signal is not implemented for radially modulated density.')
-                cumulative_field[k1,:,:] = np.outer(np.ones(Nr_FF),renorm_factor(k1))*FF_integrated
+                renorm = renorm_factor(k1)
+                if (screen == 'integrated'): renorm = np.abs(renorm)**2 # the energy is renormalised
+                write_cumulative(cumulative_field, k_stored, np.outer(np.ones(Nr_FF),renorm)*FF_integrated)
                 
                 
             if store_non_normalised_cumulative_result:
-                cumulative_field_no_norm[k1,:,:]  =  np.copy(FF_integrated)
+                write_cumulative(cumulative_field_no_norm, k_stored, FF_integrated)
+        
+        # the state of the integration: the planes up to 'k_start' are integrated
+        in_memory_cumulative = {} 
+        if (cumulative_output is None):
+            if store_cumulative_result: in_memory_cumulative['cumulative_field'] = cumulative_field
+            if store_non_normalised_cumulative_result: in_memory_cumulative['cumulative_field_no_norm'] = cumulative_field_no_norm
+        # the grids, the screens and the medium are compared by their hashes
+        pressure_items = ([item for key in sorted(pressure.keys()) for item in (key, np.asarray(pressure[key]))]
+                          if isinstance(pressure,dict) else [pressure])
+        pre_factor_items = ([None] if (pre_factor_tables is None) else
+                            [item for key in sorted(pre_factor_tables.keys()) for item in (key, np.asarray(pre_factor_tables[key]))])
+        checkpoint_signature = {'Nz': Nz, 'Nr_FF': Nr_FF, 'No': len(target.ogrid), 'screen': screen,
+                                'integrator_longitudinal': integrator_longitudinal, 'cumulative_stride': cumulative_stride,
+                                'in_memory_cumulative': ' '.join(in_memory_cumulative.keys()),
+                                'dtype': np.dtype(dtype).name,
+                                'Hankel_engine': Hankel_engine, 'radial_threshold': radial_threshold, 'J0_backend': J0_backend,
+                                'integrator_Hankel': integrator_Hankel.__module__ + '.' + integrator_Hankel.__qualname__,
+                                'grids': grid_signature(target.ogrid, target.zgrid, target.rgrid,
+                                                        *[item for screen_distance, screen_rgrid_FF in screens
+                                                               for item in (screen_distance, np.asarray(screen_rgrid_FF))]),
+                                'medium': grid_signature(preset_gas, *pressure_items, absorption_tables, include_absorption,
+                                                         dispersion_tables, include_dispersion, effective_IR_refrective_index,
+                                                         near_field_factor),
+                                'pre_factor_tables': grid_signature(*pre_factor_items)}
+        
+        state = None
+        if not(checkpoint_file is None):
+            state = read_Hankel_checkpoint(checkpoint_file, checkpoint_signature)
+            
+        if (state is None):
+            k_start = 0
+            Fsource_plane1 = plane_contribution(0, next(planes))
+            accumulated = 0.
+            if store_entry_and_exit_plane_transform:
+                self.entry_plane_transform = store_output('entry_plane_transform', read_out(Fsource_plane1))
+        else:
+            k_start, saved = state
+            print('resuming from the checkpoint after plane', k_start)
+            for _ in range(k_start+1): next(planes) # the integrated planes are skipped
+            accumulated = saved['accumulated']
+            Fsource_plane0 = saved['Fsource_plane0']
+            Fsource_plane1 = saved['Fsource_plane1']
+            if store_entry_and_exit_plane_transform:
+                self.entry_plane_transform = store_output('entry_plane_transform', saved['entry_plane_transform'])
+            for name, storage in in_memory_cumulative.items():
+                N_cumulative_stored[0] = len(saved[name])
+                storage[:N_cumulative_stored[0]] = saved[name]
+        N_cumulative_checkpointed = N_cumulative_stored[0]
+        
+        for k1 in range(k_start, Nz-1):
+            t_check2 = time.perf_counter()
+            print('plane', k1, 'time:', t_check2-t_start, 'this iteration: ', t_check2-t_check1)
+            t_check1 = t_check2
+            
+          
+            Fsource_plane2 = plane_contribution(k1+1, next(planes))
+
+            if not(integrator_longitudinal == 'simpson') or (Nz == 2):
+                w1, w2 = interval_weights(k1)
+                accumulated += w1*Fsource_plane1 + w2*Fsource_plane2
+                store_cumulative(k1, accumulated)
+                
+            elif (k1 % 2 == 1): # the pair of intervals (k1-1, k1) is closed
+                whole, first, _ = [np.asarray(w, dtype=real_dtype) for w in simpson_weights(*target.zgrid[k1-1:k1+2])]
+                store_cumulative(k1-1, accumulated + first[0]*Fsource_plane0 + first[1]*Fsource_plane1 + first[2]*Fsource_plane2)
+                accumulated += whole[0]*Fsource_plane0 + whole[1]*Fsource_plane1 + whole[2]*Fsource_plane2
+                store_cumulative(k1, accumulated)
+                
+            elif (k1 == Nz-2): # the last interval without a pair uses the last three planes
+                _, _, second = [np.asarray(w, dtype=real_dtype) for w in simpson_weights(*target.zgrid[k1-1:k1+2])]
+                accumulated += second[0]*Fsource_plane0 + second[1]*Fsource_plane1 + second[2]*Fsource_plane2
+                store_cumulative(k1, accumulated)
     
-            Fsource_plane1 = np.copy(Fsource_plane2)
+            Fsource_plane0 = Fsource_plane1
+            Fsource_plane1 = Fsource_plane2
+            
+            if not(checkpoint_file is None) and (((k1+1) % checkpoint_interval == 0) or (k1 == Nz-2)):
+                saved = {'accumulated': accumulated, 'Fsource_plane0': Fsource_plane0, 'Fsource_plane1': Fsource_plane1}
+                if store_entry_and_exit_plane_transform: saved['entry_plane_transform'] = self.entry_plane_transform
+                for streamed_output in [raw_transforms_output, cumulative_output]: # the streamed planes are stored before the checkpoint
+                    if not(streamed_output is None): streamed_output.file.flush()
+                write_Hankel_checkpoint(checkpoint_file, checkpoint_signature, k1+1, saved, in_memory_cumulative,
+                                        (N_cumulative_checkpointed, N_cumulative_stored[0]))
+                N_cumulative_checkpointed = N_cumulative_stored[0]
             
+        FF_integrated = read_out(accumulated)
 
-        self.FF_integrated = FF_integrated
+        self.FF_integrated = store_output('FF_integrated', FF_integrated)
         
         if store_entry_and_exit_plane_transform:
-            self.exit_plane_transform = np.copy(Fsource_plane2)
+            self.exit_plane_transform = store_output('exit_plane_transform', read_out(Fsource_plane1))
         
-        if store_cumulative_result:
+        if store_cumulative_result and (cumulative_output is None):
             self.cumulative_field = cumulative_field
             
-        if store_non_normalised_cumulative_result:
+        if store_non_normalised_cumulative_result and (cumulative_output is None):
             self.cumulative_field_no_norm = cumulative_field_no_norm
+        
+        if (radial_threshold > 0.):
+            self.radial_truncation_dropped_energy = dropped_energy
+            print('radial truncation, the maximal relative dropped energy:', np.max(dropped_energy))
+        
+        if not(kernel_cache is None):
+            kernel_cache.end_run(); kernel_cache.report()
            
             
            
         
+def complex_to_real_stack(array):
+    """
+    It returns the complex 'array' with the real and imaginary parts in the last
+    dimension (the layout of the stored outputs). It is a view for contiguous arrays.
+    """
+    array = np.ascontiguousarray(array)
+    return array.view(array.real.dtype).reshape(array.shape + (2,))
+
+
+def cumulative_checkpoint_file(checkpoint_file):
+    return checkpoint_file + '.cumulative'
+
+
+def write_Hankel_checkpoint(checkpoint_file, signature, k_plane, state, cumulative = {}, cumulative_range = (0, 0)):
+    """
+    It stores the running state of 'Hankel_long' after the plane 'k_plane'. The
+    state is a dictionary of complex arrays (the accumulated integral, the last
+    contributions of the planes, ...), they are stored in their precision.
+    'signature' are the scalar parameters of the computation checked by
+    'read_Hankel_checkpoint'.
+    The file is written under a temporary name and then renamed, so a valid
+    checkpoint is kept if the process is killed during writing.
+    
+    The cumulative fields kept in memory ('cumulative', the arrays [plane,r_FF,omega])
+    are stored in the file 'checkpoint_file'+'.cumulative', only their planes
+    'cumulative_range' computed since the previous checkpoint are written (into the
+    preallocated datasets, before the checkpoint is renamed). The planes beyond the
+    checkpoint are thus ignored and written again after a restart.
+    """
+    if (len(cumulative) > 0):
+        first, last = cumulative_range
+        with h5py.File(cumulative_checkpoint_file(checkpoint_file), 'w' if (first == 0) else 'r+') as cumulative_file:
+            for name, value in cumulative.items():
+                if not(name in cumulative_file):
+                    prepare_planes_output(cumulative_file, name, *value.shape, dtype = value.real.dtype)
+                if (last > first):
+                    cumulative_file[name][first:last] = complex_to_real_stack(value[first:last])
+    with h5py.File(checkpoint_file + '.tmp', 'w') as chp_file:
+        for key, value in signature.items(): chp_file.attrs[key] = value
+        mn.adddataset(chp_file, 'plane_index', k_plane, '[-]')
+        chp_file.attrs['cumulative_planes'] = cumulative_range[1]
+        for name, value in state.items():
+            chp_file.create_dataset(name, data = complex_to_real_stack(np.asarray(value, dtype=np.result_type(value, np.csingle))))
+    os.replace(checkpoint_file + '.tmp', checkpoint_file)
+
+
+def read_Hankel_checkpoint(checkpoint_file, signature):
+    """
+    It returns (k_plane, state) stored by 'write_Hankel_checkpoint' or None if the
+    checkpoint does not exist. The arrays are in their stored precision, the state
+    contains also the stored planes of the cumulative fields. ValueError is raised
+    if the checkpoint was created by a different computation.
+    """
+    if not(os.path.isfile(checkpoint_file)): return None
+    def read_complex(dset, selection = ()):
+        value = np.ascontiguousarray(dset[selection])
+        return value.view(np.result_type(value.dtype, np.csingle))[...,0]
+    with h5py.File(checkpoint_file, 'r') as chp_file:
+        for key, value in signature.items():
+            if not(key in chp_file.attrs) or not(chp_file.attrs[key] == value):
+                raise ValueError('The checkpoint ' + checkpoint_file + ' does not correspond to the computation (' + key + ').')
+        k_plane = int(chp_file['plane_index'][()])
+        state = {name: read_complex(chp_file[name]) for name in chp_file.keys() if not(name == 'plane_index')}
+        N_cumulative = int(chp_file.attrs['cumulative_planes'])
+    if os.path.isfile(cumulative_checkpoint_file(checkpoint_file)):
+        with h5py.File(cumulative_checkpoint_file(checkpoint_file), 'r') as cumulative_file:
+            for name in cumulative_file.keys():
+                state[name] = read_complex(cumulative_file[name], np.s_[:N_cumulative])
+    return k_plane, state
+
+
+def remove_Hankel_checkpoint(checkpoint_file):
+    """It removes the checkpoint written by 'write_Hankel_checkpoint' (with its cumulative fields)."""
+    for file_name in [checkpoint_file, cumulative_checkpoint_file(checkpoint_file)]:
+        if os.path.isfile(file_name): os.remove(file_name)
+
+
+def screen_integrated_spectrum(FField_FF, rgrid_FF):
+    """
+    It returns the spectrum integrated over the screen int |FField_FF|^2 2*pi*r_FF dr_FF
+    [omega] (FField_FF[r_FF,omega], the trapezoidal rule). It is the full-screen
+    counterpart of the 'integrated' screen of 'Hankel_long'.
+    """
+    rgrid_FF = np.asarray(rgrid_FF)
+    return integrate.trapezoid(2.*np.pi * rgrid_FF[:,np.newaxis] * np.abs(FField_FF)**2, x=rgrid_FF, axis=0)
+
+
+def screen_outputs(HL, k_screen):
+    """
+    It returns the outputs of the screen 'k_screen' of 'Hankel_long' computed for
+    multiple screens (they are concatenated along r_FF in 'HL'). The attributes are
+    the same as of 'Hankel_long' (e.g. for 'save_Hankel_long_outputs') and 'distance'
+    of the screen. The arrays are views of the outputs of 'HL'.
+    """
+    screen_slice = HL.screen_slices[k_screen]
+    outputs = types.SimpleNamespace(ogrid = HL.ogrid, rgrid = HL.rgrid[k_screen], distance = HL.distance[k_screen])
+    for name in ['FF_integrated', 'entry_plane_transform', 'exit_plane_transform',
+                 'cumulative_field', 'cumulative_field_no_norm']:
+        if name in dir(HL): setattr(outputs, name, getattr(HL, name)[...,screen_slice,:])
+    for name in ['zgrid', 'zgrid_cumulative']:
+        if name in dir(HL): setattr(outputs, name, getattr(HL, name))
+    return outputs
+
+
+def precision_report(result, reference):
+    """
+    It compares 'result' with 'reference' (e.g. the single- and double-precision
+    computations of the same part of the screen).
+
+    Returns
+    -------
+    dict
+        'field': the maximal error of the field and 'intensity': the maximal error
+        of |field|^2, both relative to the maximum of the reference
+
+    """
+    result = np.asarray(result, dtype=np.cdouble); reference = np.asarray(reference, dtype=np.cdouble)
+    intensity_reference = np.abs(reference)**2
+    return {'field': np.max(np.abs(result - reference)) / np.max(np.abs(reference)),
+            'intensity': np.max(np.abs(np.abs(result)**2 - intensity_reference)) / np.max(intensity_reference)}
+
+
+def save_Hankel_long_outputs(HL, out_group):
+    """
+    It stores the outputs of the class 'Hankel_long' (or the class merged from
+    partial results) in the hdf5-group 'out_group'. Complex arrays are stored
+    with the real and imaginary parts in the last dimension.
+    """
+    mn.adddataset(out_group,
+                  'FF_integrated',
+                  complex_to_real_stack(HL.FF_integrated), # real and imaginary parts are in separate dimensions
+                  '[arb. u.]')        
+    mn.adddataset(out_group,
+                  'entry_plane_transform',
+                  complex_to_real_stack(HL.entry_plane_transform),
+                  '[arb. u.]')
+    mn.adddataset(out_group,
+                  'exit_plane_transform',
+                  complex_to_real_stack(HL.exit_plane_transform),
+                  '[arb. u.]')        
+    mn.adddataset(out_group,
+                  'ogrid',
+                  HL.ogrid,
+                  '[SI]')
+    mn.adddataset(out_group,
+                  'rgrid',
+                  HL.rgrid,
+                  '[SI]')
+
+    # optional outputs
+    if 'cumulative_field' in dir(HL):
+        mn.adddataset(out_group,
+                      'cumulative_field',
+                      complex_to_real_stack(HL.cumulative_field),
+                      '[arb. u.]')            
+    if 'cumulative_field_no_norm' in dir(HL):
+        mn.adddataset(out_group,
+                      'cumulative_field_no_norm',
+                      complex_to_real_stack(HL.cumulative_field_no_norm),
+                      '[arb. u.]')        
+    if 'zgrid' in dir(HL):
+        mn.adddataset(out_group,
+                      'zgrid',
+                      HL.zgrid,
+                      '[SI]')
+    if 'zgrid_cumulative' in dir(HL):
+        mn.adddataset(out_group,
+                      'zgrid_cumulative',
+                      HL.zgrid_cumulative,
+                      '[SI]')
+        
+        
 def Signal_cum_integrator(ogrid, zgrid, FSourceTerm,
                          integrator = integrate.cumulative_trapezoid):
     
@@ -0,0 +1,209 @@
+"""
+The synthetic source for the regression tests of the Hankel stage (the scripts 'test_*.py'
+in this directory). The tests compare the optimised paths with the baseline, i.e. the 'scalar'
+engine of 'HankelTransform' (the original loop) and 'Hankel_long' computed directly, on small
+deterministic grids. They are run by pytest (python -m pytest Hankel/testing) or as scripts.
+
+- grids, source: the grids and the analytic source [z,omega,r] (a Gaussian beam with a phase-mismatch)
+- static_target: 'FSources_provider' of the source
+- relative_error: the maximal error relative to the maximum of the reference
+- write_archive: the hdf5-archive with the inputs of 'Hankel_long_medium_parallel_cluster.py'
+- archive_reference: 'Hankel_long' computed directly from the archive (the baseline of the cluster script)
+- split_archive: the per-process temporary files of TDSE ('hdf5_temp_*.h5') from the archive
+- run_cluster: runs the cluster script on the archive and returns its outputs
+- run_tests: runs the tests of a script without pytest
+"""
+import os
+import sys
+import subprocess
+
+Hankel_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+shared_python_path = os.path.join(os.path.dirname(Hankel_path), 'shared_python')
+for path in [shared_python_path, Hankel_path]:
+    if not(path in sys.path): sys.path.insert(0, path)
+
+import numpy as np
+import h5py
+import units
+import mynumerics as mn
+import MMA_administration as MMA
+import Hankel_transform as HT
+
+omega0 = mn.ConvertPhoton(800e-9, 'lambdaSI', 'omegaSI')
+omega_au2SI = mn.ConvertPhoton(1.0, 'omegaau', 'omegaSI')
+distance = 1.
+
+# the medium of the tests (argon, the frame co-moving slightly slower than c)
+medium = {'preset_gas': 'Ar',
+          'pressure': 0.05,
+          'absorption_tables': 'Henke',
+          'dispersion_tables': 'Henke',
+          'effective_IR_refrective_index': 1. + 1e-6}
+
+cluster_script = os.path.join(Hankel_path, 'Hankel_long_medium_parallel_cluster.py')
+
+
+def grids(No = 7, Nr = 40, Nz = 9, Nr_FF = 25, rmax_FF = 5e-3, length = 2e-3):
+    """The grids (ogrid, rgrid, zgrid, rgrid_FF) [SI] around the 21st-27th harmonics of 800 nm."""
+    return (omega0*np.linspace(21., 27., No),
+            np.linspace(0., 1e-4, Nr),
+            np.linspace(0., length, Nz),
+            np.linspace(0., rmax_FF, Nr_FF))
+
+
+def source(ogrid, rgrid, zgrid, waist = 3e-5):
+    """
+    The source [z,omega,r] (the layout of the 'static' FSources_provider): a Gaussian
+    beam with a frequency-dependent curvature, a linear phase along z and a linearly
+    growing amplitude.
+    """
+    Z = np.asarray(zgrid)[:,np.newaxis,np.newaxis]
+    O = np.asarray(ogrid)[np.newaxis,:,np.newaxis]
+    R = np.asarray(rgrid)[np.newaxis,np.newaxis,:]
+    return (np.exp(-(R/waist)**2) * (1. + 100.*Z) *
+            np.exp(1j*O*Z*1e-4/units.c_light + 1j*(R/waist)**2 * O/(20.*omega0)))
+
+
+def static_target(ogrid, rgrid, zgrid, FSource = None, **kwargs):
+    """'FSources_provider' of the source (the analytic one by default), the planes are in 'zgrid[:-1]'."""
+    if (FSource is None): FSource = source(ogrid, rgrid, zgrid)
+    return HT.FSources_provider(zgrid, rgrid, ogrid, FSource = FSource, **kwargs)
+
+
+def relative_error(result, reference):
+    return np.max(np.abs(np.asarray(result) - np.asarray(reference))) / np.max(np.abs(reference))
+
+
+def write_archive(file_name, inputs = {}, No = 60, Nr = 30, Nz = 8, Nr_FF = 20, Nthreads = 2,
+                  harmonic_range = (21., 27.), density_modulation = False):
+    """
+    It writes the archive with the source in 'CTDSE_outputs' and the inputs of the cluster
+    script (the defaults updated by 'inputs'). The frequency grid (a.u.) spans 0-40 harmonics.
+    """
+    omega0_au = mn.ConvertPhoton(800e-9, 'lambdaSI', 'omegaau')
+    ogrid = np.linspace(0., 40.*omega0_au, No)
+    rgrid = np.linspace(0., 1e-4, Nr)
+    zgrid = np.linspace(0., 2e-3, Nz)
+    FSource = np.transpose(source(omega_au2SI*ogrid, rgrid, zgrid), (0,2,1)) # [z,r,omega]
+
+    Hankel_inputs = {'Nthreads': Nthreads, 'XUV_table_type_dispersion': np.bytes_('Henke'),
+                     'XUV_table_type_absorption': np.bytes_('Henke'), 'Nr_max': Nr, 'kr_step': 1,
+                     'ko_step': 1, 'rmax_FF': 5e-3, 'Nr_FF': Nr_FF, 'distance_FF': distance,
+                     'store_cumulative_result': 0, 'Harmonic_range': np.asarray(harmonic_range)}
+    Hankel_inputs.update(inputs)
+    with h5py.File(file_name, 'w') as archive:
+        inp_group = archive.create_group(MMA.paths['Hankel_inputs'])
+        for name, value in Hankel_inputs.items():
+            if isinstance(value, str): value = np.bytes_(value)
+            inp_group.create_dataset(name, data = value)
+        archive[MMA.paths['CUPRAD_inputs']+'/laser_wavelength'] = 800e-7
+        archive[MMA.paths['CUPRAD_inputs']+'/calculated/medium_effective_density_of_neutral_molecules'] = 1e17
+        archive[MMA.paths['CUPRAD_logs']+'/inverse_group_velocity_SI'] = medium['effective_IR_refrective_index']/units.c_light
+        archive[MMA.paths['global_inputs']+'/medium_pressure_in_bar'] = medium['pressure']
+        archive[MMA.paths['global_inputs']+'/gas_preset'] = np.bytes_(medium['preset_gas'])
+        if density_modulation:
+            archive[MMA.paths['global_inputs']+'/density_mod/zgrid'] = np.linspace(0., 2e-3, 5)
+            archive[MMA.paths['global_inputs']+'/density_mod/table'] = np.array([0.2, 1., 1.2, 0.8, 0.3])
+        out_group = archive.create_group(MMA.paths['CTDSE_outputs'])
+        out_group['omegagrid'] = ogrid
+        out_group['rgrid_coarse'] = rgrid
+        out_group['zgrid_coarse'] = zgrid
+        out_group['FSourceTerm'] = np.stack((FSource.real, FSource.imag), axis=-1)
+
+
+def archive_reference(file_name, Hankel_engine = 'scalar', screen_distance = None, rmax_FF = None, **kwargs):
+    """
+    'Hankel_long' of the whole screen computed directly from the archive with the
+    default inputs of the cluster script (the 'scalar' engine by default), the screen
+    can be changed by 'screen_distance' and 'rmax_FF'.
+    """
+    with h5py.File(file_name, 'r') as archive:
+        inp_group = archive[MMA.paths['Hankel_inputs']]
+        harmonic_range = inp_group['Harmonic_range'][:]
+        if (screen_distance is None): screen_distance = inp_group['distance_FF'][()]
+        if (rmax_FF is None): rmax_FF = inp_group['rmax_FF'][()]
+        rgrid_FF = np.linspace(0., rmax_FF, int(inp_group['Nr_FF'][()]))
+        omega0_au = mn.ConvertPhoton(1e-2*archive[MMA.paths['CUPRAD_inputs']+'/laser_wavelength'][()], 'lambdaSI', 'omegaau')
+        out_group = archive[MMA.paths['CTDSE_outputs']]
+        ogrid = out_group['omegagrid'][:]
+        ko_min = mn.FindInterval(ogrid/omega0_au, harmonic_range[0])
+        ko_max = mn.FindInterval(ogrid/omega0_au, harmonic_range[-1])
+        target = HT.FSources_provider(out_group['zgrid_coarse'][:], out_group['rgrid_coarse'][:], omega_au2SI*ogrid,
+                                      data_source = 'dynamic', h5_handle = archive,
+                                      h5_path = MMA.paths['CTDSE_outputs']+'/FSourceTerm',
+                                      ko_min = ko_min, ko_max = ko_max)
+        Hankel_long_kwargs = dict(medium, pressure = MMA.pressure_constructor(archive),
+                                  Hankel_engine = Hankel_engine)
+        Hankel_long_kwargs.update(kwargs)
+        return HT.Hankel_long(target, screen_distance, rgrid_FF, **Hankel_long_kwargs)
+
+
+def split_archive(file_name, directory, N_files = 3, shuffle = False, missing_keys = [], remove_source = True):
+    """
+    It writes the source of the archive into the temporary files of 'N_files' processes of TDSE
+    in 'directory', the simulations (keys = kr + kz*Nr) are distributed round-robin (and shuffled
+    within each file by 'shuffle'), 'missing_keys' are not written. The source is then removed from
+    the archive ('remove_source').
+    """
+    with h5py.File(file_name, 'r+') as archive:
+        out_group = archive[MMA.paths['CTDSE_outputs']]
+        FSource = out_group['FSourceTerm'][()] # [z,r,omega,(real,imag)]
+        Nz, Nr = FSource.shape[:2]
+        keys = np.setdiff1d(np.arange(Nz*Nr), missing_keys)
+        capacity = len(keys)//N_files + 1
+        for k_file in range(N_files):
+            file_keys = keys[k_file::N_files]
+            if shuffle: file_keys = np.random.default_rng(k_file).permutation(file_keys)
+            simulations = np.zeros((FSource.shape[2], 2, capacity))
+            simulations[:,:,:len(file_keys)] = np.moveaxis(FSource[file_keys//Nr, file_keys%Nr], 0, -1)
+            with h5py.File(os.path.join(directory, 'hdf5_temp_%07d.h5' % k_file), 'w') as temporary_file:
+                temporary_file['FSourceTerm'] = simulations
+                temporary_file['keys'] = np.concatenate((file_keys, -np.ones(capacity - len(file_keys), dtype=int)))
+                temporary_file['number_of_local_simulations'] = np.array([len(file_keys)])
+                temporary_file['Nr_orig'] = np.array([Nr]); temporary_file['Nz_orig'] = np.array([Nz])
+                for name in ['omegagrid', 'rgrid_coarse', 'zgrid_coarse']:
+                    temporary_file[name] = out_group[name][()]
+        if remove_source: del out_group['FSourceTerm']
+
+
+def read_outputs(file_name, group = MMA.paths['Hankel_outputs']):
+    """The datasets of the hdf5-group 'group' (the complex outputs are converted)."""
+    with h5py.File(file_name, 'r') as results:
+        outputs = {}
+        for name, dset in results[group].items():
+            if not(isinstance(dset, h5py.Dataset)): continue
+            value = dset[()]
+            if (name in ['FF_integrated', 'entry_plane_transform', 'exit_plane_transform', 'cumulative_field']):
+                value = value[...,0] + 1j*value[...,1]
+            outputs[name] = value
+    return outputs
+
+
+def run_cluster(directory, inputs = {}, MPI_processes = None, prepare = None, **archive_kwargs):
+    """
+    It writes the archive into 'directory' and runs the cluster script there (by 'mpirun'
+    for 'MPI_processes'), 'prepare(directory)' can modify the inputs before the run.
+    It returns the outputs of 'results_Hankel.h5' (see 'read_outputs').
+    """
+    write_archive(os.path.join(directory, 'archive.h5'), inputs, **archive_kwargs)
+    with open(os.path.join(directory, 'msg.tmp'), 'w') as msg_file:
+        msg_file.write('archive.h5\n')
+    if not(prepare is None): prepare(directory)
+
+    environment = dict(os.environ, PYTHONPATH = os.pathsep.join([Hankel_path, shared_python_path]),
+                       OMPI_ALLOW_RUN_AS_ROOT = '1', OMPI_ALLOW_RUN_AS_ROOT_CONFIRM = '1')
+    command = [sys.executable, cluster_script]
+    if not(MPI_processes is None): command = ['mpirun', '-n', str(MPI_processes), '--oversubscribe'] + command
+    run = subprocess.run(command, cwd = directory, env = environment, capture_output = True, text = True)
+    if not(run.returncode == 0):
+        raise RuntimeError('The cluster script failed:\n' + run.stdout[-2000:] + run.stderr[-2000:])
+    return read_outputs(os.path.join(directory, 'results_Hankel.h5'))
+
+
+def run_tests(namespace):
+    """It runs the functions 'test_*' of a test script (its 'globals()') without pytest."""
+    for name, test in list(namespace.items()):
+        if name.startswith('test_') and callable(test):
+            print('running', name)
+            test()
+    print('all tests passed')
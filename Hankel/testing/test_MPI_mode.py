@@ -0,0 +1,44 @@
+"""
+The cluster script in the MPI mode (mpirun) compared with 'Hankel_long' computed directly, the
+test is skipped without mpi4py and mpirun.
+"""
+import shutil
+import tempfile
+import pytest
+import synthetic_source as ss
+
+pytest.importorskip('mpi4py')
+if (shutil.which('mpirun') is None): pytest.skip('mpirun is not available', allow_module_level = True)
+
+output_names = ['FF_integrated', 'entry_plane_transform', 'exit_plane_transform', 'cumulative_field']
+
+
+def test_dynamic_tiles():
+    with tempfile.TemporaryDirectory() as directory:
+        result = ss.run_cluster(directory, {'parallel_mode': 'MPI', 'tile_size_r_FF': 6, 'tile_size_omega': 5,
+                                            'store_cumulative_result': 1}, MPI_processes = 3)
+        reference = ss.archive_reference(directory + '/archive.h5', store_cumulative_result = True)
+    for name in output_names:
+        assert ss.relative_error(result[name], getattr(reference, name)) < 1e-12
+
+
+def test_default_tiles():
+    # the frequencies are split among the ranks (each rank reads its frequency window)
+    with tempfile.TemporaryDirectory() as directory:
+        result = ss.run_cluster(directory, {'parallel_mode': 'MPI', 'store_cumulative_result': 1}, MPI_processes = 3)
+        reference = ss.archive_reference(directory + '/archive.h5', store_cumulative_result = True)
+    for name in output_names:
+        assert ss.relative_error(result[name], getattr(reference, name)) < 1e-12
+
+
+def test_shared_source_planes():
+    with tempfile.TemporaryDirectory() as directory:
+        result = ss.run_cluster(directory, {'parallel_mode': 'MPI', 'shared_source_planes': 1, 'tile_size_r_FF': 10,
+                                            'store_cumulative_result': 1}, MPI_processes = 3)
+        reference = ss.archive_reference(directory + '/archive.h5', store_cumulative_result = True)
+    for name in output_names:
+        assert ss.relative_error(result[name], getattr(reference, name)) < 1e-12
+
+
+if __name__ == '__main__':
+    ss.run_tests(globals())
@@ -0,0 +1,40 @@
+"""
+The angular screen of 'Hankel_long' compared with the longitudinal integral of the source
+planes transformed once by the 'scalar' engine and with the radial screen.
+"""
+import synthetic_source as ss
+import Hankel_transform as HT
+
+
+def test_single_transform_of_the_integrated_planes():
+    ogrid, rgrid, zgrid, rgrid_FF = ss.grids()
+    target = ss.static_target(ogrid, rgrid, zgrid)
+    FSource = ss.source(ogrid, rgrid, zgrid)
+    pre_factor = HT.get_propagation_pre_factor_function(target.zgrid, target.rgrid, target.ogrid, **ss.medium)[0]
+    weights = HT.radial_quadrature_weights(target.zgrid) # the trapezoidal weights along z
+    accumulated = 0.
+    for kz in range(len(target.zgrid)):
+        accumulated = accumulated + weights[kz] * (pre_factor(kz).T * FSource[kz] *
+                                                   HT.near_field_phase_factor(ogrid, rgrid, ss.distance - target.zgrid[kz]))
+    reference = HT.HankelTransform(ogrid, rgrid, accumulated, ss.distance, rgrid_FF,
+                                   near_field_factor = False, engine = 'scalar').T
+
+    result = HT.Hankel_long(target, ss.distance, rgrid_FF, screen = 'angular', **ss.medium)
+    assert ss.relative_error(result.FF_integrated, reference) < 1e-12
+
+
+def test_difference_from_radial_screen():
+    # the same angles at the distances 1 m and 10 m, the difference scales as L/d
+    ogrid, rgrid, zgrid, rgrid_FF = ss.grids(length = 2e-2)
+    differences = []
+    for distance in [1., 10.]:
+        results = [HT.Hankel_long(ss.static_target(ogrid, rgrid, zgrid), distance, distance*rgrid_FF,
+                                  screen = screen, **ss.medium).FF_integrated
+                   for screen in ['radial', 'angular']]
+        differences.append(ss.relative_error(*results))
+    assert differences[0] < 1e-1
+    assert 5. < differences[0]/differences[1] < 20.
+
+
+if __name__ == '__main__':
+    ss.run_tests(globals())
@@ -0,0 +1,39 @@
+"""
+'HankelTransform_batch' of independent planes compared with 'HankelTransform' of each plane.
+"""
+import numpy as np
+import synthetic_source as ss
+import Hankel_transform as HT
+
+ogrid, rgrid, zgrid, rgrid_FF = ss.grids(Nz = 6)
+planes = ss.source(ogrid, rgrid, zgrid) * np.arange(1., 7.)[:,np.newaxis,np.newaxis]
+
+
+def test_common_and_plane_distances():
+    for distances in [ss.distance, [1., 1., 2., 1., 2., 0.5]]:
+        for near_field_factor in [True, False]:
+            result = HT.HankelTransform_batch(ogrid, rgrid, planes, distances, rgrid_FF, near_field_factor = near_field_factor,
+                                              frequency_block = 3)
+            assert (result.shape == (len(planes), len(ogrid), len(rgrid_FF)))
+            for k1, plane in enumerate(planes):
+                distance = np.broadcast_to(distances, len(planes))[k1]
+                reference = HT.HankelTransform(ogrid, rgrid, plane, distance, rgrid_FF, near_field_factor = near_field_factor,
+                                               engine = 'scalar')
+                assert ss.relative_error(result[k1], reference) < 1e-12
+
+
+def test_options():
+    pre_factor = np.exp(-np.outer(rgrid/1e-4, ogrid/ss.omega0)) # [r,omega]
+    kernel_cache = HT.Kernel_cache()
+    for dtype in [np.cdouble, np.csingle]:
+        result = HT.HankelTransform_batch(ogrid, rgrid, planes, ss.distance, rgrid_FF, pre_factor = pre_factor,
+                                          kernel_cache = kernel_cache, J0_backend = 'tabulated', dtype = dtype)
+        assert (result.dtype == dtype)
+        for k1, plane in enumerate(planes):
+            reference = HT.HankelTransform(ogrid, rgrid, plane, ss.distance, rgrid_FF, pre_factor = pre_factor,
+                                           J0_backend = 'tabulated', dtype = dtype)
+            assert ss.relative_error(result[k1], reference) < (1e-12 if (dtype == np.cdouble) else 1e-5)
+
+
+if __name__ == '__main__':
+    ss.run_tests(globals())
@@ -0,0 +1,109 @@
+"""
+'Hankel_long' interrupted and resumed from its checkpoint compared with the uninterrupted run,
+and the checkpoints of different computations refused.
+"""
+import os
+import tempfile
+import numpy as np
+import h5py
+import pytest
+import synthetic_source as ss
+import Hankel_transform as HT
+
+ogrid, rgrid, zgrid, rgrid_FF = ss.grids(Nz = 12)
+
+
+class Interruption(Exception):
+    pass
+
+
+def target(N_planes = None):
+    """The target interrupted when the plane 'N_planes' is requested."""
+    target = ss.static_target(ogrid, rgrid, zgrid)
+    if not(N_planes is None):
+        planes = target.Fsource_plane
+        def interrupted_planes():
+            for k1, plane in enumerate(planes):
+                if (k1 == N_planes): raise Interruption()
+                yield plane
+        target.Fsource_plane = interrupted_planes()
+    return target
+
+
+def test_resumed_run():
+    for integrator_longitudinal in ['trapezoidal', 'simpson', 'filon']:
+        kwargs = dict(ss.medium, integrator_longitudinal = integrator_longitudinal, store_cumulative_result = True)
+        reference = HT.Hankel_long(target(), ss.distance, rgrid_FF, **kwargs)
+        with tempfile.TemporaryDirectory() as directory:
+            checkpoint_file = os.path.join(directory, 'checkpoint.h5')
+            with h5py.File(os.path.join(directory, 'outputs.h5'), 'w') as outputs_file:
+                streamed = dict(raw_transforms_output = outputs_file.require_group('raw'),
+                                cumulative_output = outputs_file.require_group('cumulative'),
+                                store_non_normalised_cumulative_result = True)
+                for N_planes in [6, 9]: # two interruptions, the second resumes from the first
+                    with pytest.raises(Interruption):
+                        HT.Hankel_long(target(N_planes), ss.distance, rgrid_FF, checkpoint_file = checkpoint_file,
+                                       checkpoint_interval = 2, **streamed, **kwargs)
+                result = HT.Hankel_long(target(), ss.distance, rgrid_FF, checkpoint_file = checkpoint_file,
+                                        checkpoint_interval = 2, **streamed, **kwargs)
+                streamed_reference = HT.Hankel_long(target(), ss.distance, rgrid_FF, store_non_normalised_cumulative_result = True,
+                                                    **kwargs)
+                assert ss.relative_error(outputs_file['cumulative/cumulative_field_no_norm'][...,0] +
+                                         1j*outputs_file['cumulative/cumulative_field_no_norm'][...,1],
+                                         streamed_reference.cumulative_field_no_norm) < 1e-12
+                raw_result = HT.Hankel_long(HT.FField_FF_provider(outputs_file, 'raw'), ss.distance, rgrid_FF, **kwargs)
+                assert ss.relative_error(raw_result.FF_integrated, reference.FF_integrated) < 1e-12
+        for name in ['FF_integrated', 'entry_plane_transform', 'exit_plane_transform']:
+            assert ss.relative_error(getattr(result, name), getattr(reference, name)) < 1e-12
+
+
+def test_in_memory_cumulative_fields():
+    # the cumulative fields are written by parts, the resumed run equals the uninterrupted one exactly
+    for dtype in [np.cdouble, np.csingle]:
+        for integrator_longitudinal in ['trapezoidal', 'simpson']:
+            kwargs = dict(ss.medium, integrator_longitudinal = integrator_longitudinal, store_cumulative_result = True,
+                          store_non_normalised_cumulative_result = True, dtype = dtype)
+            reference = HT.Hankel_long(target(), ss.distance, rgrid_FF, **kwargs)
+            with tempfile.TemporaryDirectory() as directory:
+                checkpoint_file = os.path.join(directory, 'checkpoint.h5')
+                for N_planes in [4, 9]:
+                    with pytest.raises(Interruption):
+                        HT.Hankel_long(target(N_planes), ss.distance, rgrid_FF, checkpoint_file = checkpoint_file,
+                                       checkpoint_interval = 3, **kwargs)
+                k_plane, state = HT.read_Hankel_checkpoint(checkpoint_file, {})
+                assert (k_plane == 6) and (len(state['cumulative_field']) == 6)
+                assert all(value.dtype == dtype for value in state.values())
+                result = HT.Hankel_long(target(), ss.distance, rgrid_FF, checkpoint_file = checkpoint_file,
+                                        checkpoint_interval = 3, **kwargs)
+                HT.remove_Hankel_checkpoint(checkpoint_file)
+                assert (os.listdir(directory) == [])
+            for name in ['FF_integrated', 'entry_plane_transform', 'exit_plane_transform', 'cumulative_field',
+                         'cumulative_field_no_norm']:
+                assert (getattr(result, name).dtype == dtype)
+                assert np.array_equal(getattr(result, name), getattr(reference, name))
+
+
+def test_different_computation_refused():
+    with tempfile.TemporaryDirectory() as directory:
+        checkpoint_file = os.path.join(directory, 'checkpoint.h5')
+        with pytest.raises(Interruption):
+            HT.Hankel_long(target(6), ss.distance, rgrid_FF, checkpoint_file = checkpoint_file,
+                           checkpoint_interval = 2, **ss.medium)
+        changes = [dict(ss.medium, pressure = 0.1), dict(ss.medium, Hankel_engine = 'fht'),
+                   dict(ss.medium, radial_threshold = 1e-8), dict(ss.medium, J0_backend = 'tabulated'),
+                   dict(ss.medium, near_field_factor = False),
+                   dict(ss.medium, integrator_Hankel = lambda y, x: HT.trapezoidal_integrator(y, x)),
+                   dict(ss.medium, pre_factor_tables = HT.get_pre_factor_tables(zgrid[:-1], rgrid, ogrid,
+                                                                                 **dict(ss.medium, pressure = 0.1)))]
+        for kwargs in changes:
+            with pytest.raises(ValueError):
+                HT.Hankel_long(target(), ss.distance, rgrid_FF, checkpoint_file = checkpoint_file, **kwargs)
+        with pytest.raises(ValueError): # another screen
+            HT.Hankel_long(target(), 2.*ss.distance, rgrid_FF, checkpoint_file = checkpoint_file, **ss.medium)
+        with pytest.raises(ValueError): # another radial grid of the source
+            HT.Hankel_long(ss.static_target(ogrid, 1.1*rgrid, zgrid), ss.distance, rgrid_FF,
+                           checkpoint_file = checkpoint_file, **ss.medium)
+
+
+if __name__ == '__main__':
+    ss.run_tests(globals())
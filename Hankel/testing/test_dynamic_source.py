@@ -0,0 +1,55 @@
+"""
+The planes of the 'dynamic' FSources_provider (read once and prefetched) compared with the
+'static' provider of the same source.
+"""
+import numpy as np
+import h5py
+import pytest
+import synthetic_source as ss
+import Hankel_transform as HT
+
+ogrid, rgrid, zgrid, rgrid_FF = ss.grids()
+FSource = ss.source(ogrid, rgrid, zgrid)
+
+
+def source_file():
+    source_h5 = h5py.File('source.h5', 'w', driver = 'core', backing_store = False)
+    FSource_h5 = np.transpose(FSource, (0,2,1)) # the layout of the archive [z,r,omega,(real,imag)]
+    source_h5['FSourceTerm'] = np.stack((FSource_h5.real, FSource_h5.imag), axis=-1)
+    return source_h5
+
+
+def test_planes():
+    selections = [{}, {'ko_min': 1, 'ko_max': 6, 'ko_step': 2, 'kr_step': 3, 'kz_step': 2},
+                  {'ko_indices': [0, 1, 2, 4, 6], 'kr_max': 30}]
+    with source_file() as source_h5:
+        for selection in selections:
+            reference = [np.copy(plane) for plane in ss.static_target(ogrid, rgrid, zgrid, **selection).Fsource_plane]
+            for prefetch in [0, 1, 2]:
+                target = HT.FSources_provider(zgrid, rgrid, ogrid, data_source = 'dynamic', h5_handle = source_h5,
+                                              h5_path = 'FSourceTerm', prefetch = prefetch, **selection)
+                planes = [np.copy(plane) for plane in target.Fsource_plane]
+                assert (len(planes) == len(reference))
+                for plane, reference_plane in zip(planes, reference):
+                    assert np.array_equal(plane, reference_plane)
+
+
+def test_Hankel_long():
+    with source_file() as source_h5:
+        result = HT.Hankel_long(HT.FSources_provider(zgrid, rgrid, ogrid, data_source = 'dynamic', h5_handle = source_h5,
+                                                     h5_path = 'FSourceTerm'),
+                                ss.distance, rgrid_FF, **ss.medium)
+    reference = HT.Hankel_long(ss.static_target(ogrid, rgrid, zgrid), ss.distance, rgrid_FF, **ss.medium)
+    assert np.array_equal(result.FF_integrated, reference.FF_integrated)
+
+
+def test_reading_error():
+    with source_file() as source_h5:
+        target = HT.FSources_provider(zgrid, rgrid, ogrid, data_source = 'dynamic', h5_handle = source_h5,
+                                      h5_path = 'missing', prefetch = 2)
+        with pytest.raises(KeyError): # passed from the prefetching thread
+            next(target.Fsource_plane)
+
+
+if __name__ == '__main__':
+    ss.run_tests(globals())
@@ -0,0 +1,34 @@
+"""
+The 'fht' engine of 'HankelTransform' compared with the analytic transform of a Gaussian
+and with the 'scalar' engine.
+"""
+import numpy as np
+import synthetic_source as ss
+import Hankel_transform as HT
+import units
+
+ogrid = ss.omega0*np.array([21., 24., 27.])
+rgrid = np.linspace(0., 1.5e-4, 200)
+rgrid_FF = np.linspace(0., 5e-3, 50)
+
+
+def test_Gaussian():
+    # int exp(-r^2/w^2) J0(k*r*r_FF/d) r dr = w^2/2 * exp(-(k*w*r_FF/(2d))^2)
+    waist = 3e-5
+    FField = np.outer(np.ones(len(ogrid)), np.exp(-(rgrid/waist)**2))
+    analytic = 0.5*waist**2 * np.exp(-(np.outer(ogrid/units.c_light, rgrid_FF)*waist/(2.*ss.distance))**2)
+    reference_error = ss.relative_error(HT.HankelTransform(ogrid, rgrid, FField, ss.distance, rgrid_FF,
+                                                           near_field_factor = False, engine = 'scalar'), analytic)
+    result = HT.HankelTransform(ogrid, rgrid, FField, ss.distance, rgrid_FF, near_field_factor = False, engine = 'fht')
+    assert ss.relative_error(result, analytic) < 2.*reference_error
+
+
+def test_source_with_near_field_factor():
+    FField = ss.source(ogrid, rgrid, [2e-3])[0]
+    reference = HT.HankelTransform(ogrid, rgrid, FField, ss.distance, rgrid_FF, engine = 'scalar')
+    result = HT.HankelTransform(ogrid, rgrid, FField, ss.distance, rgrid_FF, engine = 'fht')
+    assert ss.relative_error(result, reference) < 1e-3
+
+
+if __name__ == '__main__':
+    ss.run_tests(globals())
@@ -0,0 +1,66 @@
+"""
+The selection of the frequencies (harmonic windows, the spectral power of the source and the
+reading of non-contiguous frequencies) compared with the straightforward selection.
+"""
+import tempfile
+import numpy as np
+import h5py
+from scipy import integrate
+import synthetic_source as ss
+import Hankel_transform as HT
+
+ogrid, rgrid, zgrid, rgrid_FF = ss.grids(No = 61)
+ogrid_wide = ss.omega0*np.linspace(15., 35., 61)
+FSource = ss.source(ogrid, rgrid, zgrid)
+
+
+def test_harmonic_windows():
+    indices = HT.harmonic_window_indices(ogrid_wide, ss.omega0, [17, 21, 29], 0.5)
+    expected = [k1 for k1, omega in enumerate(ogrid_wide)
+                if any(abs(omega/ss.omega0 - H) <= 0.5 for H in [17, 21, 29])]
+    assert np.array_equal(indices, expected)
+
+
+def test_index_runs():
+    for indices in [[3], [0, 1, 2, 3], [1, 3, 5, 6, 7, 20, 22, 24, 25], np.arange(0, 40, 3)]:
+        reconstructed = np.empty(len(indices), dtype = int)
+        runs = HT.index_runs(np.asarray(indices))
+        for run_slice, positions in runs:
+            reconstructed[positions] = np.arange(run_slice.start, run_slice.stop, run_slice.step)
+        assert np.array_equal(reconstructed, indices)
+    assert (len(HT.index_runs(np.arange(0, 40, 3))) == 1)
+
+
+def test_selected_planes():
+    ko_indices = HT.harmonic_window_indices(ogrid, ss.omega0, [22, 24, 26], 0.3)
+    FSource_h5 = np.transpose(FSource, (0,2,1))
+    with h5py.File('source.h5', 'w', driver = 'core', backing_store = False) as source_h5:
+        source_h5['FSourceTerm'] = np.stack((FSource_h5.real, FSource_h5.imag), axis=-1)
+        targets = [ss.static_target(ogrid, rgrid, zgrid, FSource = FSource, ko_indices = ko_indices),
+                   HT.FSources_provider(zgrid, rgrid, ogrid, data_source = 'dynamic', h5_handle = source_h5,
+                                        h5_path = 'FSourceTerm', ko_indices = ko_indices)]
+        for target in targets:
+            assert np.array_equal(target.ogrid, ogrid[ko_indices])
+            for k1, plane in enumerate(target.Fsource_plane):
+                assert np.array_equal(plane, FSource[k1][ko_indices])
+
+
+def test_spectral_power():
+    power = HT.source_spectral_power(ss.static_target(ogrid, rgrid, zgrid, FSource = FSource))
+    expected = sum(integrate.trapezoid(rgrid * np.abs(FSource[k1])**2, x = rgrid, axis = -1) for k1 in range(len(zgrid)-1))
+    assert np.allclose(power, expected, rtol = 1e-13, atol = 0.)
+
+
+def test_cluster_script():
+    with tempfile.TemporaryDirectory() as directory:
+        result = ss.run_cluster(directory, {'harmonic_orders': [23, 25], 'harmonic_window': 0.5,
+                                            'spectral_power_threshold': 1e-3})
+        reference = ss.archive_reference(directory + '/archive.h5')
+    selection = np.isin(reference.ogrid, result['ogrid'])
+    assert (np.count_nonzero(selection) == len(result['ogrid'])) and (0 < len(result['ogrid']) < len(reference.ogrid))
+    assert np.all(np.min(np.abs(reference.ogrid[selection,np.newaxis]/ss.omega0 - np.array([23, 25])), axis = 1) <= 0.5)
+    assert ss.relative_error(result['FF_integrated'], reference.FF_integrated[:,selection]) < 1e-12
+
+
+if __name__ == '__main__':
+    ss.run_tests(globals())
@@ -0,0 +1,37 @@
+"""
+The spectrum integrated over the screen by Parseval's theorem (screen = 'integrated') compared
+with the integral of the computed angular screen ('screen_integrated_spectrum').
+"""
+import tempfile
+import numpy as np
+import synthetic_source as ss
+import Hankel_transform as HT
+
+ogrid, rgrid, zgrid, _ = ss.grids(Nr = 80)
+rgrid_FF = np.linspace(0., 5e-3, 200) # the screen covers the beam
+
+
+def test_Parseval():
+    kwargs = dict(ss.medium, store_cumulative_result = True, store_non_normalised_cumulative_result = True)
+    screen = HT.Hankel_long(ss.static_target(ogrid, rgrid, zgrid), ss.distance, rgrid_FF, screen = 'angular', **kwargs)
+    integrated = HT.Hankel_long(ss.static_target(ogrid, rgrid, zgrid), ss.distance, rgrid_FF, screen = 'integrated', **kwargs)
+    assert (integrated.FF_integrated.shape == (1, len(ogrid)))
+    # the agreement is limited by the radial discretisation of the source
+    assert ss.relative_error(integrated.FF_integrated[0].real, HT.screen_integrated_spectrum(screen.FF_integrated, rgrid_FF)) < 5e-3
+    for k1 in range(len(zgrid)-2):
+        assert ss.relative_error(integrated.cumulative_field_no_norm[k1,0].real,
+                                 HT.screen_integrated_spectrum(screen.cumulative_field_no_norm[k1], rgrid_FF)) < 5e-3
+    assert ss.relative_error(integrated.cumulative_field_no_norm[-1], integrated.FF_integrated) < 1e-13
+
+
+def test_cluster_script():
+    with tempfile.TemporaryDirectory() as directory:
+        result = ss.run_cluster(directory, {'integrated_spectrum': 1})
+        reference = ss.archive_reference(directory + '/archive.h5', screen = 'integrated')
+    assert ss.relative_error(result['integrated_spectrum'], reference.FF_integrated[0].real) < 1e-12
+    assert ss.relative_error(result['integrated_spectrum_screen'], HT.screen_integrated_spectrum(result['FF_integrated'],
+                                                                                               np.linspace(0., 5e-3, 20))) < 1e-12
+
+
+if __name__ == '__main__':
+    ss.run_tests(globals())
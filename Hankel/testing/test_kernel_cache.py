@@ -0,0 +1,78 @@
+"""
+'Kernel_cache' (in memory and in the store on disk) compared with the transforms without the cache,
+and the limits of its memory and of its store.
+"""
+import os
+import tempfile
+import numpy as np
+import synthetic_source as ss
+import Hankel_transform as HT
+
+ogrid, rgrid, zgrid, rgrid_FF = ss.grids()
+
+
+def store_size(store):
+    return sum(os.path.getsize(os.path.join(store, name)) for name in os.listdir(store) if name.endswith('.h5'))
+
+
+def test_cached_results():
+    for screen in ['radial', 'angular']:
+        reference = HT.Hankel_long(ss.static_target(ogrid, rgrid, zgrid), ss.distance, rgrid_FF, screen = screen, **ss.medium)
+        kernel_cache = HT.Kernel_cache()
+        for k1 in range(2): # the second run takes all the kernels from the cache
+            result = HT.Hankel_long(ss.static_target(ogrid, rgrid, zgrid), ss.distance, rgrid_FF, screen = screen,
+                                    kernel_cache = kernel_cache, **ss.medium)
+            for name in ['FF_integrated', 'entry_plane_transform', 'exit_plane_transform']:
+                assert np.array_equal(getattr(result, name), getattr(reference, name))
+            if (k1 == 0): misses = kernel_cache.misses
+        assert (kernel_cache.misses == misses) and (kernel_cache.hits > 0)
+
+
+def test_memory_limit():
+    kernel_cache = HT.Kernel_cache(max_bytes = 3000)
+    kernels = [kernel_cache.get('test', (k1,), lambda: np.zeros(100)) for k1 in range(5)] # 800 B each
+    assert (kernel_cache.size <= 3000) and (len(kernel_cache.kernels) == 3)
+    kernel_cache.get('test', (2,), lambda: np.zeros(100)) # the recently used kernel is kept
+    kernel_cache.get('test', (5,), lambda: np.zeros(100))
+    assert (kernel_cache.misses == 6) and (kernel_cache.hits == 1)
+    assert (HT.grid_signature('test', 2) in kernel_cache.kernels) and not(HT.grid_signature('test', 3) in kernel_cache.kernels)
+    assert not(kernels[0].flags.writeable)
+
+
+def test_store():
+    reference = HT.Hankel_long(ss.static_target(ogrid, rgrid, zgrid), ss.distance, rgrid_FF, **ss.medium)
+    with tempfile.TemporaryDirectory() as store:
+        for k1 in range(2): # another run (a new cache) reads the kernels from the store
+            kernel_cache = HT.Kernel_cache(store = store)
+            result = HT.Hankel_long(ss.static_target(ogrid, rgrid, zgrid), ss.distance, rgrid_FF,
+                                    kernel_cache = kernel_cache, **ss.medium)
+            assert np.array_equal(result.FF_integrated, reference.FF_integrated)
+        assert (kernel_cache.misses == 0) and (kernel_cache.store_hits > 0)
+
+
+def test_store_limit():
+    # a run is stored only if all its kernels fit, the files of the other runs are then removed
+    rgrids_FF = [rgrid_FF, 0.5*rgrid_FF]
+    references = [HT.Hankel_long(ss.static_target(ogrid, rgrid, zgrid), ss.distance, screen, **ss.medium).FF_integrated
+                  for screen in rgrids_FF]
+    with tempfile.TemporaryDirectory() as store:
+        HT.Hankel_long(ss.static_target(ogrid, rgrid, zgrid), ss.distance, rgrid_FF,
+                       kernel_cache = HT.Kernel_cache(store = store), **ss.medium)
+        run_size = store_size(store)
+    for max_store_bytes in [run_size - 1, run_size]:
+        with tempfile.TemporaryDirectory() as store:
+            for screen, reference in [(0, 0), (0, 0), (1, 1), (1, 1)]:
+                kernel_cache = HT.Kernel_cache(store = store, max_store_bytes = max_store_bytes)
+                result = HT.Hankel_long(ss.static_target(ogrid, rgrid, zgrid), ss.distance, rgrids_FF[screen],
+                                        kernel_cache = kernel_cache, **ss.medium)
+                assert np.array_equal(result.FF_integrated, references[reference])
+                if (max_store_bytes < run_size):
+                    assert (store_size(store) == 0) and (kernel_cache.store_hits == 0)
+                else:
+                    assert (0 < store_size(store) <= run_size)
+            if (max_store_bytes == run_size): # the rerun takes all the kernels from the store
+                assert (kernel_cache.misses == 0) and (kernel_cache.store_hits > 0)
+
+
+if __name__ == '__main__':
+    ss.run_tests(globals())
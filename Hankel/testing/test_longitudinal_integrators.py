@@ -0,0 +1,72 @@
+"""
+The longitudinal integrators of 'Hankel_long' on a phase-mismatched medium: the Filon-type rule
+is exact for a source independent of z (the integral of the pre-factor is analytic), the
+trapezoidal and Simpson's rules converge with the orders 2 and 4.
+"""
+import numpy as np
+import synthetic_source as ss
+import Hankel_transform as HT
+
+ogrid, rgrid, _, rgrid_FF = ss.grids(No = 3, Nr_FF = 10)
+medium = dict(ss.medium, effective_IR_refrective_index = 1. + 1e-4) # about 6 oscillations of the pre-factor
+length = 2e-3
+plane = ss.source(ogrid, rgrid, [0.])[0]
+
+
+def integrated(N_planes, integrator_longitudinal, amplitude = lambda z: np.ones_like(z), **kwargs):
+    # the planes are in 'zgrid[:-1]' of the target
+    zgrid = np.append(np.linspace(0., length, N_planes), 2.*length)
+    target = ss.static_target(ogrid, rgrid, zgrid, FSource = amplitude(zgrid)[:,np.newaxis,np.newaxis] * plane)
+    return HT.Hankel_long(target, ss.distance, rgrid_FF, integrator_longitudinal = integrator_longitudinal,
+                          **kwargs, **medium).FF_integrated
+
+
+def analytic_integral():
+    # the angular screen without the near-field factor: the transform of the plane times
+    # int_0^L pressure*exp(a*z + b) dz, the exponent of the pre-factor is linear in z
+    zgrid = np.array([0., length])
+    exponent = HT.get_propagation_pre_factor_function(zgrid, rgrid, ogrid, return_exponent = True, **medium)[2]
+    a = (exponent(1) - exponent(0))/length; b = exponent(0)
+    transform = HT.HankelTransform(ogrid, rgrid, plane, ss.distance, rgrid_FF, near_field_factor = False, engine = 'scalar').T
+    return transform * medium['pressure'] * np.exp(b) * (np.exp(a*length) - 1.)/a
+
+
+def test_filon_exact():
+    reference = analytic_integral()
+    for N_planes in [3, 5, 9]:
+        result = integrated(N_planes, 'filon', screen = 'angular', near_field_factor = False)
+        assert ss.relative_error(result, reference) < 1e-12
+
+
+def test_convergence_orders():
+    reference = analytic_integral()
+    for integrator_longitudinal, order in [('trapezoidal', 2), ('simpson', 4)]:
+        errors = [ss.relative_error(integrated(N_planes, integrator_longitudinal, screen = 'angular', near_field_factor = False),
+                                    reference) for N_planes in [17, 33, 65]]
+        assert np.all(np.array(errors[:-1])/np.array(errors[1:]) > 0.75 * 2**order)
+
+
+def test_filon_radial_screen():
+    # the amplitude varies along z and the kernel with the distance of the planes, the Filon-type
+    # rule is then of the second order, but it does not need to resolve the oscillations
+    amplitude = lambda z: np.cos(z/length)
+    reference = integrated(513, 'simpson', amplitude)
+    errors = [ss.relative_error(integrated(N_planes, 'filon', amplitude), reference) for N_planes in [17, 33, 65]]
+    assert np.all(np.array(errors[:-1])/np.array(errors[1:]) > 3.)
+    assert (ss.relative_error(integrated(9, 'filon', amplitude), reference) <
+            ss.relative_error(integrated(65, 'trapezoidal', amplitude), reference))
+
+
+def test_simpson_weights():
+    z0, z1, z2 = 0.1, 0.4, 1.2 # non-uniform
+    polynomial = lambda z: 3.*z**2 - z + 2.
+    primitive = lambda z: z**3 - 0.5*z**2 + 2.*z
+    values = np.array([polynomial(z0), polynomial(z1), polynomial(z2)])
+    whole, first, second = HT.simpson_weights(z0, z1, z2)
+    assert np.isclose(np.dot(whole, values), primitive(z2) - primitive(z0), rtol = 1e-14)
+    assert np.isclose(np.dot(first, values), primitive(z1) - primitive(z0), rtol = 1e-14)
+    assert np.isclose(np.dot(second, values), primitive(z2) - primitive(z1), rtol = 1e-14)
+
+
+if __name__ == '__main__':
+    ss.run_tests(globals())
@@ -0,0 +1,49 @@
+"""
+The 'matrix' engine of 'HankelTransform' compared with the 'scalar' engine (the original loop).
+"""
+import numpy as np
+from scipy import integrate
+import synthetic_source as ss
+import Hankel_transform as HT
+
+
+def simpson_integrator(y, x):
+    return integrate.simpson(y, x=x)
+
+
+def test_single_plane():
+    ogrid, rgrid, zgrid, rgrid_FF = ss.grids()
+    plane = ss.source(ogrid, rgrid, zgrid)[-1]
+    for near_field_factor in [True, False]:
+        reference = HT.HankelTransform(ogrid, rgrid, plane, ss.distance, rgrid_FF,
+                                       near_field_factor = near_field_factor, engine = 'scalar')
+        for frequency_block in [1, 3, 16]:
+            result = HT.HankelTransform(ogrid, rgrid, plane, ss.distance, rgrid_FF,
+                                        near_field_factor = near_field_factor, frequency_block = frequency_block)
+            assert ss.relative_error(result, reference) < 1e-12
+
+
+def test_radial_pre_factor_and_integrator():
+    ogrid, rgrid, zgrid, rgrid_FF = ss.grids(Nr = 41)
+    plane = ss.source(ogrid, rgrid, zgrid)[0]
+    pre_factor = np.exp(-np.outer(rgrid/1e-4, ogrid/ss.omega0) + 0.3j*np.outer(rgrid/1e-4, np.ones(len(ogrid)))) # [r,omega]
+    for integrator in [HT.trapezoidal_integrator, simpson_integrator]:
+        reference = HT.HankelTransform(ogrid, rgrid, plane, ss.distance, rgrid_FF, integrator = integrator,
+                                       pre_factor = pre_factor, engine = 'scalar')
+        result = HT.HankelTransform(ogrid, rgrid, plane, ss.distance, rgrid_FF, integrator = integrator,
+                                    pre_factor = pre_factor)
+        assert ss.relative_error(result, reference) < 1e-12
+
+
+def test_Hankel_long():
+    ogrid, rgrid, zgrid, rgrid_FF = ss.grids()
+    reference = HT.Hankel_long(ss.static_target(ogrid, rgrid, zgrid), ss.distance, rgrid_FF,
+                               Hankel_engine = 'scalar', **ss.medium)
+    result = HT.Hankel_long(ss.static_target(ogrid, rgrid, zgrid), ss.distance, rgrid_FF,
+                            Hankel_engine = 'matrix', **ss.medium)
+    for name in ['FF_integrated', 'entry_plane_transform', 'exit_plane_transform']:
+        assert ss.relative_error(getattr(result, name), getattr(reference, name)) < 1e-12
+
+
+if __name__ == '__main__':
+    ss.run_tests(globals())
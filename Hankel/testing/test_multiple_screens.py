@@ -0,0 +1,48 @@
+"""
+Several screens computed by a single 'Hankel_long' compared with the separate computations of
+the screens, directly and by the cluster script.
+"""
+import os
+import tempfile
+import numpy as np
+import pytest
+import synthetic_source as ss
+import Hankel_transform as HT
+import MMA_administration as MMA
+
+ogrid, rgrid, zgrid, rgrid_FF = ss.grids()
+distances = [ss.distance, 0.5, 2.]
+rgrids_FF = [rgrid_FF, np.linspace(0., 1e-3, 10), np.linspace(1e-3, 8e-3, 30)]
+output_names = ['FF_integrated', 'entry_plane_transform', 'exit_plane_transform', 'cumulative_field']
+
+
+def test_screens():
+    kwargs = dict(ss.medium, store_cumulative_result = True)
+    result = HT.Hankel_long(ss.static_target(ogrid, rgrid, zgrid), distances, rgrids_FF, **kwargs)
+    for k_screen, (distance, screen_rgrid_FF) in enumerate(zip(distances, rgrids_FF)):
+        reference = HT.Hankel_long(ss.static_target(ogrid, rgrid, zgrid), distance, screen_rgrid_FF, **kwargs)
+        outputs = HT.screen_outputs(result, k_screen)
+        assert (outputs.distance == distance) and np.array_equal(outputs.rgrid, screen_rgrid_FF)
+        for name in output_names:
+            assert ss.relative_error(getattr(outputs, name), getattr(reference, name)) < 1e-13
+
+
+def test_not_implemented():
+    with pytest.raises(NotImplementedError):
+        HT.Hankel_long(ss.static_target(ogrid, rgrid, zgrid), distances, rgrids_FF, screen = 'angular', **ss.medium)
+
+
+def test_cluster_script():
+    with tempfile.TemporaryDirectory() as directory:
+        result = ss.run_cluster(directory, {'Nthreads': 3, 'distance_FF_screens': [2.], 'rmax_FF_screens': [8e-3],
+                                            'tile_size_r_FF': 15})
+        second_screen = ss.read_outputs(os.path.join(directory, 'results_Hankel.h5'), MMA.paths['Hankel_outputs']+'/screen_1')
+        reference = ss.archive_reference(directory + '/archive.h5')
+        second_reference = ss.archive_reference(directory + '/archive.h5', screen_distance = 2., rmax_FF = 8e-3)
+    for outputs, reference_outputs in [(result, reference), (second_screen, second_reference)]:
+        assert ss.relative_error(outputs['FF_integrated'], reference_outputs.FF_integrated) < 1e-12
+    assert (second_screen['distance_FF'] == 2.)
+
+
+if __name__ == '__main__':
+    ss.run_tests(globals())
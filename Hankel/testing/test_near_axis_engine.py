@@ -0,0 +1,58 @@
+"""
+The 'near_axis' engine of 'HankelTransform' compared with the 'scalar' engine on the axis (exact)
+and near the axis, the warning of its accuracy and the on-axis spectrum of the cluster script.
+"""
+import tempfile
+import warnings
+import numpy as np
+import pytest
+import synthetic_source as ss
+import Hankel_transform as HT
+
+ogrid, rgrid, zgrid, _ = ss.grids()
+plane = ss.source(ogrid, rgrid, zgrid)[-1]
+near_rgrid_FF = np.linspace(0., 5e-5, 4) # k*r*r_FF/distance < 1.3
+
+
+def test_on_axis():
+    reference = HT.HankelTransform(ogrid, rgrid, plane, ss.distance, [0.], engine = 'scalar')
+    for near_axis_order in [0, 2]:
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            result = HT.HankelTransform(ogrid, rgrid, plane, ss.distance, [0.], engine = 'near_axis',
+                                        near_axis_order = near_axis_order)
+        assert ss.relative_error(result, reference) < 1e-13
+
+
+def test_near_axis():
+    reference = HT.HankelTransform(ogrid, rgrid, plane, ss.distance, near_rgrid_FF, engine = 'scalar')
+    errors = []
+    for near_axis_order in [2, 4, 6]:
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            result = HT.HankelTransform(ogrid, rgrid, plane, ss.distance, near_rgrid_FF, engine = 'near_axis',
+                                        near_axis_order = near_axis_order)
+        errors.append(ss.relative_error(result, reference))
+    assert (errors[0] < 1e-3) and (errors[1] < 1e-2*errors[0]) and (errors[2] < 1e-2*errors[1])
+
+
+def test_accuracy_warning():
+    with pytest.warns(UserWarning, match = 'near_axis_order'):
+        HT.HankelTransform(ogrid, rgrid, plane, ss.distance, np.linspace(0., 5e-3, 10), engine = 'near_axis')
+    with warnings.catch_warnings(): # the bound follows the order
+        warnings.simplefilter('error')
+        HT.HankelTransform(ogrid, rgrid, plane, ss.distance, near_rgrid_FF, engine = 'near_axis', near_axis_order = 2)
+    with pytest.warns(UserWarning):
+        HT.HankelTransform(ogrid, rgrid, plane, ss.distance, near_rgrid_FF, engine = 'near_axis', near_axis_order = 0)
+
+
+def test_cluster_script():
+    with tempfile.TemporaryDirectory() as directory:
+        result = ss.run_cluster(directory, {'on_axis_spectrum': 1})
+        reference = ss.archive_reference(directory + '/archive.h5', rmax_FF = 0.)
+    assert (result['FF_integrated'].shape[0] == 1)
+    assert ss.relative_error(result['FF_integrated'], reference.FF_integrated[:1]) < 1e-12
+
+
+if __name__ == '__main__':
+    ss.run_tests(globals())
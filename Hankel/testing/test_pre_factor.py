@@ -0,0 +1,97 @@
+"""
+The vectorised pre-factor ('get_propagation_pre_factor_function') compared with the original
+construction frequency by frequency (and radial point by radial point) for the density profiles,
+and the constant profiles compared with the analytic pre-factor of the scalar pressure.
+"""
+import numpy as np
+from scipy import integrate
+from scipy import interpolate
+import synthetic_source as ss
+import Hankel_transform as HT
+import XUV_refractive_index as XUV_index
+import units
+
+ogrid, rgrid, zgrid, _ = ss.grids(No = 5, Nr = 6, Nz = 7)
+gas = ss.medium['preset_gas'] + '_Henke'
+n_IR = ss.medium['effective_IR_refrective_index']
+pressure_zgrid = np.linspace(-2e-4, 1.8e-3, 6) # the table exceeds the medium at the entry
+pressure_rgrid = np.linspace(0., 8e-5, 4)
+z_profile = 0.05*np.array([0.2, 1., 1.2, 0.8, 0.5, 0.3])
+zr_profile = np.outer(z_profile, np.array([1., 0.9, 0.6, 0.2]))
+
+
+def table_interpolation(grid, table, points):
+    return interpolate.interp1d(grid, table, bounds_error = False, fill_value = (table[0], table[-1]))(points)
+
+
+def reference_pre_factor(pressure_z, normalised_absorption = True):
+    """
+    The pre-factor [z,omega] of the profile 'pressure_z' on 'pressure_zgrid' (the original loop over the frequencies),
+    the absorption is normalised to the exit of the medium if 'normalised_absorption'.
+    """
+    pre_factor = np.empty((len(zgrid), len(ogrid)), dtype = np.cdouble)
+    for k1 in range(len(ogrid)):
+        dispersion_integral = integrate.cumulative_trapezoid(XUV_index.dispersion_function(ogrid[k1], pressure_z, gas, n_IR = n_IR),
+                                                             x = pressure_zgrid, initial = 0.)
+        absorption_integral = (XUV_index.beta_factor_ref(ogrid[k1], gas) / units.c_light *
+                               integrate.cumulative_trapezoid(pressure_z, x = pressure_zgrid, initial = 0.))
+        absorption_factor = table_interpolation(pressure_zgrid, absorption_integral, zgrid)
+        if normalised_absorption: absorption_factor = absorption_factor - absorption_factor[-1]
+        pre_factor[:,k1] = (table_interpolation(pressure_zgrid, pressure_z, zgrid) *
+                            np.exp(ogrid[k1] * (1j*table_interpolation(pressure_zgrid, dispersion_integral, zgrid) +
+                                                absorption_factor)))
+    return pre_factor
+
+
+def test_scalar_pressure():
+    pressure = ss.medium['pressure']
+    pre_factor, exp_renorm = HT.get_propagation_pre_factor_function(zgrid, rgrid, ogrid, **ss.medium)
+    dispersion_factor = 1j*XUV_index.dispersion_function(ogrid, pressure, gas, n_IR = n_IR)
+    absorption_factor = pressure/units.c_light * XUV_index.beta_factor_ref(ogrid, gas)
+    for kz in range(len(zgrid)):
+        reference = pressure * np.exp(ogrid*(zgrid[kz]*dispersion_factor + (zgrid[kz] - zgrid[-1])*absorption_factor))
+        assert np.allclose(pre_factor(kz), reference[np.newaxis,:], rtol = 1e-12, atol = 0.)
+        assert np.allclose(exp_renorm(kz), np.exp((zgrid[-1] - zgrid[kz])*ogrid*absorption_factor), rtol = 1e-12, atol = 0.)
+
+
+def test_z_modulation():
+    pressure = {'zgrid': pressure_zgrid, 'value': z_profile}
+    pre_factor = HT.get_propagation_pre_factor_function(zgrid, rgrid, ogrid, **dict(ss.medium, pressure = pressure))[0]
+    reference = reference_pre_factor(z_profile)
+    for kz in range(len(zgrid)):
+        assert np.allclose(pre_factor(kz), reference[kz][np.newaxis,:], rtol = 1e-12, atol = 0.)
+
+
+def test_zr_modulation():
+    pressure = {'zgrid': pressure_zgrid, 'rgrid': pressure_rgrid, 'value': zr_profile}
+    pre_factor = HT.get_propagation_pre_factor_function(zgrid, rgrid, ogrid, **dict(ss.medium, pressure = pressure))[0]
+    # the profile interpolated onto 'rgrid' and then the profile of each radial point as above
+    zr_profile_rgrid = np.array([table_interpolation(pressure_rgrid, profile, rgrid) for profile in zr_profile])
+    reference = np.stack([reference_pre_factor(zr_profile_rgrid[:,kr]) for kr in range(len(rgrid))], axis = 1) # [z,r,omega]
+    for kz in range(len(zgrid)): # the dispersion is integrated as an affine function of the pressure (rounding of the large phases)
+        assert np.allclose(pre_factor(kz), reference[kz], rtol = 1e-10, atol = 0.)
+
+
+def test_constant_profiles():
+    # the modulated profiles of a constant pressure compared with the analytic pre-factor, the absorption
+    # and dispersion tables differ, the absorption is normalised to the exit and the co-moving phase grows with z
+    pressure = ss.medium['pressure']
+    medium = dict(ss.medium, absorption_tables = 'NIST', dispersion_tables = 'Henke')
+    absorption_factor = pressure/units.c_light * XUV_index.beta_factor_ref(ogrid, ss.medium['preset_gas'] + '_NIST')
+    profiles = [{'zgrid': zgrid[[0,-1]], 'value': pressure*np.ones(2)},
+                {'zgrid': zgrid[[0,-1]], 'rgrid': rgrid[[0,-1]], 'value': pressure*np.ones((2,2))}]
+    for include_dispersion in [True, False]:
+        if include_dispersion:
+            dispersion_factor = 1j*XUV_index.dispersion_function(ogrid, pressure, gas, n_IR = n_IR)
+        else:
+            dispersion_factor = 1j*(n_IR - 1.)/units.c_light
+        for profile in profiles:
+            pre_factor = HT.get_propagation_pre_factor_function(zgrid, rgrid, ogrid, include_dispersion = include_dispersion,
+                                                                **dict(medium, pressure = profile))[0]
+            for kz in range(len(zgrid)):
+                reference = pressure * np.exp(ogrid*(zgrid[kz]*dispersion_factor + (zgrid[kz] - zgrid[-1])*absorption_factor))
+                assert np.allclose(pre_factor(kz), reference[np.newaxis,:], rtol = 1e-10, atol = 0.)
+
+
+if __name__ == '__main__':
+    ss.run_tests(globals())
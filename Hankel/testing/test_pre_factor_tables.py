@@ -0,0 +1,48 @@
+"""
+'Hankel_long' with the shared pre-factor tables ('get_pre_factor_tables', sliced in frequencies)
+compared with the pre-factor computed by 'Hankel_long', directly and by the cluster script.
+"""
+import tempfile
+import numpy as np
+import pytest
+import synthetic_source as ss
+import Hankel_transform as HT
+
+ogrid, rgrid, zgrid, rgrid_FF = ss.grids()
+pressures = [ss.medium['pressure'], {'zgrid': np.linspace(0., 2e-3, 5), 'value': 0.05*np.array([0.2, 1., 1.2, 0.8, 0.3])}]
+
+
+def test_frequency_slices():
+    target = ss.static_target(ogrid, rgrid, zgrid)
+    for pressure in pressures:
+        medium = dict(ss.medium, pressure = pressure)
+        tables = HT.get_pre_factor_tables(target.zgrid, target.rgrid, target.ogrid, **medium)
+        for integrator_longitudinal in ['trapezoidal', 'filon']:
+            for omega_slice in [slice(0, 7), slice(2, 5)]:
+                kwargs = dict(medium, integrator_longitudinal = integrator_longitudinal, store_cumulative_result = True)
+                reference = HT.Hankel_long(ss.static_target(ogrid, rgrid, zgrid, ko_min = omega_slice.start, ko_max = omega_slice.stop),
+                                           ss.distance, rgrid_FF, **kwargs)
+                result = HT.Hankel_long(ss.static_target(ogrid, rgrid, zgrid, ko_min = omega_slice.start, ko_max = omega_slice.stop),
+                                        ss.distance, rgrid_FF,
+                                        pre_factor_tables = {name: table[:,omega_slice] for name, table in tables.items()}, **kwargs)
+                for name in ['FF_integrated', 'cumulative_field']:
+                    assert ss.relative_error(getattr(result, name), getattr(reference, name)) < 1e-13
+
+
+def test_mismatched_tables():
+    target = ss.static_target(ogrid, rgrid, zgrid)
+    tables = HT.get_pre_factor_tables(target.zgrid, target.rgrid, target.ogrid, **ss.medium)
+    with pytest.raises(ValueError):
+        HT.Hankel_long(target, ss.distance, rgrid_FF, pre_factor_tables = {name: table[:,1:] for name, table in tables.items()},
+                       **ss.medium)
+
+
+def test_cluster_script():
+    with tempfile.TemporaryDirectory() as directory:
+        result = ss.run_cluster(directory, {'Nthreads': 3}, density_modulation = True)
+        reference = ss.archive_reference(directory + '/archive.h5')
+    assert ss.relative_error(result['FF_integrated'], reference.FF_integrated) < 1e-12
+
+
+if __name__ == '__main__':
+    ss.run_tests(globals())
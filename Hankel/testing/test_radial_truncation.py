@@ -0,0 +1,62 @@
+"""
+The radial truncation of the source in 'HankelTransform' compared with the 'scalar' engine
+applied on the explicitly truncated source.
+"""
+import numpy as np
+import pytest
+import synthetic_source as ss
+import Hankel_transform as HT
+
+ogrid, rgrid, zgrid, rgrid_FF = ss.grids(No = 9, Nr = 60)
+plane = ss.source(ogrid, rgrid, zgrid)[-1] * np.exp(-np.outer(ogrid/ss.omega0 - 21., rgrid/3e-5)) # narrower at higher frequencies
+threshold = 1e-8
+
+
+def truncated_plane():
+    energy = rgrid * HT.radial_quadrature_weights(rgrid) * np.abs(plane)**2
+    truncated = np.copy(plane); dropped_energy = np.empty(len(ogrid))
+    for k1 in range(len(ogrid)):
+        N_kept = len(rgrid)
+        while (N_kept > 0) and (np.sum(energy[k1,N_kept-1:]) <= threshold*np.sum(energy[k1])): N_kept -= 1
+        truncated[k1,N_kept:] = 0.
+        dropped_energy[k1] = np.sum(energy[k1,N_kept:])/np.sum(energy[k1])
+    return truncated, dropped_energy
+
+
+def test_truncated_source():
+    truncated, expected_dropped_energy = truncated_plane()
+    assert np.all(expected_dropped_energy <= threshold) and np.any(expected_dropped_energy > 0.)
+    reference = HT.HankelTransform(ogrid, rgrid, truncated, ss.distance, rgrid_FF, engine = 'scalar')
+    for frequency_block in [1, 4, 16]: # independent of the blocks
+        result, dropped_energy = HT.HankelTransform(ogrid, rgrid, plane, ss.distance, rgrid_FF, frequency_block = frequency_block,
+                                                    radial_threshold = threshold, return_dropped_energy = True)
+        assert ss.relative_error(result, reference) < 1e-12
+        assert np.allclose(dropped_energy, expected_dropped_energy, rtol = 1e-8, atol = 0.)
+    near_rgrid_FF = np.linspace(0., 5e-5, 3)
+    result = HT.HankelTransform(ogrid, rgrid, plane, ss.distance, near_rgrid_FF, engine = 'near_axis', near_axis_order = 8,
+                                radial_threshold = threshold)
+    reference = HT.HankelTransform(ogrid, rgrid, truncated, ss.distance, near_rgrid_FF, engine = 'scalar')
+    assert ss.relative_error(result, reference) < 1e-10
+
+
+def test_error_and_Hankel_long():
+    untruncated = HT.HankelTransform(ogrid, rgrid, plane, ss.distance, rgrid_FF)
+    assert np.array_equal(HT.HankelTransform(ogrid, rgrid, plane, ss.distance, rgrid_FF, radial_threshold = 0.), untruncated)
+    result = HT.HankelTransform(ogrid, rgrid, plane, ss.distance, rgrid_FF, radial_threshold = threshold)
+    assert ss.relative_error(result, untruncated) < 10.*np.sqrt(threshold) # the field error scales as sqrt(threshold)
+
+    FSource = ss.source(ogrid, rgrid, zgrid)
+    reference = HT.Hankel_long(ss.static_target(ogrid, rgrid, zgrid, FSource = FSource), ss.distance, rgrid_FF, **ss.medium)
+    result = HT.Hankel_long(ss.static_target(ogrid, rgrid, zgrid, FSource = FSource), ss.distance, rgrid_FF,
+                            radial_threshold = threshold, **ss.medium)
+    assert np.all(result.radial_truncation_dropped_energy <= threshold)
+    assert ss.relative_error(result.FF_integrated, reference.FF_integrated) < 10.*np.sqrt(threshold)
+
+
+def test_not_implemented():
+    with pytest.raises(NotImplementedError):
+        HT.HankelTransform(ogrid, rgrid, plane, ss.distance, rgrid_FF, engine = 'fht', radial_threshold = threshold)
+
+
+if __name__ == '__main__':
+    ss.run_tests(globals())
@@ -0,0 +1,38 @@
+"""
+The re-integration of the stored raw transforms of the planes ('FField_FF_provider') compared
+with 'Hankel_long' computed directly for another medium.
+"""
+import numpy as np
+import h5py
+import pytest
+import synthetic_source as ss
+import Hankel_transform as HT
+
+
+def test_reintegration_with_another_medium():
+    ogrid, rgrid, zgrid, rgrid_FF = ss.grids()
+    with h5py.File('raw_transforms.h5', 'w', driver = 'core', backing_store = False) as raw_file:
+        HT.Hankel_long(ss.static_target(ogrid, rgrid, zgrid), ss.distance, rgrid_FF,
+                       raw_transforms_output = raw_file.create_group('raw'), **ss.medium)
+
+        for pressure in [0.2, {'zgrid': np.linspace(0., 2e-3, 5), 'value': 0.05*np.array([0.2, 1., 1.2, 0.8, 0.3])}]:
+            medium = dict(ss.medium, pressure = pressure)
+            reference = HT.Hankel_long(ss.static_target(ogrid, rgrid, zgrid), ss.distance, rgrid_FF,
+                                       store_cumulative_result = True, **medium)
+            result = HT.Hankel_long(HT.FField_FF_provider(raw_file, 'raw'), ss.distance, rgrid_FF,
+                                    store_cumulative_result = True, **medium)
+            for name in ['FF_integrated', 'cumulative_field']:
+                assert ss.relative_error(getattr(result, name), getattr(reference, name)) < 1e-12
+
+
+def test_screen_mismatch():
+    ogrid, rgrid, zgrid, rgrid_FF = ss.grids()
+    with h5py.File('raw_transforms.h5', 'w', driver = 'core', backing_store = False) as raw_file:
+        HT.Hankel_long(ss.static_target(ogrid, rgrid, zgrid), ss.distance, rgrid_FF,
+                       raw_transforms_output = raw_file.create_group('raw'), **ss.medium)
+        with pytest.raises(ValueError):
+            HT.Hankel_long(HT.FField_FF_provider(raw_file, 'raw'), 2.*ss.distance, rgrid_FF, **ss.medium)
+
+
+if __name__ == '__main__':
+    ss.run_tests(globals())
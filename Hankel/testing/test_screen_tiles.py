@@ -0,0 +1,32 @@
+"""
+The tiles of the screen ('screen_tiles') and the cluster script with the tiles taken dynamically
+by the workers compared with 'Hankel_long' computed directly.
+"""
+import tempfile
+import numpy as np
+import synthetic_source as ss
+import Hankel_transform as HT
+
+
+def test_tiles_cover_the_screen():
+    for N_r_FF, N_omega, tile_size_r_FF, tile_size_omega in [(25, 7, 25, 7), (25, 7, 6, 3), (20, 13, 1, 100), (5, 40, 7, 9)]:
+        coverage = np.zeros((N_r_FF, N_omega), dtype = int)
+        tiles = HT.screen_tiles(N_r_FF, N_omega, tile_size_r_FF, tile_size_omega)
+        for r_FF_slice, omega_slice in tiles:
+            assert (r_FF_slice.stop - r_FF_slice.start <= tile_size_r_FF)
+            assert (omega_slice.stop - omega_slice.start <= tile_size_omega)
+            coverage[r_FF_slice, omega_slice] += 1
+        assert np.all(coverage == 1)
+        assert (len(tiles) == -(-N_r_FF // min(tile_size_r_FF, N_r_FF)) * -(-N_omega // min(tile_size_omega, N_omega)))
+
+
+def test_cluster_script():
+    with tempfile.TemporaryDirectory() as directory:
+        result = ss.run_cluster(directory, {'tile_size_r_FF': 7, 'tile_size_omega': 5})
+        reference = ss.archive_reference(directory + '/archive.h5')
+    for name in ['FF_integrated', 'entry_plane_transform', 'exit_plane_transform']:
+        assert ss.relative_error(result[name], getattr(reference, name)) < 1e-12
+
+
+if __name__ == '__main__':
+    ss.run_tests(globals())
@@ -0,0 +1,45 @@
+"""
+The outputs assembled in 'Shared_output_arrays' by the worker processes compared with
+'Hankel_long' of the whole screen, and the cluster script compared with 'Hankel_long'
+computed directly.
+"""
+import tempfile
+import multiprocessing as mp
+import numpy as np
+import synthetic_source as ss
+import Hankel_transform as HT
+
+ogrid, rgrid, zgrid, rgrid_FF = ss.grids()
+output_names = ['FF_integrated', 'entry_plane_transform', 'exit_plane_transform']
+
+
+def compute_tile(outputs, r_FF_slice, omega_slice):
+    HT.Hankel_long(ss.static_target(ogrid, rgrid, zgrid, ko_min = omega_slice.start, ko_max = omega_slice.stop),
+                   ss.distance, rgrid_FF[r_FF_slice], output_arrays = outputs.tile(r_FF_slice, omega_slice), **ss.medium)
+
+
+def test_workers():
+    reference = HT.Hankel_long(ss.static_target(ogrid, rgrid, zgrid), ss.distance, rgrid_FF, **ss.medium)
+    outputs = HT.Shared_output_arrays({name: (len(rgrid_FF), len(ogrid)) for name in output_names})
+    try:
+        tiles = [(slice(0, 10), slice(0, 3)), (slice(10, 25), slice(0, 3)), (slice(0, 25), slice(3, 7))]
+        processes = [mp.Process(target = compute_tile, args = (outputs,) + tile) for tile in tiles]
+        for process in processes: process.start()
+        for process in processes: process.join()
+        assert all(process.exitcode == 0 for process in processes)
+        for name in output_names:
+            assert ss.relative_error(outputs.array(name), getattr(reference, name)) < 1e-12
+    finally:
+        outputs.close()
+
+
+def test_cluster_script():
+    with tempfile.TemporaryDirectory() as directory:
+        result = ss.run_cluster(directory, {'Nthreads': 3, 'store_cumulative_result': 1})
+        reference = ss.archive_reference(directory + '/archive.h5', store_cumulative_result = True)
+    for name in output_names + ['cumulative_field']:
+        assert ss.relative_error(result[name], getattr(reference, name)) < 1e-12
+
+
+if __name__ == '__main__':
+    ss.run_tests(globals())
@@ -0,0 +1,70 @@
+"""
+The planes shared by 'Shared_FSource_stream' with the consumer processes compared with the
+'static' provider, the failure of a consumer and the cluster script with 'shared_source_planes'
+compared with 'Hankel_long' computed directly.
+"""
+import tempfile
+import multiprocessing as mp
+import numpy as np
+import h5py
+import pytest
+import synthetic_source as ss
+import Hankel_transform as HT
+
+ogrid, rgrid, zgrid, rgrid_FF = ss.grids()
+ko_selections = [slice(0, 4), slice(4, 7)] # the frequencies of the consumers
+
+
+def consumer(stream, k_consumer, results_queue, fail = False):
+    target = HT.FSources_provider(zgrid, rgrid, ogrid, data_source = 'shared', shared_stream = stream,
+                                  consumer = k_consumer, ko_min = ko_selections[k_consumer].start,
+                                  ko_max = ko_selections[k_consumer].stop)
+    for k1, plane in enumerate(target.Fsource_plane):
+        if fail and (k1 == 2): raise RuntimeError('consumer failure')
+        results_queue.put((k_consumer, k1, np.copy(plane)))
+
+
+def shared_planes(directory, fail = False):
+    FSource = np.transpose(ss.source(ogrid, rgrid, zgrid), (0,2,1))
+    with h5py.File(directory + '/source.h5', 'w') as source_h5:
+        source_h5['FSourceTerm'] = np.stack((FSource.real, FSource.imag), axis=-1)
+    with h5py.File(directory + '/source.h5', 'r') as source_h5:
+        stream = HT.Shared_FSource_stream(zgrid, rgrid, ogrid, source_h5, 'FSourceTerm', len(ko_selections), N_buffers = 2)
+        results_queue = mp.Queue()
+        processes = [mp.Process(target = consumer, args = (stream, k_consumer, results_queue, fail and (k_consumer == 1)))
+                     for k_consumer in range(len(ko_selections))]
+        for process in processes: process.start()
+        try:
+            stream.feed(processes, poll_interval = 0.1)
+            planes = [results_queue.get() for _ in range(len(ko_selections)*(len(zgrid)-1))]
+            for process in processes: process.join()
+        finally:
+            for process in processes: process.terminate()
+            stream.close()
+    return planes
+
+
+def test_planes():
+    reference = [np.copy(plane) for plane in ss.static_target(ogrid, rgrid, zgrid).Fsource_plane]
+    with tempfile.TemporaryDirectory() as directory:
+        planes = shared_planes(directory)
+    for k_consumer, k1, plane in planes:
+        assert np.array_equal(plane, reference[k1][ko_selections[k_consumer]])
+
+
+def test_consumer_failure():
+    with tempfile.TemporaryDirectory() as directory:
+        with pytest.raises(RuntimeError): # the reader does not wait for the failed consumer
+            shared_planes(directory, fail = True)
+
+
+def test_cluster_script():
+    with tempfile.TemporaryDirectory() as directory:
+        result = ss.run_cluster(directory, {'shared_source_planes': 1})
+        reference = ss.archive_reference(directory + '/archive.h5')
+    for name in ['FF_integrated', 'entry_plane_transform', 'exit_plane_transform']:
+        assert ss.relative_error(result[name], getattr(reference, name)) < 1e-12
+
+
+if __name__ == '__main__':
+    ss.run_tests(globals())
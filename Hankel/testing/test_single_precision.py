@@ -0,0 +1,41 @@
+"""
+The single-precision computation compared with the double-precision 'Hankel_long', directly
+and by the cluster script.
+"""
+import tempfile
+import numpy as np
+import pytest
+import synthetic_source as ss
+import Hankel_transform as HT
+
+ogrid, rgrid, zgrid, rgrid_FF = ss.grids()
+
+
+def test_Hankel_long():
+    for Hankel_engine, screen in [('matrix', 'radial'), ('matrix', 'angular'), ('fht', 'radial'), ('near_axis', 'radial')]:
+        kwargs = dict(ss.medium, Hankel_engine = Hankel_engine, screen = screen, store_cumulative_result = True)
+        screen_rgrid_FF = np.linspace(0., 5e-5, 3) if (Hankel_engine == 'near_axis') else rgrid_FF # near the axis
+        reference = HT.Hankel_long(ss.static_target(ogrid, rgrid, zgrid), ss.distance, screen_rgrid_FF, **kwargs)
+        result = HT.Hankel_long(ss.static_target(ogrid, rgrid, zgrid), ss.distance, screen_rgrid_FF, dtype = np.csingle, **kwargs)
+        for name in ['FF_integrated', 'entry_plane_transform', 'cumulative_field']:
+            assert (getattr(result, name).dtype == np.csingle)
+            errors = HT.precision_report(getattr(result, name), getattr(reference, name))
+            assert (errors['field'] < 1e-5) and (errors['intensity'] < 1e-5)
+
+
+def test_wrong_dtype():
+    with pytest.raises(ValueError):
+        HT.Hankel_long(ss.static_target(ogrid, rgrid, zgrid), ss.distance, rgrid_FF, dtype = np.clongdouble, **ss.medium)
+
+
+def test_cluster_script():
+    with tempfile.TemporaryDirectory() as directory:
+        result = ss.run_cluster(directory, {'single_precision': 1})
+        reference = ss.archive_reference(directory + '/archive.h5')
+    assert (result['FF_integrated'].dtype == np.csingle)
+    assert ss.relative_error(result['FF_integrated'], reference.FF_integrated) < 1e-5
+    assert (result['single_precision_error_field'] < 1e-5)
+
+
+if __name__ == '__main__':
+    ss.run_tests(globals())
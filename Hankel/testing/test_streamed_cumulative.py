@@ -0,0 +1,41 @@
+"""
+The cumulative fields streamed into hdf5 datasets compared with the in-memory cumulative
+fields of 'Hankel_long' (directly and by the cluster script).
+"""
+import tempfile
+import numpy as np
+import h5py
+import synthetic_source as ss
+import Hankel_transform as HT
+
+ogrid, rgrid, zgrid, rgrid_FF = ss.grids()
+cumulative_names = ['cumulative_field', 'cumulative_field_no_norm']
+
+
+def test_streamed_planes():
+    for cumulative_stride in [1, 3]:
+        kwargs = dict(ss.medium, store_cumulative_result = True, store_non_normalised_cumulative_result = True,
+                      cumulative_stride = cumulative_stride)
+        reference = HT.Hankel_long(ss.static_target(ogrid, rgrid, zgrid), ss.distance, rgrid_FF, **kwargs)
+        with h5py.File('cumulative.h5', 'w', driver = 'core', backing_store = False) as cumulative_file:
+            result = HT.Hankel_long(ss.static_target(ogrid, rgrid, zgrid), ss.distance, rgrid_FF,
+                                    cumulative_output = cumulative_file, **kwargs)
+            assert np.array_equal(result.zgrid_cumulative, zgrid[1:-1][cumulative_stride-1::cumulative_stride])
+            assert np.array_equal(result.FF_integrated, reference.FF_integrated)
+            for name in cumulative_names:
+                assert not(hasattr(result, name))
+                streamed = cumulative_file[name][...,0] + 1j*cumulative_file[name][...,1]
+                assert np.array_equal(streamed, getattr(reference, name))
+
+
+def test_cluster_script():
+    with tempfile.TemporaryDirectory() as directory:
+        result = ss.run_cluster(directory, {'store_cumulative_result': 1, 'stream_cumulative_result': 1,
+                                            'cumulative_stride': 2})
+        reference = ss.archive_reference(directory + '/archive.h5', store_cumulative_result = True, cumulative_stride = 2)
+    assert ss.relative_error(result['cumulative_field'], reference.cumulative_field) < 1e-12
+    assert np.array_equal(result['zgrid_cumulative'], reference.zgrid_cumulative)
+
+
+if __name__ == '__main__':
+    ss.run_tests(globals())
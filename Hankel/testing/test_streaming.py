@@ -0,0 +1,93 @@
+"""
+The source planes read from the temporary files while they are written ('TDSE_temporary_files'
+with 'streaming') compared with the source in the archive and the cluster script with
+'stream_temporary_files' compared with 'Hankel_long' computed directly from the archive.
+The writer process emulates TDSE: the simulations are taken round-robin by the processes, each one
+is written and flushed (the file is closed) and only then committed by 'number_of_local_simulations'.
+"""
+import os
+import time
+import tempfile
+import multiprocessing as mp
+import numpy as np
+import h5py
+import synthetic_source as ss
+import MMA_administration as MMA
+import Hankel_transform as HT
+
+
+def write_simulations(FSource, grids, directory, N_files = 3, delay = 0.005):
+    """It writes the simulations of FSource [z,r,omega,(real,imag)] one by one as the processes of TDSE."""
+    Nz, Nr, No = FSource.shape[:3]
+    capacity = (Nz*Nr)//N_files + 1
+    N_local = np.zeros(N_files, dtype=int)
+    for key in range(Nz*Nr):
+        k_file = key % N_files
+        file_name = os.path.join(directory, 'hdf5_temp_%07d.h5' % k_file)
+        if (N_local[k_file] == 0):
+            with h5py.File(file_name, 'w') as temporary_file:
+                temporary_file.create_dataset('FSourceTerm', (No, 2, capacity), dtype='f8')
+                temporary_file['keys'] = -np.ones(capacity, dtype=int)
+                temporary_file.create_dataset('number_of_local_simulations', (1,), dtype=int)
+                temporary_file['Nr_orig'] = np.array([Nr]); temporary_file['Nz_orig'] = np.array([Nz])
+                for name, grid in grids.items(): temporary_file[name] = grid
+        time.sleep(delay)
+        with h5py.File(file_name, 'a') as temporary_file:
+            temporary_file['keys'][N_local[k_file]] = key
+            temporary_file['FSourceTerm'][:,:,N_local[k_file]] = FSource[key//Nr, key%Nr]
+        time.sleep(delay) # a reader polling now must not count the simulation
+        with h5py.File(file_name, 'a') as temporary_file:
+            temporary_file['number_of_local_simulations'][0] = N_local[k_file] + 1
+        N_local[k_file] += 1
+
+
+def archive_source(archive_name, remove_source = False):
+    with h5py.File(archive_name, 'r+') as archive:
+        out_group = archive[MMA.paths['CTDSE_outputs']]
+        FSource = out_group['FSourceTerm'][()]
+        grids = {name: out_group[name][()] for name in ['omegagrid', 'rgrid_coarse', 'zgrid_coarse']}
+        if remove_source: del out_group['FSourceTerm']
+    return FSource, grids
+
+
+def test_planes():
+    with tempfile.TemporaryDirectory() as directory:
+        archive_name = os.path.join(directory, 'archive.h5')
+        ss.write_archive(archive_name, No = 20, Nr = 12, Nz = 6)
+        FSource, grids = archive_source(archive_name)
+        writer = mp.Process(target = write_simulations, args = (FSource, grids, directory))
+        writer.start()
+        try:
+            temporary_files = HT.TDSE_temporary_files(os.path.join(directory, 'hdf5_temp_*.h5'), streaming = True,
+                                                      poll_interval = 0.002, timeout = 60.)
+            ko_indices, kr_indices = np.arange(2, 15), np.arange(12)
+            for kz in range(len(FSource)):
+                plane = np.empty((len(ko_indices), len(kr_indices)), dtype=np.cdouble)
+                temporary_files.read_plane(kz, ko_indices, kr_indices, plane)
+                reference = FSource[kz][np.ix_(kr_indices, ko_indices)].T
+                assert np.array_equal(plane, reference[0] + 1j*reference[1])
+            temporary_files.close()
+        finally:
+            writer.join()
+    assert (writer.exitcode == 0)
+
+
+def test_cluster_script():
+    writers = []
+    def prepare(directory):
+        FSource, grids = archive_source(os.path.join(directory, 'archive.h5'), remove_source = True)
+        writers.append(mp.Process(target = write_simulations, args = (FSource, grids, directory)))
+        writers[0].start()
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            outputs = ss.run_cluster(directory, inputs = {'stream_temporary_files': 1, 'stream_poll_interval': 0.01,
+                                                          'stream_timeout': 60.}, prepare = prepare)
+        finally:
+            writers[0].join()
+        ss.write_archive(os.path.join(directory, 'archive.h5'))
+        reference = ss.archive_reference(os.path.join(directory, 'archive.h5'))
+    assert ss.relative_error(outputs['FF_integrated'], reference.FF_integrated) < 1e-12
+
+
+if __name__ == '__main__':
+    ss.run_tests(globals())
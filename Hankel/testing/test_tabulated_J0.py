@@ -0,0 +1,31 @@
+"""
+'tabulated_j0' compared with 'scipy.special.j0' and the transforms with J0_backend = 'tabulated'
+compared with the 'scalar' engine.
+"""
+import numpy as np
+from scipy import special
+import pytest
+import synthetic_source as ss
+import Hankel_transform as HT
+
+
+def test_absolute_error():
+    x = np.concatenate((np.linspace(0., 20., 200001), np.linspace(11.9, 12.1, 1001), np.geomspace(20., 1e5, 100001)))
+    assert np.max(np.abs(HT.tabulated_j0(x) - special.j0(x))) < 1e-7
+    assert np.max(np.abs(HT.tabulated_j0(x, chunk = 1000) - HT.tabulated_j0(x))) == 0.
+    assert np.array_equal(HT.tabulated_j0(x[:300000].reshape(3, -1)), HT.tabulated_j0(x[:300000]).reshape(3, -1))
+    assert (HT.tabulated_j0(x, dtype = np.single).dtype == np.single)
+
+
+def test_transforms():
+    ogrid, rgrid, zgrid, rgrid_FF = ss.grids()
+    plane = ss.source(ogrid, rgrid, zgrid)[-1]
+    reference = HT.HankelTransform(ogrid, rgrid, plane, ss.distance, rgrid_FF, engine = 'scalar')
+    result = HT.HankelTransform(ogrid, rgrid, plane, ss.distance, rgrid_FF, J0_backend = 'tabulated')
+    assert ss.relative_error(result, reference) < 1e-6
+    with pytest.raises(ValueError):
+        HT.HankelTransform(ogrid, rgrid, plane, ss.distance, rgrid_FF, J0_backend = 'table')
+
+
+if __name__ == '__main__':
+    ss.run_tests(globals())
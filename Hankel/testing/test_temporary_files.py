@@ -0,0 +1,75 @@
+"""
+The source read from the temporary files of TDSE ('TDSE_temporary_files') compared with the source
+in the archive (merged by '1DTDSE/python/merge.py') and the cluster script with 'source_temporary_files'
+compared with 'Hankel_long' computed directly from the archive.
+"""
+import os
+import glob
+import tempfile
+import numpy as np
+import h5py
+import pytest
+import synthetic_source as ss
+import MMA_administration as MMA
+import Hankel_transform as HT
+
+missing_plane, missing_kr = 3, 6
+
+
+def test_read_plane():
+    with tempfile.TemporaryDirectory() as directory:
+        archive_name = os.path.join(directory, 'archive.h5')
+        ss.write_archive(archive_name, No = 20, Nr = 12)
+        ss.split_archive(archive_name, directory, shuffle = True, missing_keys = [missing_plane*12 + missing_kr], remove_source = False)
+        with h5py.File(archive_name, 'r') as archive:
+            FSource = archive[MMA.paths['CTDSE_outputs']+'/FSourceTerm'][()]
+        FSource = np.transpose(FSource[...,0] + 1j*FSource[...,1], (0,2,1)) # [z,omega,r]
+
+        temporary_files = HT.TDSE_temporary_files(glob.glob(os.path.join(directory, 'hdf5_temp_*.h5')))
+        assert (temporary_files.Nz, temporary_files.Nr) == FSource.shape[::2]
+        assert np.array_equal(np.flatnonzero(~temporary_files.complete_planes()), [missing_plane])
+        for ko_indices, kr_indices in [(np.arange(20), np.arange(12)), (np.array([2, 3, 4, 9, 10, 15]), np.arange(1, 12, 2))]:
+            for kz in range(len(FSource)):
+                plane = np.empty((len(ko_indices), len(kr_indices)), dtype=np.cdouble)
+                if (kz == missing_plane) and (missing_kr in kr_indices):
+                    with pytest.raises(ValueError):
+                        temporary_files.read_plane(kz, ko_indices, kr_indices, plane)
+                else:
+                    temporary_files.read_plane(kz, ko_indices, kr_indices, plane)
+                    assert np.array_equal(plane, FSource[kz][np.ix_(ko_indices, kr_indices)])
+        temporary_files.close()
+
+
+def test_Hankel_long():
+    with tempfile.TemporaryDirectory() as directory:
+        archive_name = os.path.join(directory, 'archive.h5')
+        ss.write_archive(archive_name, Nr_FF = 15)
+        reference = ss.archive_reference(archive_name, store_cumulative_result = True)
+        ss.split_archive(archive_name, directory, N_files = 4, shuffle = True)
+
+        temporary_files = HT.TDSE_temporary_files(os.path.join(directory, 'hdf5_temp_*.h5'))
+        ogrid = ss.omega_au2SI*temporary_files.ogrid
+        ko_min = int(np.searchsorted(ogrid, reference.ogrid[0]))
+        target = HT.FSources_provider(temporary_files.zgrid, temporary_files.rgrid, ogrid,
+                                      data_source = 'temporary_files', temporary_files = temporary_files,
+                                      ko_min = ko_min, ko_max = ko_min + len(reference.ogrid))
+        assert np.array_equal(target.ogrid, reference.ogrid)
+        with h5py.File(archive_name, 'r') as archive:
+            result = HT.Hankel_long(target, ss.distance, np.linspace(0., 5e-3, 15), Hankel_engine = 'scalar', store_cumulative_result = True,
+                                    **dict(ss.medium, pressure = MMA.pressure_constructor(archive)))
+        temporary_files.close()
+        for name in ['FF_integrated', 'cumulative_field']:
+            assert ss.relative_error(getattr(result, name), getattr(reference, name)) < 1e-12
+
+
+def test_cluster_script():
+    with tempfile.TemporaryDirectory() as directory:
+        outputs = ss.run_cluster(directory, inputs = {'source_temporary_files': 1},
+                                 prepare = lambda directory: ss.split_archive(os.path.join(directory, 'archive.h5'), directory))
+        ss.write_archive(os.path.join(directory, 'archive.h5'))
+        reference = ss.archive_reference(os.path.join(directory, 'archive.h5'))
+    assert ss.relative_error(outputs['FF_integrated'], reference.FF_integrated) < 1e-12
+
+
+if __name__ == '__main__':
+    ss.run_tests(globals())
@@ -75,8 +75,15 @@ CTDSE_variable_type_lists ={
     'S' : [], 'R-array' : []}
 
 Hankel_variable_type_lists ={
-    'I' : ['Nr_FF', 'kr_step', 'ko_step', 'Nr_max', 'Nthreads', 'store_cumulative_result'],
-    'R' : ['distance_FF', 'rmax_FF'],
-    'S' : ['XUV_table_type_dispersion', 'XUV_table_type_absorption'],
-    'R-array': ['Harmonic_range']}
+    'I' : ['Nr_FF', 'kr_step', 'ko_step', 'Nr_max', 'Nthreads', 'store_cumulative_result',
+           'store_raw_transforms', 'shared_source_planes', 'tile_size_r_FF', 'tile_size_omega',
+           'stream_cumulative_result', 'cumulative_stride', 'checkpoint_interval', 'single_precision',
+           'on_axis_spectrum', 'integrated_spectrum', 'source_temporary_files',
+           'stream_temporary_files'],
+    'R' : ['distance_FF', 'rmax_FF', 'harmonic_window', 'spectral_power_threshold',
+           'radial_threshold', 'kernel_cache_size', 'kernel_cache_store_size', 'stream_poll_interval', 'stream_timeout'],
+    'S' : ['XUV_table_type_dispersion', 'XUV_table_type_absorption', 'Hankel_engine',
+           'integrator_longitudinal', 'parallel_mode',
+           'kernel_cache_store', 'J0_backend'],
+    'R-array': ['Harmonic_range', 'distance_FF_screens', 'rmax_FF_screens', 'harmonic_orders']}
 